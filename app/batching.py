@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+
+from infrastructure.embeddings import Embedder
+
+
+EmbedMany = Callable[[List[str]], List[List[float]]]
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embedding requests. The first text to
+    arrive opens a batch; texts arriving within `max_wait_seconds` (or until
+    `max_batch_size` is reached) join it, and the batch is embedded with one
+    `embed_many` call on a worker thread so the event loop stays free.
+    """
+
+    def __init__(
+        self,
+        embed_many: EmbedMany,
+        max_wait_seconds: float = 0.005,
+        max_batch_size: int = 96
+    ) -> None:
+        self.embed_many = embed_many
+        self.max_wait_seconds = max_wait_seconds
+        self.max_batch_size = max_batch_size
+        self._batches: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Batch]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(loop)
+        if batch is None:
+            batch = self._batches[loop] = _Batch()
+            batch.timer = loop.call_later(self.max_wait_seconds, self._flush, loop)
+        future = loop.create_future()
+        batch.items.append((text, future))
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(loop)
+        return await future
+
+    async def embed_many_async(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.gather(*(self.embed(t) for t in texts))
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        batch = self._batches.pop(loop, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        loop.create_task(self._run(loop, batch.items))
+
+    async def _run(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        items: List[Tuple[str, asyncio.Future]]
+    ) -> None:
+        texts = [text for text, _ in items]
+        try:
+            vectors = await loop.run_in_executor(None, self.embed_many, texts)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(items, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+class BatcherPool:
+    """One `EmbeddingBatcher` per (embedder, input type), created on first use."""
+
+    def __init__(
+        self,
+        make_embedder: Callable[[str], Embedder],
+        max_wait_seconds: float = 0.005
+    ) -> None:
+        self.make_embedder = make_embedder
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        self._embedders: Dict[str, Embedder] = {}
+        self._batchers: Dict[Tuple[str, str], EmbeddingBatcher] = {}
+
+    def embedder(self, name: str) -> Embedder:
+        with self._lock:
+            if name not in self._embedders:
+                self._embedders[name] = self.make_embedder(name)
+            return self._embedders[name]
+
+    def get(self, name: str, input_type: str) -> EmbeddingBatcher:
+        embedder = self.embedder(name)
+        with self._lock:
+            key = (name, input_type)
+            if key not in self._batchers:
+                self._batchers[key] = EmbeddingBatcher(
+                    lambda texts: embedder.embed(texts, input_type),
+                    max_wait_seconds=self.max_wait_seconds,
+                )
+            return self._batchers[key]
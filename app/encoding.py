@@ -0,0 +1,50 @@
+import time
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from domain.models import Chunk, Document, Library
+from utils import metrics
+
+try:  # optional: binary responses for clients that ask for them
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+
+# domain records render themselves, skipping a pass through pydantic
+DOMAIN_ENCODERS = {cls: cls.to_dict for cls in (Chunk, Document, Library)}
+
+SERIALIZATION_SECONDS = metrics.histogram(
+    "vectordb_response_serialization_seconds",
+    "Time to encode response bodies, per endpoint and format.",
+    ["route", "format"],
+)
+
+
+def wants_msgpack(request: Request) -> bool:
+    return msgpack is not None and MSGPACK in request.headers.get("accept", "")
+
+
+def encoded(request: Request, payload: Any) -> Response:
+    """
+    `payload` rendered as msgpack when the client accepts it and msgpack is
+    installed, else as JSON. Rendering here rather than in FastAPI lets the
+    serialization time be measured.
+    """
+    start = time.perf_counter()
+    content = jsonable_encoder(payload, custom_encoder=DOMAIN_ENCODERS)
+    if wants_msgpack(request):
+        response, fmt = Response(msgpack.packb(content), media_type=MSGPACK), "msgpack"
+    else:
+        response, fmt = JSONResponse(content), "json"
+    route = request.scope.get("route")
+    SERIALIZATION_SECONDS.observe(
+        time.perf_counter() - start,
+        route=getattr(route, "path", request.url.path),
+        format=fmt,
+    )
+    return response
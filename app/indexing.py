@@ -0,0 +1,394 @@
+import threading
+import time
+import numpy as np
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from domain.models import Library, Chunk, embedding_matrix
+from infrastructure.index.base import BaseIndex
+from infrastructure.index.bm25 import BM25Index
+from infrastructure.index.factory import IndexFactory
+from infrastructure.index.sharded import ShardedIndex
+from utils import metrics
+
+SNAPSHOT_LOOKUPS = metrics.counter(
+    "vectordb_index_lookups_total",
+    "Index lookups by result: hit (current snapshot) or miss (build queued).",
+    ["algorithm", "result"],
+)
+BUILD_SECONDS = metrics.histogram(
+    "vectordb_index_build_seconds",
+    "Time to build an index in the background.",
+    ["algorithm"],
+)
+
+
+@dataclass
+class IndexSnapshot:
+    """An index together with the chunks its row ids point at."""
+    algorithm: str
+    version: int
+    rows: List[Chunk]
+    row_of: Dict[UUID, int]
+    index: BaseIndex
+    build_seconds: float = 0.0
+
+
+@dataclass
+class IndexBuildStatus:
+    algorithm: str
+    state: str = "queued"  # queued | building | ready | failed
+    version: Optional[int] = None
+    target_version: Optional[int] = None
+    size: int = 0
+    queued_at: Optional[float] = None
+    built_at: Optional[float] = None
+    build_seconds: Optional[float] = None
+    error: Optional[str] = None
+    # why the last build was queued: initial | stale | config | tombstones | imbalance
+    reason: Optional[str] = None
+
+
+@dataclass
+class _BuildJob:
+    lib_id: str
+    version: int
+    chunks: List[Chunk]
+    algorithms: Set[str]
+    first_queued: float
+    due: float = field(default=0.0)
+    shards: int = 1
+    config: Optional[Dict[str, Any]] = None
+    reasons: Dict[str, str] = field(default_factory=dict)
+
+
+def _create_index(
+    algorithm: str,
+    rows: List[Chunk],
+    shards: int,
+    config: Optional[Dict[str, Any]] = None
+) -> BaseIndex:
+    """
+    Index over `rows` (row ids are positions in that list). With several
+    shards, rows are assigned by chunk id, so a chunk stays in its shard
+    across deltas and rebuilds. The library's tuned parameters apply to
+    the algorithm they were tuned for. An unsharded index never rebuilds
+    itself: the builder rebuilds it along with its rows.
+    """
+    vectors = embedding_matrix(rows)
+    params = config["params"] if config and config["algorithm"] == algorithm else {}
+    if shards > 1:
+        return ShardedIndex(
+            vectors,
+            shards=shards,
+            algorithm=algorithm,
+            shard_of=lambda row: rows[row].id.int % shards,
+            **params,
+        )
+    return IndexFactory.create(
+        algorithm, vectors, max_tombstone_ratio=np.inf, max_insert_ratio=np.inf, **params
+    )
+
+
+class IndexBuilder:
+    """
+    Builds per-library indexes off the request path.
+
+    Mutations are applied to the live snapshots and the library's BM25 index
+    incrementally (so searches never see stale rows). A full rebuild is
+    queued only when a snapshot's share of dead rows passes
+    `max_tombstone_ratio`, or its rows inserted since the build pass
+    `max_insert_ratio` of the built size; rebuilds are debounced so a
+    burst of writes costs one build. A single worker thread builds the new
+    index and swaps it in atomically; until then searches keep using the
+    old one.
+    """
+
+    def __init__(
+        self,
+        debounce_seconds: float = 0.05,
+        max_delay_seconds: float = 1.0,
+        max_tombstone_ratio: float = BaseIndex.max_tombstone_ratio,
+        max_insert_ratio: float = BaseIndex.max_insert_ratio
+    ) -> None:
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_tombstone_ratio = max_tombstone_ratio
+        self.max_insert_ratio = max_insert_ratio
+        self._cond = threading.Condition()
+        self._snapshots: Dict[Tuple[str, str], IndexSnapshot] = {}
+        self._status: Dict[Tuple[str, str], IndexBuildStatus] = {}
+        self._lexical: Dict[str, Tuple[int, BM25Index]] = {}
+        self._queue: Dict[str, _BuildJob] = {}
+        self._building = 0
+        self._worker: Optional[threading.Thread] = None
+
+    def snapshot(self, lib: Library, algorithm: str) -> Optional[IndexSnapshot]:
+        """Return the index for `lib` if it is current, else queue a build."""
+        key = (str(lib.id), algorithm)
+        with self._cond:
+            snap = self._snapshots.get(key)
+            if snap is not None and snap.version == lib.version:
+                SNAPSHOT_LOOKUPS.inc(algorithm=algorithm, result="hit")
+                return snap
+        SNAPSHOT_LOOKUPS.inc(algorithm=algorithm, result="miss")
+        self.schedule(lib, [algorithm], "initial" if snap is None else "stale")
+        return None
+
+    def lexical(self, lib: Library) -> BM25Index:
+        """
+        BM25 index over the chunk texts of `lib`, kept current by `apply`
+        and rebuilt inline if it missed a write.
+        """
+        lib_id = str(lib.id)
+        with self._cond:
+            entry = self._lexical.get(lib_id)
+            if entry is not None and entry[0] == lib.version:
+                return entry[1]
+        index = BM25Index.from_texts(
+            (c.id, c.text) for d in lib.documents for c in d.chunks
+        )
+        with self._cond:
+            entry = self._lexical.get(lib_id)
+            if entry is None or entry[0] <= lib.version:
+                self._lexical[lib_id] = (lib.version, index)
+        return index
+
+    def schedule(
+        self,
+        lib: Library,
+        algorithms: Optional[Iterable[str]] = None,
+        reason: str = "stale"
+    ) -> None:
+        """
+        Queue a rebuild of `algorithms` for `lib` (default: every algorithm
+        already built or queued for it), recording `reason` in their status.
+        """
+        lib_id = str(lib.id)
+        now = time.monotonic()
+        with self._cond:
+            wanted = set(algorithms) if algorithms is not None else {
+                algo for (lid, algo) in self._status if lid == lib_id
+            }
+            if not wanted:
+                return
+            job = self._queue.get(lib_id)
+            if job is None or job.version < lib.version:
+                chunks = [c for d in lib.documents for c in d.chunks]
+                if job is None:
+                    job = _BuildJob(
+                        lib_id, lib.version, chunks, set(), now,
+                        shards=lib.shards, config=lib.index_config
+                    )
+                    self._queue[lib_id] = job
+                else:
+                    job.version, job.chunks = lib.version, chunks
+                    job.config = lib.index_config
+                job.due = min(
+                    now + self.debounce_seconds,
+                    job.first_queued + self.max_delay_seconds
+                )
+            elif job.version > lib.version:
+                return
+            job.algorithms |= wanted
+            for algo in wanted:
+                job.reasons.setdefault(algo, reason)
+                status = self._status.setdefault(
+                    (lib_id, algo), IndexBuildStatus(algorithm=algo)
+                )
+                if status.state != "building":
+                    status.state = "queued"
+                status.target_version = job.version
+                status.queued_at = time.time()
+                status.reason = job.reasons[algo]
+                status.error = None
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def apply(
+        self,
+        lib: Library,
+        upserted: Iterable[Chunk] = (),
+        removed: Iterable[UUID] = (),
+        rebuild: bool = False
+    ) -> None:
+        """
+        Bring the snapshots and BM25 index of `lib` up to `lib.version` with
+        a chunk delta. Snapshots that missed an earlier delta are left stale
+        and rebuilt; one that took it is rebuilt only once `_rebuild_reason`
+        says so, or with `rebuild` (the library's index settings changed).
+        Sharded snapshots are never rebuilt for imbalance: each shard
+        rebalances on its own, so a write leaves the other shards alone.
+        """
+        upserted, removed = list(upserted), list(removed)
+        lib_id = str(lib.id)
+        reasons: Dict[str, str] = {}
+        with self._cond:
+            for (lid, algo), snap in self._snapshots.items():
+                if lid != lib_id:
+                    continue
+                if snap.version != lib.version - 1:
+                    reasons[algo] = "stale"
+                    continue
+                self._apply_delta(snap, upserted, removed)
+                snap.version = lib.version
+                status = self._status[(lid, algo)]
+                status.version, status.size = lib.version, len(snap.index)
+                reason = "config" if rebuild else self._rebuild_reason(snap)
+                if reason is not None:
+                    reasons[algo] = reason
+            for (lid, algo) in self._status:
+                if lid == lib_id and (lid, algo) not in self._snapshots:
+                    reasons[algo] = "initial"  # its first build missed this write
+            entry = self._lexical.get(lib_id)
+            if entry is not None and entry[0] == lib.version - 1:
+                for cid in removed:
+                    entry[1].remove(cid)
+                for chunk in upserted:
+                    entry[1].add(chunk.id, chunk.text)
+                self._lexical[lib_id] = (lib.version, entry[1])
+        for reason in set(reasons.values()):
+            self.schedule(lib, [a for a, r in reasons.items() if r == reason], reason)
+
+    def _rebuild_reason(self, snap: IndexSnapshot) -> Optional[str]:
+        """Why the patched `snap` should be rebuilt, or None while it is fine."""
+        dead = len(snap.rows) - len(snap.row_of)
+        if dead > self.max_tombstone_ratio * max(len(snap.rows), 1):
+            return "tombstones"
+        if not isinstance(snap.index, ShardedIndex) and snap.index.imbalance > self.max_insert_ratio:
+            return "imbalance"
+        return None
+
+    def _apply_delta(
+        self,
+        snap: IndexSnapshot,
+        upserted: List[Chunk],
+        removed: List[UUID]
+    ) -> None:
+        gone = [snap.row_of.pop(cid) for cid in removed if cid in snap.row_of]
+        new_ids: List[int] = []
+        new_vectors: List[List[float]] = []
+        for chunk in upserted:
+            row = snap.row_of.get(chunk.id)
+            if row is not None and np.array_equal(snap.rows[row].embedding, chunk.embedding):
+                snap.rows[row] = chunk
+                continue
+            if row is not None:
+                gone.append(row)
+            row = len(snap.rows)
+            snap.rows.append(chunk)
+            snap.row_of[chunk.id] = row
+            new_ids.append(row)
+            new_vectors.append(chunk.embedding)
+        if gone:
+            snap.index.remove(gone)
+        if new_ids:
+            snap.index.add(new_ids, new_vectors)
+
+    def discard(self, lib_id: str) -> None:
+        with self._cond:
+            self._queue.pop(lib_id, None)
+            self._lexical.pop(lib_id, None)
+            for key in [k for k in self._snapshots if k[0] == lib_id]:
+                del self._snapshots[key]
+            for key in [k for k in self._status if k[0] == lib_id]:
+                del self._status[key]
+
+    def status(self, lib_id: str) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [
+                asdict(s) for (lid, _), s in sorted(self._status.items())
+                if lid == lib_id
+            ]
+
+    def memory(self) -> Dict[str, int]:
+        """Estimated bytes held by the current indexes, per algorithm."""
+        with self._cond:
+            indexes = [(algo, snap.index) for (_, algo), snap in self._snapshots.items()]
+        usage: Dict[str, int] = {}
+        for algo, index in indexes:
+            usage[algo] = usage.get(algo, 0) + index.memory_bytes()
+        return usage
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the queue is drained; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._building:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _next_job(self) -> _BuildJob:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = [j for j in self._queue.values() if j.due <= now]
+                if due:
+                    job = min(due, key=lambda j: j.due)
+                    del self._queue[job.lib_id]
+                    self._building += 1
+                    return job
+                wait = min((j.due for j in self._queue.values()), default=now + 60) - now
+                self._cond.wait(max(wait, 0.001))
+
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            try:
+                for algo in sorted(job.algorithms):
+                    self._build(job, algo)
+            finally:
+                with self._cond:
+                    self._building -= 1
+                    self._cond.notify_all()
+
+    def _build(self, job: _BuildJob, algorithm: str) -> None:
+        key = (job.lib_id, algorithm)
+        with self._cond:
+            status = self._status.get(key)
+            if status is None:  # library discarded meanwhile
+                return
+            status.state = "building"
+            status.reason = job.reasons.get(algorithm, status.reason)
+
+        start = time.perf_counter()
+        rows = list(job.chunks)
+        try:
+            index = _create_index(algorithm, rows, job.shards, job.config)
+        except Exception as e:
+            with self._cond:
+                status.state = "failed"
+                status.error = str(e)
+            return
+        elapsed = time.perf_counter() - start
+        BUILD_SECONDS.observe(elapsed, algorithm=algorithm)
+
+        snap = IndexSnapshot(
+            algorithm=algorithm,
+            version=job.version,
+            rows=rows,
+            row_of={c.id: i for i, c in enumerate(rows)},
+            index=index,
+            build_seconds=elapsed,
+        )
+        with self._cond:
+            if self._status.get(key) is not status:
+                return
+            current = self._snapshots.get(key)
+            if current is None or current.version <= job.version:
+                self._snapshots[key] = snap
+                status.version = job.version
+                status.size = len(job.chunks)
+                status.built_at = time.time()
+                status.build_seconds = elapsed
+            pending = self._queue.get(job.lib_id)
+            status.state = "queued" if pending and algorithm in pending.algorithms else "ready"
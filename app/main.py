@@ -1,33 +1,187 @@
+import itertools
+import json
 import os
-from fastapi import FastAPI, Depends, HTTPException, Query
+import threading
+import time
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from typing import List
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from uuid import UUID
 
 from app.schemas import (
     LibraryCreate,
+    LibraryHeaderOut,
+    LibraryOut,
     DocumentCreate,
+    DocumentOut,
+    ChunkOut,
     ChunkCreate,
     ChunkUpdate,
+    ChunkTextCreate,
+    ChunkBulkCreate,
+    ChunkIngestResult,
+    DedupeRequest,
+    DedupeReport,
     SearchRequest,
+    BatchSearchRequest,
+    FederatedSearchRequest,
+    TextSearchRequest,
+    LibraryIndexStatus,
 )
+from app.batching import BatcherPool
+from app.encoding import encoded
+from app.profiling import SearchProfile, profiling
+from app.indexing import IndexBuilder
+from app.tuning import IndexTuner
 from app.services import LibraryService
+from utils.cache import LRUCache
+from utils import metrics
+from infrastructure.embeddings import Embedder, EmbedderFactory
 from infrastructure.repositories import BaseLibraryRepository, RepositoryFactory
-from domain.models import Document, Library, Chunk
+from infrastructure.leader_follower import LeaderFollowerRepository, read_session
+from domain.models import Library, Chunk
+
+
+VERSION_TOKEN_HEADER = "X-Version-Token"
+
+_repositories: Dict[Tuple, BaseLibraryRepository] = {}
+_repositories_lock = threading.Lock()
 
 
 def get_repository() -> BaseLibraryRepository:
-    return RepositoryFactory.create(
-        backend_type=os.getenv('REPO_TYPE', 'json'),
+    """
+    One repository per configuration, shared by every request: it owns the
+    in-memory state that per-library write locks serialize (and, when
+    replicated, the follower threads).
+    """
+    backend = os.getenv('REPO_TYPE', 'json')
+    paths = dict(
         json_path=os.getenv('JSON_PATH', 'data.json'),
         pickle_path=os.getenv('PICKLE_PATH', 'data.pkl'),
         sqlite_path=os.getenv('SQLITE_PATH', 'data.db')
     )
+    commit = dict(
+        durability=os.getenv('REPO_DURABILITY', 'group'),
+        commit_wait_seconds=float(os.getenv('REPO_COMMIT_WAIT_SECONDS', '0.002')),
+    )
+    replicas = [p.strip() for p in os.getenv('REPLICA_PATHS', '').split(',') if p.strip()]
+    staleness = os.getenv('REPLICA_MAX_STALENESS_SECONDS')
+    key = (
+        backend,
+        tuple(os.path.abspath(p) for p in paths.values()),
+        tuple(os.path.abspath(p) for p in replicas),
+        os.getenv('READ_POLICY', 'round_robin'),
+        staleness,
+        tuple(commit.values()),
+    )
+    with _repositories_lock:
+        repo = _repositories.get(key)
+        if repo is not None:
+            return repo
+        repo = RepositoryFactory.create(backend_type=backend, **paths, **commit)
+        if replicas:
+            repo = LeaderFollowerRepository(
+                repo,
+                [
+                    RepositoryFactory.create(
+                        backend_type=backend, json_path=p, pickle_path=p, sqlite_path=p,
+                        **commit
+                    )
+                    for p in replicas
+                ],
+                read_policy=key[3],
+                max_staleness_seconds=float(staleness) if staleness else None,
+                log_capacity=int(os.getenv('REPLICATION_LOG_CAPACITY', '1024')),
+            )
+        _repositories[key] = repo
+    return repo
+
+
+index_builder = IndexBuilder(
+    debounce_seconds=float(os.getenv('INDEX_DEBOUNCE_SECONDS', '0.05'))
+)
+
+_cache_bytes = int(os.getenv('QUERY_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+query_cache = LRUCache(
+    max_bytes=_cache_bytes,
+    ttl_seconds=float(os.getenv('QUERY_CACHE_TTL_SECONDS', '300')) or None,
+) if _cache_bytes > 0 else None
+
+
+index_tuner = IndexTuner(
+    target_recall=float(os.getenv('INDEX_TUNE_TARGET_RECALL', '0.95')),
+    min_size=int(os.getenv('INDEX_TUNE_MIN_SIZE', '256')),
+    growth=float(os.getenv('INDEX_TUNE_GROWTH', '2.0')),
+)
+
+
+REQUEST_SECONDS = metrics.histogram(
+    "vectordb_request_seconds",
+    "HTTP request latency per endpoint, until the response headers are ready.",
+    ["method", "route", "status"],
+)
+metrics.gauge(
+    "vectordb_index_memory_bytes",
+    "Estimated memory held by built indexes, per algorithm.",
+    lambda: {(algo,): n for algo, n in index_builder.memory().items()},
+    ["algorithm"],
+)
+if query_cache is not None:
+    metrics.gauge(
+        "vectordb_query_cache_lookups_total",
+        "Search result cache lookups by result (hit or miss).",
+        lambda: {("hit",): query_cache.hits, ("miss",): query_cache.misses},
+        ["result"],
+        kind="counter",
+    )
+    metrics.gauge(
+        "vectordb_query_cache_bytes",
+        "Bytes held by the search result cache.",
+        lambda: {(): query_cache.bytes},
+    )
 
 
 def get_service(repo: BaseLibraryRepository = Depends(get_repository)) -> LibraryService:
-    return LibraryService(repo)
+    return LibraryService(repo, indexes=index_builder, cache=query_cache, tuner=index_tuner)
+
+
+DEFAULT_EMBEDDER = os.getenv('DEFAULT_EMBEDDER', 'cohere')
+
+
+def _make_embedder(name: str) -> Embedder:
+    return EmbedderFactory.create(
+        name,
+        pool=os.getenv('EMBEDDER_POOL') or None,
+        workers=int(os.getenv('EMBEDDER_WORKERS', '4')),
+    )
+
+
+embedding_batchers = BatcherPool(
+    _make_embedder,
+    max_wait_seconds=float(os.getenv('EMBED_BATCH_WAIT_SECONDS', '0.005')),
+)
+
+
+def get_batchers() -> BatcherPool:
+    return embedding_batchers
+
+
+async def _embed(
+    batchers: BatcherPool,
+    lib: Library,
+    text: str,
+    input_type: str
+) -> List[float]:
+    try:
+        batcher = batchers.get(lib.embedder or DEFAULT_EMBEDDER, input_type)
+    except ValueError as e:
+        raise HTTPException(503, f"Embedding provider not configured: {e}")
+    try:
+        return await batcher.embed(text)
+    except ValueError as e:
+        raise HTTPException(502, str(e))
 
 
 app = FastAPI()
@@ -41,36 +195,78 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+
+@app.middleware("http")
+async def version_token(request: Request, call_next):
+    """
+    Read-your-writes for replicated repositories: the client echoes the
+    token from its last response, and reads are only served by replicas
+    that have caught up to it.
+    """
+    try:
+        min_seq = int(request.headers.get(VERSION_TOKEN_HEADER, 0))
+    except ValueError:
+        min_seq = 0
+    with read_session(min_seq) as session:
+        response = await call_next(request)
+    if session.min_seq:
+        response.headers[VERSION_TOKEN_HEADER] = str(session.min_seq)
+    return response
+
+
 @app.get("/", include_in_schema=False)
 async def root() -> RedirectResponse:
     return RedirectResponse(url="/docs")
 
 
-@app.post("/libraries", response_model=Library)
-async def create_library(
+# Writes are plain functions, run in FastAPI's threadpool: waiting for a
+# group commit must not hold up the event loop, nor the writes that would
+# share the commit.
+@app.post("/libraries", response_model=LibraryOut)
+def create_library(
     req: LibraryCreate,
     service: LibraryService = Depends(get_service)
-) -> Library:
-    return service.create_library(req.name, req.metadata)
+) -> LibraryOut:
+    try:
+        return service.create_library(req.name, req.metadata, req.embedder, req.shards)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 
-@app.get("/libraries/{lib_id}")
+@app.get("/libraries/{lib_id}", response_model=None)
 async def read_library(
     lib_id: str,
+    documents: bool = True,
     service: LibraryService = Depends(get_service)
-) -> Library:
+) -> Union[LibraryOut, LibraryHeaderOut]:
+    """With `documents=false`, only the library's own fields (constant time)."""
     try:
-        return service.get_library(lib_id)
+        if not documents:
+            return LibraryHeaderOut.model_validate(service.get_library_header(lib_id))
+        return LibraryOut.model_validate(service.get_library(lib_id))
     except ValueError:
         raise HTTPException(404, "Library not found")
 
 
 @app.put("/libraries/{lib_id}")
-async def update_library(
+def update_library(
     lib_id: str,
     req: LibraryCreate,
     service: LibraryService = Depends(get_service)
-) -> Library:
+) -> LibraryHeaderOut:
     try:
         return service.update_library(lib_id, req.name, req.metadata)
     except ValueError:
@@ -78,7 +274,7 @@ async def update_library(
 
 
 @app.delete("/libraries/{lib_id}")
-async def delete_library(
+def delete_library(
     lib_id: str,
     service: LibraryService = Depends(get_service)
 ) -> None:
@@ -88,12 +284,12 @@ async def delete_library(
         raise HTTPException(404, "Library not found")
 
 
-@app.post("/libraries/{lib_id}/documents", response_model=Document)
-async def create_document(
+@app.post("/libraries/{lib_id}/documents", response_model=DocumentOut)
+def create_document(
     lib_id: str,
     req: DocumentCreate,
     service: LibraryService = Depends(get_service)
-) -> Document:
+) -> DocumentOut:
     try:
         return service.create_document(lib_id, req.id, req.title, req.metadata)
     except ValueError as e:
@@ -108,36 +304,121 @@ async def list_documents(
     return service.list_documents(lib_id)
 
 
-@app.post("/libraries/{lib_id}/chunks", response_model=Chunk)
-async def add_chunk(
+@app.post("/libraries/{lib_id}/chunks", response_model=ChunkOut)
+def add_chunk(
     lib_id: str,
     req: ChunkCreate,
     service: LibraryService = Depends(get_service)
-) -> Chunk:
+) -> ChunkOut:
     try:
         return service.add_chunk(
             lib_id,
             req.doc_id,
             req.text,
             req.embedding,
-            req.metadata
+            req.metadata,
+            dedupe=req.dedupe,
+            dedupe_distance=req.dedupe_distance
+        )
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+
+
+@app.post("/libraries/{lib_id}/chunks/bulk", response_model=List[ChunkIngestResult])
+def add_chunks(
+    lib_id: str,
+    req: ChunkBulkCreate,
+    request: Request,
+    service: LibraryService = Depends(get_service)
+) -> List[ChunkIngestResult]:
+    try:
+        results = service.add_chunks(
+            lib_id,
+            [c.model_dump() for c in req.chunks],
+            dedupe=req.dedupe,
+            dedupe_distance=req.dedupe_distance
+        )
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    return encoded(
+        request, [ChunkIngestResult(chunk=c, status=status) for c, status in results]
+    )
+
+
+@app.post("/libraries/{lib_id}/chunks/text", response_model=ChunkOut)
+async def add_text_chunk(
+    lib_id: str,
+    req: ChunkTextCreate,
+    service: LibraryService = Depends(get_service),
+    batchers: BatcherPool = Depends(get_batchers)
+) -> ChunkOut:
+    try:
+        lib = service.get_library_header(lib_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    embedding = await _embed(batchers, lib, req.text, "search_document")
+    try:
+        return await run_in_threadpool(
+            service.add_chunk,
+            lib_id,
+            req.doc_id,
+            req.text,
+            embedding,
+            req.metadata,
+            dedupe=req.dedupe,
+            dedupe_distance=req.dedupe_distance
         )
     except ValueError as e:
         raise HTTPException(404, str(e))
 
 
-@app.get("/libraries/{lib_id}/chunks", response_model=List[Chunk])  
+@app.get("/libraries/{lib_id}/chunks", response_model=List[ChunkOut])
 async def list_chunks(
     lib_id: str,
+    request: Request,
     offset: int = Query(0, ge=0),
     limit: int = Query(100, gt=0),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     service: LibraryService = Depends(get_service)
-) -> List[Chunk]:
-    return service.list_chunks(lib_id, limit, offset)
+):
+    """
+    A page of chunks. Pass the `X-Next-Cursor` response header back as
+    `cursor` to fetch the next page (it replaces `offset`). With
+    `format=ndjson` every chunk from the cursor on is streamed, one JSON
+    object per line, and `limit` is ignored.
+    """
+    try:
+        service.get_library_header(lib_id)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+    try:
+        if format == "ndjson":
+            chunks = service.iter_chunks(lib_id, cursor)
+            return StreamingResponse(
+                _ndjson(chunks), media_type="application/x-ndjson"
+            )
+        if cursor is None and offset:
+            return encoded(request, service.list_chunks(lib_id, limit, offset))
+        page, next_cursor = service.list_chunks_page(lib_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    page = encoded(request, page)
+    if next_cursor is not None:
+        page.headers["X-Next-Cursor"] = next_cursor
+    return page
+
+
+def _ndjson(chunks: Iterator[Chunk], batch: int = 256) -> Iterator[bytes]:
+    while True:
+        lines = [json.dumps(c.to_dict()) for c in itertools.islice(chunks, batch)]
+        if not lines:
+            return
+        yield ("\n".join(lines) + "\n").encode()
 
 
 @app.put("/libraries/{lib_id}/chunks/{chunk_id}", response_model=ChunkUpdate)
-async def update_chunk(
+def update_chunk(
     lib_id: str,
     chunk_id: UUID,
     req: ChunkUpdate,
@@ -156,7 +437,7 @@ async def update_chunk(
 
 
 @app.delete("/libraries/{lib_id}/chunks/{chunk_id}")
-async def delete_chunk(
+def delete_chunk(
     lib_id: str,
     chunk_id: UUID,
     service: LibraryService = Depends(get_service)
@@ -167,26 +448,185 @@ async def delete_chunk(
         raise HTTPException(404, str(e))
 
 
+def _search_body(results: list, profile: Optional[SearchProfile]) -> dict:
+    body = {"results": results}
+    if profile is not None:
+        body["profile"] = profile.report()
+    return body
+
+
 @app.post("/libraries/{lib_id}/search")
 async def search(
     lib_id: str,
     req: SearchRequest,
+    request: Request,
     service: LibraryService = Depends(get_service)
 ) -> dict:
-    try:
-        return {
-            "results": service.search(
+    with profiling(req.profile) as profile:
+        try:
+            results = service.search(
+                lib_id,
+                req.embedding,
+                req.k,
+                req.algorithm,
+                req.metadata_filter,
+                mode=req.mode,
+                query_text=req.text,
+                fusion=req.fusion,
+                alpha=req.alpha,
+                rerank=req.rerank,
+                mmr_lambda=req.mmr_lambda,
+                fetch_k=req.fetch_k,
+                max_per_document=req.max_per_document,
+                max_distance=req.max_distance,
+                radius=req.radius
+            )
+        except ValueError:
+            raise HTTPException(404, "Library not found")
+    return encoded(request, _search_body(results, profile))
+
+
+@app.post("/libraries/{lib_id}/search/batch")
+async def search_batch(
+    lib_id: str,
+    req: BatchSearchRequest,
+    request: Request,
+    service: LibraryService = Depends(get_service)
+) -> dict:
+    with profiling(req.profile) as profile:
+        try:
+            results = service.search_many(
                 lib_id,
+                req.embeddings,
+                req.texts,
+                req.k,
+                req.algorithm,
+                req.metadata_filter,
+                mode=req.mode,
+                fusion=req.fusion,
+                alpha=req.alpha,
+                rerank=req.rerank,
+                mmr_lambda=req.mmr_lambda,
+                fetch_k=req.fetch_k,
+                max_per_document=req.max_per_document,
+                max_distance=req.max_distance
+            )
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+    return encoded(request, _search_body(results, profile))
+
+
+@app.post("/search")
+async def federated_search(
+    req: FederatedSearchRequest,
+    request: Request,
+    service: LibraryService = Depends(get_service)
+) -> dict:
+    with profiling(req.profile) as profile:
+        try:
+            results = service.federated_search(
+                req.library_ids,
+                req.library_filter,
                 req.embedding,
                 req.k,
                 req.algorithm,
-                req.metadata_filter
+                req.metadata_filter,
+                mode=req.mode,
+                query_text=req.text,
+                fusion=req.fusion,
+                alpha=req.alpha,
+                rerank=req.rerank,
+                mmr_lambda=req.mmr_lambda,
+                fetch_k=req.fetch_k,
+                max_per_document=req.max_per_document,
+                max_distance=req.max_distance,
+                radius=req.radius
+            )
+        except ValueError as e:
+            raise HTTPException(404, str(e))
+    return encoded(request, _search_body(results, profile))
+
+
+@app.post("/libraries/{lib_id}/search/text")
+async def search_text(
+    lib_id: str,
+    req: TextSearchRequest,
+    request: Request,
+    service: LibraryService = Depends(get_service),
+    batchers: BatcherPool = Depends(get_batchers)
+) -> dict:
+    try:
+        lib = service.get_library_header(lib_id)
+    except ValueError:
+        raise HTTPException(404, "Library not found")
+    embedding = None
+    if req.mode != "keyword":
+        embedding = await _embed(batchers, lib, req.text, "search_query")
+    with profiling(req.profile) as profile:
+        try:
+            results = service.search(
+                lib_id,
+                embedding,
+                req.k,
+                req.algorithm,
+                req.metadata_filter,
+                mode=req.mode,
+                query_text=req.text,
+                fusion=req.fusion,
+                alpha=req.alpha,
+                rerank=req.rerank,
+                mmr_lambda=req.mmr_lambda,
+                fetch_k=req.fetch_k,
+                max_per_document=req.max_per_document,
+                max_distance=req.max_distance
             )
-        }
+        except ValueError:
+            raise HTTPException(404, "Library not found")
+    return encoded(request, _search_body(results, profile))
+
+
+@app.post("/libraries/{lib_id}/dedupe", response_model=DedupeReport)
+def dedupe_library(
+    lib_id: str,
+    req: DedupeRequest,
+    service: LibraryService = Depends(get_service)
+) -> DedupeReport:
+    try:
+        return service.dedupe_library(lib_id, req.max_distance, req.action)
+    except ValueError as e:
+        raise HTTPException(404, str(e))
+
+
+@app.get("/libraries/{lib_id}/index", response_model=LibraryIndexStatus)
+async def read_index_status(
+    lib_id: str,
+    service: LibraryService = Depends(get_service)
+) -> LibraryIndexStatus:
+    try:
+        return service.index_status(lib_id)
     except ValueError:
         raise HTTPException(404, "Library not found")
 
 
+@app.get("/replication/status")
+async def replication_status(
+    repo: BaseLibraryRepository = Depends(get_repository)
+) -> dict:
+    if not isinstance(repo, LeaderFollowerRepository):
+        raise HTTPException(404, "Replication is not configured")
+    return repo.status()
+
+
+@app.get("/cache/stats")
+async def cache_stats() -> dict:
+    return query_cache.stats() if query_cache else {"enabled": False}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check() -> dict:
     return {"status": "ok"}
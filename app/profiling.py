@@ -0,0 +1,94 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from infrastructure.index.stats import TraversalStats
+
+
+@dataclass
+class SearchProfile:
+    """
+    Execution report of one search request: time per stage, summed over
+    the request, and one plan per library searched.
+    """
+    started: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+    plans: List[Dict[str, Any]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_seconds": time.perf_counter() - self.started,
+                "stages": dict(self.stages),
+                "plans": [dict(p) for p in self.plans],
+            }
+
+
+_profile: ContextVar[Optional[SearchProfile]] = ContextVar("search_profile", default=None)
+_plan: ContextVar[Optional[Dict[str, Any]]] = ContextVar("search_plan", default=None)
+
+
+@contextmanager
+def profiling(enabled: bool = True) -> Iterator[Optional[SearchProfile]]:
+    """Collects a `SearchProfile` for searches run in this context."""
+    if not enabled:
+        yield None
+        return
+    profile = SearchProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def current() -> Optional[SearchProfile]:
+    return _profile.get()
+
+
+@contextmanager
+def plan(**fields: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """Opens the plan of one library's search when profiling."""
+    profile = _profile.get()
+    if profile is None:
+        yield None
+        return
+    entry = dict(fields)
+    with profile._lock:
+        profile.plans.append(entry)
+    token = _plan.set(entry)
+    try:
+        yield entry
+    finally:
+        _plan.reset(token)
+
+
+def note(key: str, value: Any) -> None:
+    """Sets `key` on the current plan unless already set (hybrid searches report twice)."""
+    entry = _plan.get()
+    if entry is not None:
+        entry.setdefault(key, value)
+
+
+def traversal(work: TraversalStats, indexed_rows: int) -> Dict[str, Any]:
+    """
+    Traversal counters of one index search. Pruning efficiency is the share
+    of indexed rows whose distance to the query was never computed.
+    """
+    return {
+        "nodes_visited": work.nodes_visited,
+        "leaves_scanned": work.leaves_scanned,
+        "distance_evaluations": work.distance_evaluations,
+        "subtrees_pruned": work.subtrees_pruned,
+        "indexed_rows": indexed_rows,
+        "pruning_efficiency": max(0.0, 1 - work.distance_evaluations / indexed_rows)
+        if indexed_rows else 0.0,
+    }
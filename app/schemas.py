@@ -3,9 +3,57 @@ from uuid import UUID
 from pydantic import BaseModel, field_validator, model_validator
 
 
+class ChunkOut(BaseModel):
+    """A chunk as returned by the API, read from the domain record."""
+    id: UUID
+    text: str
+    embedding: List[float]
+    metadata: Dict[str, Any]
+
+    @field_validator("embedding", mode="before")
+    def embedding_list(cls, v: Any) -> Any:
+        return v.tolist() if hasattr(v, "tolist") else v
+
+    model_config = {"from_attributes": True}
+
+
+class DocumentOut(BaseModel):
+    id: UUID
+    title: str
+    chunks: List[ChunkOut]
+    metadata: Dict[str, Any]
+
+    model_config = {"from_attributes": True}
+
+
+class LibraryHeaderOut(BaseModel):
+    """A library without its documents; reading it never loads them."""
+    id: UUID
+    name: str
+    metadata: Dict[str, Any]
+    version: int = 0
+    embedder: Optional[str] = None
+    shards: int = 1
+    index_config: Optional[Dict[str, Any]] = None
+
+    model_config = {"from_attributes": True}
+
+
+class LibraryOut(LibraryHeaderOut):
+    documents: List[DocumentOut]
+
+
 class LibraryCreate(BaseModel):
     name: str
     metadata: Dict[str, Any]
+    embedder: Optional[str] = None  # server default when omitted; fixed at creation
+    shards: int = 1  # index shards; fixed at creation
+
+    @field_validator("shards")
+    def valid_shards(cls, v: int) -> int:
+        if not 1 <= v <= 64:
+            raise ValueError("shards must be between 1 and 64")
+        return v
 
     model_config = {"from_attributes": True}
 
@@ -21,7 +69,24 @@ class DocumentCreate(BaseModel):
     }
 
 
-class ChunkCreate(BaseModel):
+class DedupeOptions(BaseModel):
+    dedupe: Optional[str] = None  # skip | merge | flag; no check when omitted
+    dedupe_distance: float = 0.0
+
+    @field_validator("dedupe")
+    def valid_dedupe(cls, v: Optional[str]) -> Optional[str]:
+        if v not in (None, "skip", "merge", "flag"):
+            raise ValueError("dedupe must be one of: skip, merge, flag")
+        return v
+
+    @field_validator("dedupe_distance")
+    def valid_dedupe_distance(cls, v: float) -> float:
+        if v < 0:
+            raise ValueError("dedupe_distance must not be negative")
+        return v
+
+
+class ChunkCreate(DedupeOptions):
     doc_id: UUID
     text: str
     embedding: List[float]
@@ -54,16 +119,115 @@ class ChunkUpdate(BaseModel):
     }
 
 
-class SearchRequest(BaseModel):
+class ChunkTextCreate(DedupeOptions):
+    """Chunk whose embedding is computed by the server."""
+    doc_id: UUID
+    text: str
+    metadata: Dict[str, Any]
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class ChunkItem(BaseModel):
+    doc_id: UUID
+    text: str
     embedding: List[float]
+    metadata: Dict[str, Any]
+
+
+class ChunkBulkCreate(DedupeOptions):
+    chunks: List[ChunkItem]
+
+
+class ChunkIngestResult(BaseModel):
+    chunk: ChunkOut
+    status: str  # added | skipped | merged | flagged
+
+
+class DedupeRequest(BaseModel):
+    max_distance: float = 0.0
+    action: str = "report"
+
+    @field_validator("max_distance")
+    def valid_distance(cls, v: float) -> float:
+        if v < 0:
+            raise ValueError("max_distance must not be negative")
+        return v
+
+    @field_validator("action")
+    def valid_action(cls, v: str) -> str:
+        if v not in ("report", "remove", "merge", "flag"):
+            raise ValueError("action must be one of: report, remove, merge, flag")
+        return v
+
+
+class DuplicateCluster(BaseModel):
+    kept: UUID
+    duplicates: List[UUID]
+
+
+class DedupeReport(BaseModel):
+    action: str
+    clusters: List[DuplicateCluster]
+    removed: int
+
+
+class SearchOptions(BaseModel):
     k: int = 1
     algorithm: str = "kd"
     metadata_filter: Optional[Dict[str, Any]] = None
+    mode: str = "vector"
+    fusion: str = "rrf"
+    alpha: float = 0.5
+    rerank: Optional[str] = None
+    mmr_lambda: float = 0.5
+    fetch_k: Optional[int] = None
+    max_per_document: Optional[int] = None
+    max_distance: Optional[float] = None
+    profile: bool = False  # return an execution report with the results
+
+    @field_validator("mode")
+    def valid_mode(cls, v: str) -> str:
+        if v not in ("vector", "keyword", "hybrid"):
+            raise ValueError("mode must be one of: vector, keyword, hybrid")
+        return v
+
+    @field_validator("fusion")
+    def valid_fusion(cls, v: str) -> str:
+        if v not in ("rrf", "weighted"):
+            raise ValueError("fusion must be one of: rrf, weighted")
+        return v
+
+    @field_validator("alpha", "mmr_lambda")
+    def valid_weight(cls, v: float) -> float:
+        if not 0.0 <= v <= 1.0:
+            raise ValueError("weights must be between 0 and 1")
+        return v
+
+    @field_validator("rerank")
+    def valid_rerank(cls, v: Optional[str]) -> Optional[str]:
+        if v not in (None, "mmr"):
+            raise ValueError("rerank must be 'mmr' or omitted")
+        return v
+
+    @field_validator("max_distance")
+    def valid_distance(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and v < 0:
+            raise ValueError("distances must not be negative")
+        return v
+
+    @field_validator("fetch_k", "max_per_document")
+    def valid_positive(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("must be greater than 0")
+        return v
 
     @field_validator("algorithm")
     def valid_algorithm(cls, v: str) -> str:
-        if v not in ("kd", "ball", "linear"):
-            raise ValueError("algorithm must be one of: kd, ball, linear")
+        if v not in ("kd", "ball", "linear", "auto"):
+            raise ValueError("algorithm must be one of: kd, ball, linear, auto")
         return v
 
     @field_validator("k")
@@ -75,3 +239,75 @@ class SearchRequest(BaseModel):
     model_config = {
         "from_attributes": True
     }
+
+
+class SearchRequest(SearchOptions):
+    embedding: Optional[List[float]] = None
+    text: Optional[str] = None
+    radius: Optional[float] = None  # all chunks within this distance; k is ignored
+
+    @model_validator(mode="after")
+    def inputs_for_mode(self) -> "SearchRequest":
+        if self.mode != "keyword" and self.embedding is None:
+            raise ValueError(f"embedding is required for {self.mode} search")
+        if self.mode != "vector" and not self.text:
+            raise ValueError(f"text is required for {self.mode} search")
+        if self.radius is not None and (self.mode != "vector" or self.radius < 0):
+            raise ValueError("radius must be non-negative and is only supported in vector mode")
+        if self.max_distance is not None and self.embedding is None:
+            raise ValueError("max_distance requires an embedding")
+        return self
+
+
+class BatchSearchRequest(SearchOptions):
+    embeddings: Optional[List[List[float]]] = None
+    texts: Optional[List[str]] = None
+
+    @model_validator(mode="after")
+    def inputs_for_mode(self) -> "BatchSearchRequest":
+        if self.mode != "keyword" and self.embeddings is None:
+            raise ValueError(f"embeddings are required for {self.mode} search")
+        if self.mode != "vector" and self.texts is None:
+            raise ValueError(f"texts are required for {self.mode} search")
+        if self.embeddings is not None and self.texts is not None \
+                and len(self.embeddings) != len(self.texts):
+            raise ValueError("embeddings and texts must have the same length")
+        if self.max_distance is not None and self.embeddings is None:
+            raise ValueError("max_distance requires embeddings")
+        return self
+
+
+class FederatedSearchRequest(SearchRequest):
+    library_ids: Optional[List[str]] = None
+    library_filter: Optional[Dict[str, Any]] = None  # matched against library metadata
+
+    @model_validator(mode="after")
+    def one_selector(self) -> "FederatedSearchRequest":
+        if (self.library_ids is None) == (self.library_filter is None):
+            raise ValueError("exactly one of library_ids or library_filter is required")
+        return self
+
+
+class TextSearchRequest(SearchOptions):
+    text: str
+
+
+class IndexStatus(BaseModel):
+    algorithm: str
+    state: str
+    version: Optional[int] = None
+    target_version: Optional[int] = None
+    size: int = 0
+    queued_at: Optional[float] = None
+    built_at: Optional[float] = None
+    build_seconds: Optional[float] = None
+    error: Optional[str] = None
+    reason: Optional[str] = None  # initial | stale | config | tombstones | imbalance
+
+
+class LibraryIndexStatus(BaseModel):
+    library_id: UUID
+    version: int
+    indexes: List[IndexStatus]
+    index_config: Optional[Dict[str, Any]] = None  # auto-tuned algorithm and params
+    tuning: Optional[Dict[str, Any]] = None
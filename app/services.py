@@ -1,22 +1,209 @@
+import contextvars
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4, UUID
-from typing import List, Dict, Any, Optional
-from domain.models import Library, Document, Chunk
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from domain.models import Library, Document, Chunk, embedding_matrix
+from infrastructure.embeddings import EmbedderFactory
+from infrastructure.index.base import BaseIndex
+from infrastructure.index.bm25 import BM25Index
 from infrastructure.index.factory import IndexFactory
-from utils.pagination import paginate
+from infrastructure.index.linear import LinearIndex
+from infrastructure.index.stats import collect
+from utils.pagination import ChunkReader, cursor_page, decode_cursor, iter_chunks
+from infrastructure.repositories import group_commit
 from infrastructure.repositories.base import BaseLibraryRepository
+from utils.cache import LRUCache
+from utils.dedupe import duplicate_clusters, text_hash
+from utils.fusion import reciprocal_rank_fusion, weighted_fusion
+from utils.rerank import cap_per_group, mmr
+from utils import metrics
+from app import profiling
+from app.indexing import IndexBuilder
+from app.tuning import IndexTuner, UNTUNED_ALGORITHM
+
+
+SEARCH_MODES = ("vector", "keyword", "hybrid")
+FUSION_METHODS = ("rrf", "weighted")
+DEDUPE_MODES = ("skip", "merge", "flag")
+DEDUPE_ACTIONS = ("report", "remove", "merge", "flag")
+DEDUPE_ALGORITHM = "kd"
+
+SEARCH_STAGE_SECONDS = metrics.histogram(
+    "vectordb_search_stage_seconds",
+    "Time spent per search stage: filter, index, traversal, assembly, keyword, rerank.",
+    ["stage"],
+)
+SEARCH_NODES_VISITED = metrics.histogram(
+    "vectordb_search_nodes_visited",
+    "Index nodes visited per vector search.",
+    buckets=metrics.COUNT_BUCKETS,
+)
+SEARCH_DISTANCE_COMPUTATIONS = metrics.histogram(
+    "vectordb_search_distance_computations",
+    "Distance evaluations per vector search.",
+    buckets=metrics.COUNT_BUCKETS,
+)
+
+
+
+def _stage(name: str, seconds: float) -> None:
+    SEARCH_STAGE_SECONDS.observe(seconds, stage=name)
+    profile = profiling.current()
+    if profile is not None:
+        profile.add_stage(name, seconds)
+
+
+def _submit(pool: ThreadPoolExecutor, fn, *args):
+    """`pool.submit` in a copy of this context, so a search profile follows the task."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+_search_pool = ThreadPoolExecutor(max_workers=8)
+# separate from _search_pool: federated tasks wait on hybrid searches submitted there
+_federation_pool = ThreadPoolExecutor(max_workers=8)
+
+
+_write_locks: Dict[str, threading.RLock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _serialized(method):
+    """
+    Runs a read-modify-write of one library under that library's lock. The
+    write is acknowledged once the lock is released, so the next writer of
+    the library can join its group commit.
+    """
+    @functools.wraps(method)
+    def wrapper(self, lib_id, *args, **kwargs):
+        with _write_locks_guard:
+            lock = _write_locks.setdefault(str(lib_id), threading.RLock())
+        with group_commit.deferred(), lock:
+            return method(self, lib_id, *args, **kwargs)
+    return wrapper
+
+
+def _search_cache_key(
+    lib: Library,
+    query_embedding: Optional[List[float]],
+    k: int,
+    algorithm: str,
+    params: Dict[str, Any]
+) -> Tuple[str, int, str, int, str, bytes]:
+    query = np.asarray(
+        query_embedding if query_embedding is not None else [], dtype=np.float32
+    ).tobytes()
+    return (
+        str(lib.id),
+        lib.version,
+        algorithm,
+        k,
+        json.dumps(params, sort_keys=True, default=str),
+        hashlib.blake2b(query, digest_size=16).digest(),
+    )
+
+
+def _check_search(
+    mode: str,
+    fusion: str,
+    rerank: Optional[str],
+    query_embedding: Optional[List[float]],
+    query_text: Optional[str],
+    max_distance: Optional[float],
+    radius: Optional[float]
+) -> None:
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+    if fusion not in FUSION_METHODS:
+        raise ValueError(f"fusion must be one of: {', '.join(FUSION_METHODS)}")
+    if rerank not in (None, 'mmr'):
+        raise ValueError("rerank must be 'mmr' or omitted")
+    if mode != 'keyword' and query_embedding is None:
+        raise ValueError(f"An embedding is required for {mode} search")
+    if mode != 'vector' and not query_text:
+        raise ValueError(f"Query text is required for {mode} search")
+    if radius is not None and mode != 'vector':
+        raise ValueError("radius is only supported for vector search")
+    if max_distance is not None and query_embedding is None:
+        raise ValueError("max_distance requires an embedding")
+
+
+def _matches(chunk: Chunk, metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    return not metadata_filter or all(
+        chunk.metadata.get(k) == v for k, v in metadata_filter.items()
+    )
+
+
+def _distance(query_embedding: List[float], chunk: Chunk) -> float:
+    # float32, like the stored embeddings and the indexes
+    return float(np.linalg.norm(
+        np.asarray(query_embedding, dtype=np.float32) - chunk.embedding
+    ))
+
+
+def _merge_metadata(into: Chunk, other: Dict[str, Any]) -> None:
+    """Adds keys from `other` that `into` lacks; existing values win."""
+    into.metadata = {**other, **into.metadata}
+
+
+def _results_size(results: List[Dict[str, Any]]) -> int:
+    """Rough retained size of a result list, used to bound the cache."""
+    return sum(
+        128 + len(r["chunk"].text) + 8 * len(r["chunk"].embedding)
+        for r in results
+    )
 
 
 class LibraryService:
-    def __init__(self, repo: BaseLibraryRepository) -> None:
+    def __init__(
+        self,
+        repo: BaseLibraryRepository,
+        indexes: Optional[IndexBuilder] = None,
+        cache: Optional[LRUCache] = None,
+        tuner: Optional[IndexTuner] = None
+    ) -> None:
         self.repo = repo
+        self.indexes = indexes
+        self.cache = cache
+        self.tuner = tuner
+
+    def _save(self, lib: Library, write: Callable[[], Any]) -> None:
+        """
+        Bumps the version of `lib`, which already holds the change, and
+        persists the change with `write`, a fine-grained repository call.
+        """
+        lib.version += 1
+        lib.pack(force=False)
+        write()
+        if self.cache is not None:
+            self.cache.invalidate(str(lib.id))
 
     def create_library(
         self,
         name: str,
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        embedder: Optional[str] = None,
+        shards: int = 1
     ) -> Library:
-        lib = Library(id=uuid4(), name=name, documents=[], metadata=metadata)
+        if embedder is not None and not EmbedderFactory.supports(embedder):
+            raise ValueError(f"Unsupported embedder '{embedder}'")
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        lib = Library(
+            id=uuid4(),
+            name=name,
+            documents=[],
+            metadata=metadata,
+            embedder=embedder,
+            shards=shards
+        )
         self.repo.add(lib)
         return lib
 
@@ -26,22 +213,70 @@ class LibraryService:
             raise ValueError('Library not found')
         return lib
 
+    def get_library_header(self, lib_id: str) -> Library:
+        """The library with its documents read only if accessed."""
+        lib = self.repo.get_header(lib_id)
+        if not lib:
+            raise ValueError('Library not found')
+        return lib
+
+    def _get_for_update(self, lib_id: str) -> Library:
+        """Reads that feed a write must see the latest committed state."""
+        lib = self.repo.get_for_update(lib_id)
+        if not lib:
+            raise ValueError('Library not found')
+        return lib
+
+    def _document(self, lib: Library, doc_id: UUID) -> Optional[Document]:
+        """
+        A document of `lib` to write to. Unless the library is loaded, only
+        that document is read, so a write does not load the library.
+        """
+        if lib.loaded:
+            return next((d for d in lib.documents if d.id == doc_id), None)
+        return self.repo.get_document(str(lib.id), doc_id)
+
+    def _find_chunk(self, lib: Library, chunk_id: UUID) -> Optional[Tuple[Document, int]]:
+        """The document holding a chunk of `lib` and its position, read like `_document`."""
+        if lib.loaded:
+            documents = lib.documents
+        else:
+            doc_id = self.repo.document_of(str(lib.id), chunk_id)
+            doc = self.repo.get_document(str(lib.id), doc_id) if doc_id else None
+            documents = [doc] if doc is not None else []
+        for d in documents:
+            for i, c in enumerate(d.chunks):
+                if c.id == chunk_id:
+                    return d, i
+        return None
+
+    @_serialized
     def update_library(
         self,
         lib_id: str,
         name: str,
         metadata: Dict[str, Any]
     ) -> Library:
-        lib = self.get_library(lib_id)
+        lib = self._get_for_update(lib_id)
         lib.name = name
         lib.metadata = metadata
-        self.repo.update(lib)
+        self._save(lib, lambda: self.repo.update_header(lib))
+        if self.indexes:
+            self.indexes.apply(lib)
         return lib
 
+    @_serialized
     def delete_library(self, lib_id: str) -> None:
-        self.get_library(lib_id)
+        self._get_for_update(lib_id)
         self.repo.delete(lib_id)
+        if self.indexes:
+            self.indexes.discard(lib_id)
+        if self.tuner:
+            self.tuner.discard(lib_id)
+        if self.cache is not None:
+            self.cache.invalidate(lib_id)
 
+    @_serialized
     def create_document(
         self,
         lib_id: str,
@@ -49,14 +284,18 @@ class LibraryService:
         title: str,
         metadata: Dict[str, Any]
     ) -> Document:
-        lib = self.get_library(lib_id)
-        if any(d.id == doc_id for d in lib.documents):
+        lib = self._get_for_update(lib_id)
+        if self._document(lib, doc_id) is not None:
             raise ValueError("Document already exists")
         doc = Document(id=doc_id, title=title, chunks=[], metadata=metadata)
-        lib.documents.append(doc)
-        self.repo.update(lib)
+        if lib.loaded:
+            lib.documents.append(doc)
+        self._save(lib, lambda: self.repo.upsert_document(lib, doc))
+        if self.indexes:
+            self.indexes.apply(lib)
         return doc
 
+    @_serialized
     def add_document(
         self,
         lib_id: str,
@@ -64,13 +303,20 @@ class LibraryService:
         title: str,
         metadata: Dict[str, Any]
     ) -> None:
-        lib = self.get_library(lib_id)
+        lib = self._get_for_update(lib_id)
         doc = Document(id=doc_id, title=title, chunks=[], metadata=metadata)
-        lib.documents.append(doc)
-        self.repo.update(lib)
+        if lib.loaded:
+            lib.documents.append(doc)
+        self._save(lib, lambda: self.repo.upsert_document(lib, doc))
+        if self.indexes:
+            self.indexes.apply(lib)
 
     def list_documents(self, lib_id: str) -> List[Document]:
-        return self.get_library(lib_id).documents
+        """The library's documents, without their chunks."""
+        documents = self.repo.list_documents(lib_id)
+        if documents is None:
+            raise ValueError('Library not found')
+        return documents
 
     def add_chunk(
         self,
@@ -78,21 +324,187 @@ class LibraryService:
         doc_id: UUID,
         text: str,
         embedding: List[float],
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
     ) -> Chunk:
-        lib = self.get_library(lib_id)
-        doc = next((d for d in lib.documents if d.id == doc_id), None)
-        if doc is None:
+        item = {"doc_id": doc_id, "text": text, "embedding": embedding, "metadata": metadata}
+        chunk, _ = self.add_chunks(lib_id, [item], dedupe, dedupe_distance)[0]
+        return chunk
+
+    @_serialized
+    def add_chunks(
+        self,
+        lib_id: str,
+        items: List[Dict[str, Any]],
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
+    ) -> List[Tuple[Chunk, str]]:
+        """
+        Adds `items` (doc_id, text, embedding, metadata) in one write.
+
+        With `dedupe`, each item is checked against the library index and
+        the earlier items of the batch: a chunk with the same normalised
+        text, or an embedding within `dedupe_distance`, is a duplicate. It
+        is then skipped, merged into the existing chunk (metadata keys the
+        existing chunk lacks), or added with `duplicate_of` in its metadata.
+        Returns (chunk, status) per item, status being one of added,
+        skipped, merged or flagged; skipped/merged items return the
+        existing chunk.
+        """
+        if dedupe is not None and dedupe not in DEDUPE_MODES:
+            raise ValueError(f"Unsupported dedupe mode '{dedupe}'")
+        lib = self._get_for_update(lib_id)
+        if dedupe:  # checked against the whole library, which is then loaded
+            hashes = {
+                text_hash(c.text): c for d in lib.documents for c in d.chunks
+            }
+            rows, index = self._index_for(lib, DEDUPE_ALGORITHM, None)
+        docs = {doc_id: self._document(lib, doc_id) for doc_id in {i["doc_id"] for i in items}}
+        if any(d is None for d in docs.values()):
             raise ValueError('Document not found')
-        chunk = Chunk(
-            id=uuid4(),
-            text=text,
-            embedding=embedding,
-            metadata=metadata
+
+        fresh: List[Chunk] = []
+        added: List[Tuple[UUID, Chunk]] = []
+        merged: Dict[UUID, Chunk] = {}
+        results: List[Tuple[Chunk, str]] = []
+        for item in items:
+            dup = None
+            if dedupe:
+                dup = hashes.get(text_hash(item["text"]))
+                if dup is None and len(index):
+                    hit = index.nearest(item["embedding"], 1, dedupe_distance)
+                    dup = rows[hit[0]] if hit else None
+                if dup is None and fresh:
+                    dists = np.linalg.norm(
+                        embedding_matrix(fresh)
+                        - np.asarray(item["embedding"], dtype=np.float32),
+                        axis=1
+                    )
+                    if dists.min() <= dedupe_distance:
+                        dup = fresh[int(dists.argmin())]
+            if dup is not None and dedupe == "skip":
+                results.append((dup, "skipped"))
+                continue
+            if dup is not None and dedupe == "merge":
+                _merge_metadata(dup, item["metadata"])
+                merged[dup.id] = dup
+                results.append((dup, "merged"))
+                continue
+
+            metadata = dict(item["metadata"])
+            if dup is not None:
+                metadata["duplicate_of"] = str(dup.id)
+            chunk = Chunk(
+                id=uuid4(),
+                text=item["text"],
+                embedding=item["embedding"],
+                metadata=metadata
+            )
+            docs[item["doc_id"]].chunks.append(chunk)
+            fresh.append(chunk)
+            added.append((item["doc_id"], chunk))
+            if dedupe:
+                hashes.setdefault(text_hash(chunk.text), chunk)
+            results.append((chunk, "flagged" if dup is not None else "added"))
+
+        if fresh or merged:
+            def write() -> None:
+                if added:
+                    self.repo.add_chunks(lib, added)
+                new = {c.id for c in fresh}  # written in full by add_chunks
+                for chunk in merged.values():
+                    if chunk.id not in new:
+                        self.repo.update_chunk(lib, chunk)
+            self._save(lib, write)
+            if self.indexes:
+                upserted = {c.id: c for c in [*merged.values(), *fresh]}
+                self.indexes.apply(lib, upserted=list(upserted.values()))
+        return results
+
+    @_serialized
+    def dedupe_library(
+        self,
+        lib_id: str,
+        max_distance: float = 0.0,
+        action: str = "report"
+    ) -> Dict[str, Any]:
+        """
+        Clusters the library's duplicate chunks (same normalised text, or
+        embeddings chained within `max_distance`) and applies `action` to
+        every chunk but the earliest of each cluster: `report` changes
+        nothing, `remove` deletes them, `merge` deletes them after folding
+        their metadata into the kept chunk, `flag` sets `duplicate_of`.
+        """
+        if action not in DEDUPE_ACTIONS:
+            raise ValueError(f"Unsupported dedupe action '{action}'")
+        lib = self._get_for_update(lib_id)
+        chunks = [c for d in lib.documents for c in d.chunks]
+        clusters = self._duplicate_clusters(lib, chunks, max_distance) if chunks else []
+
+        changed: Dict[UUID, Chunk] = {}
+        removed = set()
+        for members in clusters:
+            keep = chunks[members[0]]
+            for i in members[1:]:
+                dup = chunks[i]
+                if action in ("remove", "merge"):
+                    removed.add(dup.id)
+                if action == "merge":
+                    _merge_metadata(keep, dup.metadata)
+                    changed[keep.id] = keep
+                elif action == "flag":
+                    dup.metadata = {**dup.metadata, "duplicate_of": str(keep.id)}
+                    changed[dup.id] = dup
+
+        if removed:
+            for d in lib.documents:
+                d.chunks = [c for c in d.chunks if c.id not in removed]
+        if changed or removed:
+            def write() -> None:
+                if removed:
+                    self.repo.delete_chunks(lib, list(removed))
+                for chunk in changed.values():
+                    self.repo.update_chunk(lib, chunk)
+            self._save(lib, write)
+            if self.indexes:
+                self.indexes.apply(
+                    lib, upserted=list(changed.values()), removed=list(removed)
+                )
+        return {
+            "action": action,
+            "clusters": [
+                {
+                    "kept": chunks[members[0]].id,
+                    "duplicates": [chunks[i].id for i in members[1:]],
+                }
+                for members in clusters
+            ],
+            "removed": len(removed),
+        }
+
+    def _duplicate_clusters(
+        self,
+        lib: Library,
+        chunks: List[Chunk],
+        max_distance: float
+    ) -> List[List[int]]:
+        """
+        `duplicate_clusters` of `chunks` (the library's, in order), looked
+        up in the library's current index, or in one built for the job.
+        """
+        vectors = embedding_matrix(chunks)
+        snap = self.indexes.snapshot(lib, DEDUPE_ALGORITHM) if self.indexes else None
+        if snap is not None:
+            # a chunk's live row is its last one; earlier ones are tombstoned
+            row_of = {c.id: row for row, c in enumerate(snap.rows)}
+            index, ids = snap.index, [row_of[c.id] for c in chunks]
+        else:
+            index = IndexFactory.create(DEDUPE_ALGORITHM, vectors, background_rebuild=False)
+            ids = None
+        return duplicate_clusters(
+            vectors, max_distance, index, keys=[text_hash(c.text) for c in chunks], ids=ids
         )
-        doc.chunks.append(chunk)
-        self.repo.update(lib)
-        return chunk
 
     def list_chunks(
         self,
@@ -100,11 +512,42 @@ class LibraryService:
         limit: int = 100,
         offset: int = 0
     ) -> List[Chunk]:
-        chunks = [
-            c for d in self.get_library(lib_id).documents for c in d.chunks
-        ]
-        return paginate(chunks, offset, limit)
+        chunks = self.repo.get_chunks(lib_id, offset, limit)
+        if chunks is None:
+            raise ValueError('Library not found')
+        return chunks
+
+    def _chunk_reader(self, lib_id: str) -> ChunkReader:
+        def read(document: Document, offset: int, limit: Optional[int]) -> List[Chunk]:
+            return self.repo.get_document_chunks(lib_id, document.id, offset, limit) or []
+        return read
+
+    def list_chunks_page(
+        self,
+        lib_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Chunk], Optional[str]]:
+        """
+        A page of chunks from `cursor` and the cursor of the next page. Only
+        the document list and the chunks on the page are read.
+        """
+        return cursor_page(
+            self.list_documents(lib_id), cursor, limit, self._chunk_reader(lib_id)
+        )
+
+    def iter_chunks(
+        self,
+        lib_id: str,
+        cursor: Optional[str] = None
+    ) -> Iterator[Chunk]:
+        """Every chunk from `cursor` on, read a document at a time."""
+        documents = self.list_documents(lib_id)
+        if cursor:
+            decode_cursor(cursor)  # fail before the caller starts streaming
+        return (c for _, _, c in iter_chunks(documents, cursor, self._chunk_reader(lib_id)))
 
+    @_serialized
     def update_chunk(
         self,
         lib_id: str,
@@ -113,58 +556,473 @@ class LibraryService:
         embedding: Optional[List[float]],
         metadata: Optional[Dict[str, Any]]
     ) -> Chunk:
-        lib = self.get_library(lib_id)
-
-        for doc in lib.documents:
-            for chunk in doc.chunks:
-                if chunk.id == chunk_id:
-                    if text is not None:
-                        chunk.text = text
-                    if embedding is not None:
-                        chunk.embedding = embedding
-                    if metadata is not None:
-                        chunk.metadata = metadata
-                    self.repo.update(lib)
-                    return chunk
-        raise ValueError("Chunk not found")
+        lib = self._get_for_update(lib_id)
+        found = self._find_chunk(lib, chunk_id)
+        if found is None:
+            raise ValueError("Chunk not found")
+        doc, i = found
+        chunk = doc.chunks[i]
+        if text is not None:
+            chunk.text = text
+        if embedding is not None:
+            chunk.embedding = embedding
+        if metadata is not None:
+            chunk.metadata = metadata
+        self._save(lib, lambda: self.repo.update_chunk(lib, chunk))
+        if self.indexes:
+            self.indexes.apply(lib, upserted=[chunk])
+        return chunk
 
+    @_serialized
     def delete_chunk(self, lib_id: str, chunk_id: UUID) -> None:
-        lib = self.get_library(lib_id)
-        for d in lib.documents:
-            for i, c in enumerate(d.chunks):
-                if c.id == chunk_id:
-                    del d.chunks[i]
-                    self.repo.update(lib)
-                    return
-        raise ValueError('Chunk not found')
+        lib = self._get_for_update(lib_id)
+        found = self._find_chunk(lib, chunk_id)
+        if found is None:
+            raise ValueError('Chunk not found')
+        doc, i = found
+        del doc.chunks[i]
+        self._save(lib, lambda: self.repo.delete_chunks(lib, [chunk_id]))
+        if self.indexes:
+            self.indexes.apply(lib, removed=[chunk_id])
+
+    def index_status(self, lib_id: str) -> Dict[str, Any]:
+        lib = self.get_library_header(lib_id)
+        return {
+            "library_id": lib.id,
+            "version": lib.version,
+            "indexes": self.indexes.status(lib_id) if self.indexes else [],
+            "index_config": lib.index_config,
+            "tuning": self.tuner.status(lib_id) if self.tuner else None,
+        }
+
+    @_serialized
+    def set_index_config(self, lib_id: str, config: Dict[str, Any]) -> Library:
+        """Store the auto-tuned index config; indexes are rebuilt with it."""
+        lib = self._get_for_update(lib_id)
+        lib.index_config = config
+        self._save(lib, lambda: self.repo.update_header(lib))
+        if self.indexes:
+            self.indexes.apply(lib, rebuild=True)
+        return lib
+
+    def _auto_algorithm(self, lib: Library) -> str:
+        if self.tuner is None:
+            return (lib.index_config or {}).get("algorithm", UNTUNED_ALGORITHM)
+        return self.tuner.resolve(
+            lib, functools.partial(self.set_index_config, str(lib.id))
+        )
+
+    def _index_for(
+        self,
+        lib: Library,
+        algorithm: str,
+        metadata_filter: Optional[Dict[str, Any]]
+    ) -> Tuple[List[Chunk], BaseIndex]:
+        """
+        Unfiltered searches use the builder's snapshot when it is current.
+        Filtered searches, and searches that arrive before the snapshot is
+        ready, scan the matching chunks directly instead of building a tree
+        on the request path.
+        """
+        start = time.perf_counter()
+        if self.indexes and not metadata_filter:
+            snap = self.indexes.snapshot(lib, algorithm)
+            if snap is not None:
+                _stage("index", time.perf_counter() - start)
+                profiling.note("filter", {"plan": "none"})
+                profiling.note("index", {
+                    "source": "cached",
+                    "algorithm": algorithm,
+                    "build_seconds": snap.build_seconds,
+                    "rows": len(snap.index),
+                })
+                return snap.rows, snap.index
+
+        total = sum(len(d.chunks) for d in lib.documents)
+        chunks = [
+            c for d in lib.documents for c in d.chunks
+            if _matches(c, metadata_filter)
+        ]
+        filtered = time.perf_counter()
+        _stage("filter", filtered - start)
+        embeddings = embedding_matrix(chunks)
+        if self.indexes:
+            built, index = "linear", LinearIndex(embeddings)
+        else:
+            built, index = algorithm, IndexFactory.create(algorithm, embeddings)
+        indexed = time.perf_counter()
+        _stage("index", indexed - filtered)
+        profiling.note("filter", {
+            "plan": "pre_filter_scan" if metadata_filter else "none",
+            "matched": len(chunks),
+            "total": total,
+            "selectivity": len(chunks) / total if total else 0.0,
+        })
+        profiling.note("index", {
+            "source": "built",
+            "algorithm": built,
+            "build_seconds": indexed - filtered,
+            "rows": len(chunks),
+            # without a filter, the scan stands in for a snapshot still being built
+            "reason": "metadata_filter" if metadata_filter else "snapshot_pending",
+        })
+        return chunks, index
+
+    def _vector_hits(
+        self,
+        lib: Library,
+        query_embedding: List[float],
+        k: int,
+        algorithm: str,
+        metadata_filter: Optional[Dict[str, Any]],
+        max_distance: Optional[float] = None,
+        radius: Optional[float] = None
+    ) -> List[Tuple[Chunk, float]]:
+        chunks, index = self._index_for(lib, algorithm, metadata_filter)
+        start = time.perf_counter()
+        with collect() as work:
+            if radius is not None:
+                idxs = index.radius_search(query_embedding, radius)
+            else:
+                idxs = index.nearest(query_embedding, k, max_distance)
+        traversed = time.perf_counter()
+        _stage("traversal", traversed - start)
+        SEARCH_NODES_VISITED.observe(work.nodes_visited)
+        SEARCH_DISTANCE_COMPUTATIONS.observe(work.distance_evaluations)
+        profiling.note("traversal", profiling.traversal(work, len(index)))
+        hits = [
+            (chunks[idx], _distance(query_embedding, chunks[idx]))
+            for idx in idxs
+        ]
+        _stage("assembly", time.perf_counter() - traversed)
+        return hits
+
+    def _keyword_hits(
+        self,
+        lib: Library,
+        query_text: str,
+        k: int,
+        metadata_filter: Optional[Dict[str, Any]]
+    ) -> List[Tuple[Chunk, float]]:
+        start = time.perf_counter()
+        by_id = {
+            c.id: c for d in lib.documents for c in d.chunks
+            if _matches(c, metadata_filter)
+        }
+        filtered = time.perf_counter()
+        _stage("filter", filtered - start)
+        if self.indexes:
+            bm25 = self.indexes.lexical(lib)
+        else:
+            bm25 = BM25Index.from_texts((c.id, c.text) for c in by_id.values())
+        allowed = set(by_id) if metadata_filter else None
+        hits = [(by_id[cid], score) for cid, score in bm25.search(query_text, k, allowed)]
+        _stage("keyword", time.perf_counter() - filtered)
+        if metadata_filter:
+            total = sum(len(d.chunks) for d in lib.documents)
+            profiling.note("filter", {
+                "plan": "bm25_allow_list",
+                "matched": len(by_id),
+                "total": total,
+                "selectivity": len(by_id) / total if total else 0.0,
+            })
+        else:
+            profiling.note("filter", {"plan": "none"})
+        return hits
 
     def search(
         self,
         lib_id: str,
-        query_embedding: List[float],
+        query_embedding: Optional[List[float]] = None,
         k: int = 1,
         algorithm: str = 'kd',
-        metadata_filter: Optional[Dict[str, Any]] = None
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = 'vector',
+        query_text: Optional[str] = None,
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+        rerank: Optional[str] = None,
+        mmr_lambda: float = 0.5,
+        fetch_k: Optional[int] = None,
+        max_per_document: Optional[int] = None,
+        max_distance: Optional[float] = None,
+        radius: Optional[float] = None
     ) -> List[Dict[str, Any]]:
+        """
+        `vector` ranks by embedding distance, `keyword` by BM25 over chunk
+        text, and `hybrid` retrieves both candidate sets in parallel and
+        fuses them with reciprocal-rank (`rrf`) or `weighted` score fusion
+        (`alpha` weighs the vector side).
+
+        With `rerank="mmr"` and/or `max_per_document`, `fetch_k` candidates
+        are retrieved first and narrowed to `k` by maximal marginal
+        relevance and a per-document cap.
+
+        `max_distance` drops results farther than that from the query (it
+        bounds the tree traversal in vector mode); `radius` (vector mode
+        only) returns every chunk within that distance instead of the top k.
+        """
+        _check_search(mode, fusion, rerank, query_embedding, query_text, max_distance, radius)
         lib = self.get_library(lib_id)
-        chunks = [c for d in lib.documents for c in d.chunks]
-        
-        if metadata_filter:
-            chunks = [
-                c for c in chunks
-                if all(c.metadata.get(k) == v for k, v in metadata_filter.items())
+        return self._search(
+            lib, query_embedding, k, algorithm, metadata_filter, mode,
+            query_text, fusion, alpha, rerank, mmr_lambda, fetch_k,
+            max_per_document, max_distance, radius
+        )
+
+    def search_many(
+        self,
+        lib_id: str,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        k: int = 1,
+        algorithm: str = 'kd',
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = 'vector',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+        rerank: Optional[str] = None,
+        mmr_lambda: float = 0.5,
+        fetch_k: Optional[int] = None,
+        max_per_document: Optional[int] = None,
+        max_distance: Optional[float] = None,
+        radius: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        One `search` per query against a single load of the library. Queries
+        are given as parallel lists of embeddings and/or texts, as the mode
+        requires.
+        """
+        n = len(query_embeddings if query_embeddings is not None else query_texts or [])
+        embeddings = query_embeddings if query_embeddings is not None else [None] * n
+        texts = query_texts if query_texts is not None else [None] * n
+        if len(embeddings) != n or len(texts) != n:
+            raise ValueError("embeddings and texts must have the same length")
+        for embedding, text in zip(embeddings, texts):
+            _check_search(mode, fusion, rerank, embedding, text, max_distance, radius)
+        lib = self.get_library(lib_id)
+        return [
+            self._search(
+                lib, embedding, k, algorithm, metadata_filter, mode, text,
+                fusion, alpha, rerank, mmr_lambda, fetch_k, max_per_document,
+                max_distance, radius
+            )
+            for embedding, text in zip(embeddings, texts)
+        ]
+
+    def federated_search(
+        self,
+        lib_ids: Optional[List[str]] = None,
+        library_filter: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None,
+        k: int = 1,
+        algorithm: str = 'kd',
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = 'vector',
+        query_text: Optional[str] = None,
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+        rerank: Optional[str] = None,
+        mmr_lambda: float = 0.5,
+        fetch_k: Optional[int] = None,
+        max_per_document: Optional[int] = None,
+        max_distance: Optional[float] = None,
+        radius: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches every library in `lib_ids`, or every library whose metadata
+        matches `library_filter`, concurrently and merges the per-library
+        top k by distance (by score for keyword and hybrid search). The
+        options are validated and the query converted once for all of them.
+        Each result carries its `library_id`.
+        """
+        _check_search(mode, fusion, rerank, query_embedding, query_text, max_distance, radius)
+        if lib_ids is not None:
+            libs = [self.get_library(lib_id) for lib_id in dict.fromkeys(lib_ids)]
+        else:
+            libs = [
+                lib for lib in self.repo.list_all()
+                if all(lib.metadata.get(key) == v for key, v in (library_filter or {}).items())
             ]
-        
-        embeddings = [c.embedding for c in chunks]
-        index = IndexFactory.create(algorithm, embeddings)
-        idxs = index.nearest(query_embedding, k)
-        results = []
-        
-        for idx in idxs:
-            c = chunks[idx]
-            dist = float(np.linalg.norm(
-                np.array(query_embedding) - np.array(c.embedding)
-            ))
-            results.append({"chunk": c, "distance": dist})
-        
-        return results
+        if query_embedding is not None:
+            query_embedding = np.asarray(query_embedding, dtype=np.float32)
+
+        futures = [
+            _submit(
+                _federation_pool, self._search, lib, query_embedding, k, algorithm,
+                metadata_filter, mode, query_text, fusion, alpha, rerank,
+                mmr_lambda, fetch_k, max_per_document, max_distance, radius
+            )
+            for lib in libs
+        ]
+        per_library = [
+            [{**r, "library_id": lib.id} for r in future.result()]
+            for lib, future in zip(libs, futures)
+        ]
+
+        if mode == 'vector':
+            key = lambda r: r["distance"]
+        else:
+            key = lambda r: -r["score"]
+        if rerank is not None or max_per_document is not None:
+            # re-ranked lists are not in key order, so a merge would not hold
+            merged = iter(sorted(itertools.chain(*per_library), key=key))
+        else:
+            merged = heapq.merge(*per_library, key=key)
+        return list(merged) if radius is not None else list(itertools.islice(merged, k))
+
+    def _search(
+        self,
+        lib: Library,
+        query_embedding: Optional[List[float]],
+        k: int,
+        algorithm: str,
+        metadata_filter: Optional[Dict[str, Any]],
+        mode: str,
+        query_text: Optional[str],
+        fusion: str,
+        alpha: float,
+        rerank: Optional[str],
+        mmr_lambda: float,
+        fetch_k: Optional[int],
+        max_per_document: Optional[int],
+        max_distance: Optional[float],
+        radius: Optional[float]
+    ) -> List[Dict[str, Any]]:
+        requested = algorithm
+        if algorithm == 'auto':
+            algorithm = self._auto_algorithm(lib)
+        with profiling.plan(
+            library_id=str(lib.id),
+            algorithm=algorithm,
+            requested_algorithm=requested,
+            mode=mode,
+            cache="bypassed" if self.cache is not None else "disabled",
+        ):
+            diversify = rerank is not None or max_per_document is not None
+            use_cache = self.cache is not None and profiling.current() is None
+            if use_cache:
+                params = {"filter": metadata_filter or {}, "mode": mode}
+                if mode != 'vector':
+                    params.update(text=query_text, fusion=fusion, alpha=alpha)
+                if diversify:
+                    params.update(
+                        rerank=rerank, mmr_lambda=mmr_lambda, fetch_k=fetch_k,
+                        max_per_document=max_per_document
+                    )
+                if max_distance is not None or radius is not None:
+                    params.update(max_distance=max_distance, radius=radius)
+                key = _search_cache_key(lib, query_embedding, k, algorithm, params)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return list(cached)
+
+            depth = max(fetch_k or 0, 4 * k, 20) if diversify else k
+            if mode == 'vector':
+                results = [
+                    {"chunk": c, "distance": dist}
+                    for c, dist in self._vector_hits(
+                        lib, query_embedding, depth, algorithm, metadata_filter,
+                        max_distance, radius
+                    )
+                ]
+            elif mode == 'keyword':
+                results = []
+                for c, score in self._keyword_hits(lib, query_text, depth, metadata_filter):
+                    result = {"chunk": c, "score": score}
+                    if query_embedding is not None:
+                        result["distance"] = _distance(query_embedding, c)
+                    results.append(result)
+            else:
+                results = self._hybrid_results(
+                    lib, query_embedding, query_text, depth, algorithm,
+                    metadata_filter, fusion, alpha, max_distance
+                )
+            if max_distance is not None and mode == 'keyword':
+                results = [r for r in results if r["distance"] <= max_distance]
+            if diversify:
+                start = time.perf_counter()
+                results = self._diversify(
+                    lib, results, query_embedding, k, rerank, mmr_lambda, max_per_document
+                )
+                _stage("rerank", time.perf_counter() - start)
+
+            profiling.note("results", len(results))
+            if use_cache:
+                self.cache.put(key, results, _results_size(results), tag=str(lib.id))
+            return list(results)
+
+    def _hybrid_results(
+        self,
+        lib: Library,
+        query_embedding: List[float],
+        query_text: str,
+        k: int,
+        algorithm: str,
+        metadata_filter: Optional[Dict[str, Any]],
+        fusion: str,
+        alpha: float,
+        max_distance: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        depth = max(4 * k, 20)
+        vector_future = _submit(
+            _search_pool, self._vector_hits, lib, query_embedding, depth, algorithm,
+            metadata_filter, max_distance
+        )
+        keyword_future = _submit(
+            _search_pool, self._keyword_hits, lib, query_text, depth, metadata_filter
+        )
+        vector_hits, keyword_hits = vector_future.result(), keyword_future.result()
+        by_id = {c.id: c for c, _ in vector_hits + keyword_hits}
+        if fusion == 'rrf':
+            fused = reciprocal_rank_fusion([
+                [c.id for c, _ in vector_hits],
+                [c.id for c, _ in keyword_hits],
+            ])
+        else:
+            fused = weighted_fusion(
+                {c.id: dist for c, dist in vector_hits},
+                {c.id: score for c, score in keyword_hits},
+                alpha
+            )
+        results = [
+            {
+                "chunk": by_id[cid],
+                "score": score,
+                "distance": _distance(query_embedding, by_id[cid]),
+            }
+            for cid, score in fused
+        ]
+        if max_distance is not None:
+            results = [r for r in results if r["distance"] <= max_distance]
+        return results[:k]
+
+    def _diversify(
+        self,
+        lib: Library,
+        results: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]],
+        k: int,
+        rerank: Optional[str],
+        mmr_lambda: float,
+        max_per_document: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        groups = None
+        if max_per_document is not None:
+            wanted = {r["chunk"].id for r in results}
+            doc_of = {
+                c.id: d.id for d in lib.documents for c in d.chunks if c.id in wanted
+            }
+            groups = [doc_of.get(r["chunk"].id) for r in results]
+        if rerank == 'mmr':
+            picked = mmr(
+                np.array([r["chunk"].embedding for r in results], dtype=np.float32),
+                k,
+                query=None if query_embedding is None else np.asarray(query_embedding),
+                lambda_=mmr_lambda,
+                groups=groups,
+                max_per_group=max_per_document
+            )
+        else:
+            picked = cap_per_group(groups, k, max_per_document)
+        return [results[i] for i in picked]
@@ -0,0 +1,209 @@
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from domain.models import Library, embedding_matrix
+from infrastructure.index.factory import IndexFactory
+
+# (algorithm, params) tried by the tuner; linear is exact, so some
+# candidate always meets the recall target
+CANDIDATES: List[Tuple[str, Dict[str, Any]]] = [
+    ("linear", {}),
+    ("kd", {"leaf_size": 16}),
+    ("kd", {"leaf_size": 40}),
+    ("kd", {"leaf_size": 128}),
+    ("ball", {"leaf_size": 16}),
+    ("ball", {"leaf_size": 40}),
+    ("ball", {"leaf_size": 128}),
+]
+UNTUNED_ALGORITHM = "linear"
+
+
+def tune(
+    vectors: np.ndarray,
+    k: int = 10,
+    target_recall: float = 0.95,
+    queries: int = 50,
+    candidates: Sequence[Tuple[str, Dict[str, Any]]] = CANDIDATES,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Pick the fastest candidate index whose recall@k reaches `target_recall`.
+    Candidates are built over the library minus a sample of held-out rows,
+    which serve as the queries; their true neighbours come from brute force.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    held_out = rng.choice(len(vectors), size=min(queries, len(vectors) // 2), replace=False)
+    keep = np.ones(len(vectors), dtype=bool)
+    keep[held_out] = False
+    data, probes = vectors[keep], vectors[held_out]
+    k = min(k, len(data))
+
+    truth = []
+    for probe in probes:
+        dists = ((data - probe) ** 2).sum(axis=1)
+        truth.append(set(np.argpartition(dists, k - 1)[:k].tolist()))
+
+    trials = []
+    for algorithm, params in candidates:
+        start = time.perf_counter()
+        index = IndexFactory.create(algorithm, data, background_rebuild=False, **params)
+        build_seconds = time.perf_counter() - start
+        hits, start = 0, time.perf_counter()
+        for probe, expected in zip(probes, truth):
+            hits += len(expected.intersection(int(i) for i in index.nearest(probe, k)))
+        latency = (time.perf_counter() - start) / max(len(probes), 1)
+        trials.append({
+            "algorithm": algorithm,
+            "params": dict(params),
+            "recall": hits / max(len(probes) * k, 1),
+            "latency_ms": latency * 1000,
+            "build_seconds": build_seconds,
+        })
+    passing = [t for t in trials if t["recall"] >= target_recall] or \
+        [max(trials, key=lambda t: t["recall"])]
+    best = min(passing, key=lambda t: t["latency_ms"])
+    return {
+        **best,
+        "target_recall": target_recall,
+        "size": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "tuned_at": time.time(),
+    }
+
+
+@dataclass
+class TuningStatus:
+    state: str = "queued"  # queued | tuning | done | failed
+    size: int = 0
+    queued_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+class IndexTuner:
+    """
+    Resolves `algorithm="auto"` to the config stored on the library, and
+    tunes one in a background thread when there is none or the library has
+    grown or shrunk by `growth` since the last run. Until a config exists,
+    auto searches use an exact linear scan.
+    """
+
+    def __init__(
+        self,
+        target_recall: float = 0.95,
+        k: int = 10,
+        queries: int = 50,
+        min_size: int = 256,
+        growth: float = 2.0,
+        max_rows: int = 20000
+    ) -> None:
+        self.target_recall = target_recall
+        self.k = k
+        self.queries = queries
+        self.min_size = min_size
+        self.growth = growth
+        self.max_rows = max_rows
+        self._cond = threading.Condition()
+        self._status: Dict[str, TuningStatus] = {}
+        self._running = 0
+
+    def needs_tuning(self, lib: Library, size: int) -> bool:
+        """
+        True when `lib` has reached `min_size` and has no config, or its size
+        moved by `growth` since the last run (or attempt) in this process.
+        """
+        if size < self.min_size:
+            return False
+        with self._cond:
+            status = self._status.get(str(lib.id))
+        if status is not None:
+            tuned_size = status.size
+        elif lib.index_config:
+            tuned_size = lib.index_config["size"]
+        else:
+            return True
+        return size >= tuned_size * self.growth or size * self.growth <= tuned_size
+
+    def resolve(
+        self,
+        lib: Library,
+        persist: Callable[[Dict[str, Any]], None]
+    ) -> str:
+        """
+        Algorithm to use for an auto search of `lib`; queues a tuning run
+        whose result is handed to `persist` when one is due.
+        """
+        size = sum(len(d.chunks) for d in lib.documents)
+        if self.needs_tuning(lib, size):
+            self.schedule(lib, persist)
+        if lib.index_config and size >= self.min_size:
+            return lib.index_config["algorithm"]
+        return UNTUNED_ALGORITHM
+
+    def schedule(
+        self,
+        lib: Library,
+        persist: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        lib_id = str(lib.id)
+        vectors = embedding_matrix([c for d in lib.documents for c in d.chunks])
+        with self._cond:
+            status = self._status.get(lib_id)
+            if status is not None and status.state in ("queued", "tuning"):
+                return
+            self._status[lib_id] = TuningStatus(size=len(vectors), queued_at=time.time())
+            self._running += 1
+        threading.Thread(
+            target=self._run, args=(lib_id, vectors, persist), daemon=True
+        ).start()
+
+    def _run(
+        self,
+        lib_id: str,
+        vectors: np.ndarray,
+        persist: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        with self._cond:
+            status = self._status[lib_id]
+            status.state = "tuning"
+        try:
+            sample = np.asarray(vectors, dtype=np.float32)
+            if len(sample) > self.max_rows:
+                rows = np.random.default_rng(0).choice(len(sample), self.max_rows, replace=False)
+                sample = sample[rows]
+            config = tune(sample, self.k, self.target_recall, self.queries)
+            config["size"] = len(vectors)
+            persist(config)
+            state, error = "done", None
+        except Exception as e:
+            state, error = "failed", str(e)
+        with self._cond:
+            status.state, status.error = state, error
+            status.finished_at = time.time()
+            self._running -= 1
+            self._cond.notify_all()
+
+    def status(self, lib_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            status = self._status.get(lib_id)
+            return asdict(status) if status is not None else None
+
+    def discard(self, lib_id: str) -> None:
+        with self._cond:
+            self._status.pop(lib_id, None)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until no tuning run is in flight; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
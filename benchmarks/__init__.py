@@ -0,0 +1,26 @@
+"""
+Benchmarks for index build and query, and for repository ingest and load.
+
+    python -m benchmarks --out results.json
+    python -m benchmarks --quick --baseline results.json
+
+Results are written as JSON; `--baseline` compares against an earlier run
+and exits non-zero on regressions.
+"""
+from .compare import compare
+from .datasets import Dataset, GENERATORS, clustered, exact_neighbours, synthetic
+from .index_bench import bench_index, run_index_benchmarks
+from .repo_bench import bench_repository, run_repository_benchmarks
+
+__all__ = [
+    'Dataset',
+    'GENERATORS',
+    'bench_index',
+    'bench_repository',
+    'clustered',
+    'compare',
+    'exact_neighbours',
+    'run_index_benchmarks',
+    'run_repository_benchmarks',
+    'synthetic',
+]
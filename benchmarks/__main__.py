@@ -0,0 +1,103 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from infrastructure.index.factory import IndexFactory
+from infrastructure.repositories import RepositoryFactory
+from .compare import compare
+from .datasets import GENERATORS
+from .index_bench import run_index_benchmarks
+from .repo_bench import run_repository_benchmarks
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _names(value: str) -> List[str]:
+    return [v for v in value.split(",") if v]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Index and repository benchmarks.")
+    parser.add_argument("--sizes", type=_ints, default=[1000, 10000])
+    parser.add_argument("--dims", type=_ints, default=[64, 256, 1024])
+    parser.add_argument("--datasets", type=_names, default=list(GENERATORS))
+    parser.add_argument("--algorithms", type=_names, default=IndexFactory.algorithms())
+    parser.add_argument("--backends", type=_names, default=RepositoryFactory.backends())
+    parser.add_argument("--repo-sizes", type=_ints, default=[1000],
+                        help="dataset sizes for the repository runs")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced build that measures index memory")
+    parser.add_argument("--quick", action="store_true",
+                        help="small sizes for a smoke run (n=1000, dims 64 and 256)")
+    parser.add_argument("--out", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown allowed before a metric counts as a regression")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.dims, args.repo_sizes, args.queries = [1000], [64, 256], [500], 50
+    return args
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    def datasets(sizes: List[int]):
+        for name in args.datasets:
+            for n in sizes:
+                for dim in args.dims:
+                    yield GENERATORS[name](n, dim, queries=args.queries, seed=args.seed)
+
+    indexes = []
+    for dataset in datasets(args.sizes):
+        indexes += run_index_benchmarks([dataset], args.algorithms, args.k, not args.no_memory)
+        print(f"indexes: {dataset.name} n={len(dataset.vectors)} dim={dataset.vectors.shape[1]}",
+              file=sys.stderr)
+    repositories = []
+    for dataset in datasets(args.repo_sizes):
+        repositories += run_repository_benchmarks([dataset], args.backends)
+    return {
+        "meta": {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "seed": args.seed,
+            "k": args.k,
+            "queries": args.queries,
+        },
+        "indexes": indexes,
+        "repositories": repositories,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['run']} {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g}",
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Tuple
+
+# metric -> True when higher is better
+METRICS: Dict[str, bool] = {
+    "build_seconds": False,
+    "qps": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "index_bytes": False,
+    "ingest_chunks_per_second": True,
+    "get_p50_ms": False,
+    "cold_load_seconds": False,
+    "storage_bytes": False,
+}
+
+
+def _key(record: Dict[str, Any]) -> Tuple:
+    return (
+        record.get("algorithm") or record.get("backend"),
+        repr(sorted(record.get("params", {}).items())),
+        record["dataset"],
+        record["n"],
+        record["dim"],
+    )
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.2
+) -> List[Dict[str, Any]]:
+    """
+    Metrics of `current` that are more than `tolerance` (relative) worse
+    than in `baseline`, and any recall drop, for runs present in both.
+    """
+    regressions = []
+    for section in ("indexes", "repositories"):
+        before = {_key(r): r for r in baseline.get(section, [])}
+        for record in current.get(section, []):
+            old = before.get(_key(record))
+            if old is None:
+                continue
+            for metric, value in record.items():
+                if metric not in old or not isinstance(value, (int, float)):
+                    continue
+                if metric.startswith("recall_at_"):
+                    worse = value < old[metric]
+                elif metric in METRICS and old[metric]:
+                    change = (value - old[metric]) / old[metric]
+                    worse = -change > tolerance if METRICS[metric] else change > tolerance
+                else:
+                    continue
+                if worse:
+                    regressions.append({
+                        "run": list(_key(record)),
+                        "metric": metric,
+                        "baseline": old[metric],
+                        "current": value,
+                    })
+    return regressions
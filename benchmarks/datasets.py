@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+import numpy as np
+
+
+@dataclass
+class Dataset:
+    name: str
+    vectors: np.ndarray  # (n, dim) float32, indexed
+    queries: np.ndarray  # (q, dim) float32, held out from `vectors`
+
+
+def synthetic(n: int, dim: int, queries: int = 100, seed: int = 0) -> Dataset:
+    """Standard-normal vectors: no structure for a tree to exploit."""
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n + queries, dim)).astype(np.float32)
+    return Dataset("synthetic", data[:n], data[n:])
+
+
+def clustered(
+    n: int,
+    dim: int,
+    queries: int = 100,
+    seed: int = 0,
+    clusters: int = 32,
+    spread: float = 0.1
+) -> Dataset:
+    """
+    Gaussian blobs around `clusters` random centres, closer to real
+    embeddings; queries are drawn from the same blobs.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    labels = rng.integers(0, clusters, n + queries)
+    data = centres[labels] + spread * rng.standard_normal((n + queries, dim))
+    data = data.astype(np.float32)
+    return Dataset("clustered", data[:n], data[n:])
+
+
+GENERATORS: Dict[str, Callable[..., Dataset]] = {
+    "synthetic": synthetic,
+    "clustered": clustered,
+}
+
+
+def exact_neighbours(dataset: Dataset, k: int) -> np.ndarray:
+    """(q, k) row ids of the true nearest neighbours, by brute force."""
+    data = dataset.vectors.astype(np.float64)
+    norms = (data ** 2).sum(axis=1)
+    result = []
+    for q in dataset.queries.astype(np.float64):
+        dists = norms - 2 * data @ q
+        top = np.argpartition(dists, min(k, len(dists) - 1))[:k]
+        result.append(top[np.argsort(dists[top], kind="stable")])
+    return np.asarray(result)
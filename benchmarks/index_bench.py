@@ -0,0 +1,88 @@
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from infrastructure.index.factory import IndexFactory
+from .datasets import Dataset, exact_neighbours
+
+
+def _percentile_ms(latencies: List[float], q: float) -> float:
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def measure_memory(algorithm: str, vectors: np.ndarray, **params: Any) -> Dict[str, int]:
+    """
+    Bytes held by a built index and the peak while building, via tracemalloc
+    (numpy reports its buffers to it). Done on a separate build, since
+    tracing slows the one that is timed.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        index = IndexFactory.create(algorithm, vectors, **params)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del index
+    return {"index_bytes": current - before, "build_peak_bytes": peak - before}
+
+
+def bench_index(
+    algorithm: str,
+    dataset: Dataset,
+    k: int = 10,
+    truth: Optional[np.ndarray] = None,
+    memory: bool = True,
+    **params: Any
+) -> Dict[str, Any]:
+    """Build time, per-query latency, QPS, recall@k and memory of one index."""
+    if truth is None:
+        truth = exact_neighbours(dataset, k)
+
+    start = time.perf_counter()
+    index = IndexFactory.create(algorithm, dataset.vectors, background_rebuild=False, **params)
+    build_seconds = time.perf_counter() - start
+
+    for query in dataset.queries[:5]:  # warm caches before timing
+        index.nearest(query, k)
+    latencies: List[float] = []
+    hits = 0
+    for query, expected in zip(dataset.queries, truth):
+        start = time.perf_counter()
+        found = index.nearest(query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(int(i) for i in found) & set(int(i) for i in expected))
+
+    result: Dict[str, Any] = {
+        "algorithm": algorithm,
+        "params": params,
+        "dataset": dataset.name,
+        "n": len(dataset.vectors),
+        "dim": dataset.vectors.shape[1],
+        "k": k,
+        "queries": len(dataset.queries),
+        "build_seconds": build_seconds,
+        "qps": len(latencies) / sum(latencies) if latencies else 0.0,
+        "p50_ms": _percentile_ms(latencies, 50),
+        "p99_ms": _percentile_ms(latencies, 99),
+        f"recall_at_{k}": hits / (len(truth) * k) if len(truth) else 1.0,
+    }
+    if memory:
+        result.update(measure_memory(algorithm, dataset.vectors, **params))
+    return result
+
+
+def run_index_benchmarks(
+    datasets: Sequence[Dataset],
+    algorithms: Optional[Sequence[str]] = None,
+    k: int = 10,
+    memory: bool = True
+) -> List[Dict[str, Any]]:
+    results = []
+    for dataset in datasets:
+        truth = exact_neighbours(dataset, k)
+        for algorithm in algorithms or IndexFactory.algorithms():
+            results.append(bench_index(algorithm, dataset, k, truth, memory))
+    return results
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import uuid4
+
+import numpy as np
+
+from domain.models import Chunk, Document, Library
+from infrastructure.repositories import RepositoryFactory
+from .datasets import Dataset
+
+
+def _repo(backend: str, directory: str):
+    return RepositoryFactory.create(
+        backend,
+        json_path=os.path.join(directory, "data.json"),
+        pickle_path=os.path.join(directory, "data.pkl"),
+        sqlite_path=os.path.join(directory, "data.db"),
+    )
+
+
+def _storage_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+    )
+
+
+def bench_repository(
+    backend: str,
+    dataset: Dataset,
+    batch_size: int = 100,
+    chunks_per_document: int = 100,
+    gets: int = 20
+) -> Dict[str, Any]:
+    """
+    Ingest the dataset the way the service does (load, append a batch of
+    chunks, persist just those), then time warm reads and a cold load from
+    disk, as after a restart.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        repo = _repo(backend, directory)
+        lib = Library(id=uuid4(), name="bench", documents=[], metadata={})
+        repo.add(lib)
+        lib_id = str(lib.id)
+
+        start = time.perf_counter()
+        for offset in range(0, len(dataset.vectors), batch_size):
+            lib = repo.get_for_update(lib_id)
+            added = []
+            for i, vector in enumerate(dataset.vectors[offset: offset + batch_size], offset):
+                if i % chunks_per_document == 0:
+                    doc = Document(id=uuid4(), title=f"d{i}", chunks=[], metadata={})
+                    lib.documents.append(doc)
+                    repo.upsert_document(lib, doc)
+                chunk = Chunk(
+                    id=uuid4(), text=f"chunk {i}", embedding=vector.tolist(), metadata={"i": i}
+                )
+                lib.documents[-1].chunks.append(chunk)
+                added.append((lib.documents[-1].id, chunk))
+            lib.version += 1
+            repo.add_chunks(lib, added)
+        ingest_seconds = time.perf_counter() - start
+
+        latencies: List[float] = []
+        for _ in range(gets):
+            start = time.perf_counter()
+            repo.get(lib_id)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cold = _repo(backend, directory)
+        loaded = cold.get(lib_id)
+        cold_load_seconds = time.perf_counter() - start
+        assert loaded is not None and sum(len(d.chunks) for d in loaded.documents) == len(dataset.vectors)
+
+        storage = _storage_bytes(directory)
+        for r in (repo, cold):
+            conn = getattr(r, "_conn", None)
+            if conn is not None:
+                conn.close()
+
+    n = len(dataset.vectors)
+    return {
+        "backend": backend,
+        "dataset": dataset.name,
+        "n": n,
+        "dim": dataset.vectors.shape[1],
+        "batch_size": batch_size,
+        "ingest_seconds": ingest_seconds,
+        "ingest_chunks_per_second": n / ingest_seconds if ingest_seconds else 0.0,
+        "get_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "cold_load_seconds": cold_load_seconds,
+        "storage_bytes": storage,
+    }
+
+
+def run_repository_benchmarks(
+    datasets: Sequence[Dataset],
+    backends: Optional[Sequence[str]] = None,
+    batch_size: int = 100
+) -> List[Dict[str, Any]]:
+    return [
+        bench_repository(backend, dataset, batch_size)
+        for dataset in datasets
+        for backend in backends or RepositoryFactory.backends()
+    ]
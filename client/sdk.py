@@ -1,16 +1,128 @@
+import asyncio
+import json
 import requests
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID
-from typing import Any, Dict, List, Optional
-from requests.exceptions import HTTPError, JSONDecodeError
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional,
+    Sequence, Tuple, TypeVar,
+)
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # optional: smaller, faster responses when the server offers them
+    import msgpack
+except ImportError:
+    msgpack = None
+
+VERSION_TOKEN_HEADER = "X-Version-Token"
+MSGPACK = "application/msgpack"
+RETRY_STATUSES = (502, 503, 504)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def _batches(items: Sequence[T], size: int) -> List[Sequence[T]]:
+    if size < 1:
+        raise ValueError("batch_size must be at least 1")
+    return [items[i: i + size] for i in range(0, len(items), size)]
+
+
+def _bulk_body(
+    chunks: Sequence[Dict[str, Any]],
+    dedupe: Optional[str],
+    dedupe_distance: float
+) -> Dict[str, Any]:
+    return {
+        "chunks": [{**c, "doc_id": str(c["doc_id"])} for c in chunks],
+        "dedupe": dedupe,
+        "dedupe_distance": dedupe_distance,
+    }
+
+
+def _search_body(
+    embedding: Optional[List[float]],
+    k: int,
+    algorithm: str,
+    metadata_filter: Optional[Dict[str, Any]],
+    mode: str,
+    text: Optional[str],
+    options: Dict[str, Any]
+) -> Dict[str, Any]:
+    body = {"embedding": embedding, "k": k, "algorithm": algorithm, "mode": mode, **options}
+    if metadata_filter:
+        body['metadata_filter'] = metadata_filter
+    if text is not None:
+        body['text'] = text
+    return body
+
+
+def _decode(content_type: str, content: bytes) -> Any:
+    if not content:
+        return None
+    if msgpack is not None and content_type.startswith(MSGPACK):
+        return msgpack.unpackb(content)
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
 
 
 class VectorDBClient:
-    def __init__(self, base_url: str = "http://localhost:8000", timeout: int = 5):
+    """
+    Client over a pooled HTTP session: connections are kept alive and
+    reused, and idempotent requests are retried with backoff when the
+    server is briefly unavailable. Use as a context manager, or call
+    `close()`, to release the pool.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: int = 5,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.2,
+        pool_size: int = 10,
+        session: Optional[requests.Session] = None
+    ):
         self.base: str = base_url.rstrip("/")
         self.timeout = timeout
+        # echoed back so reads against replicas see this client's writes
+        self.version_token: Optional[str] = None
+        self.pool_size = pool_size
+        if session is None:
+            session = requests.Session()
+            # urllib3 only retries idempotent methods by default, so a
+            # write is never sent twice
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=Retry(
+                    total=max_retries,
+                    backoff_factor=backoff_seconds,
+                    status_forcelist=RETRY_STATUSES,
+                    raise_on_status=False,
+                ),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "VectorDBClient":
+        return self
 
-    def create_library(self, name: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
-        return self._request('post', '/libraries', json={"name": name, "metadata": metadata})
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def create_library(self, name: str, metadata: Dict[str, Any], shards: int = 1) -> Dict[str, Any]:
+        return self._request(
+            'post', '/libraries', json={"name": name, "metadata": metadata, "shards": shards}
+        )
 
     def get_library(self, lib_id: str) -> Dict[str, Any]:
         return self._request('get', f'/libraries/{lib_id}')
@@ -40,7 +152,9 @@ class VectorDBClient:
         doc_id: UUID,
         text: str,
         embedding: List[float],
-        metadata: Dict[str, Any]
+        metadata: Dict[str, Any],
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
     ) -> Dict[str, Any]:
         return self._request(
             'post',
@@ -49,13 +163,100 @@ class VectorDBClient:
                 "doc_id": str(doc_id),
                 "text": text,
                 "embedding": embedding,
-                "metadata": metadata
+                "metadata": metadata,
+                "dedupe": dedupe,
+                "dedupe_distance": dedupe_distance
             }
         )
 
+    def add_chunks(
+        self,
+        lib_id: str,
+        chunks: List[Dict[str, Any]],
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """`chunks` are dicts of doc_id, text, embedding and metadata."""
+        body = _bulk_body(chunks, dedupe, dedupe_distance)
+        return self._request('post', f'/libraries/{lib_id}/chunks/bulk', json=body)
+
+    def bulk_add_chunks(
+        self,
+        lib_id: str,
+        chunks: Sequence[Dict[str, Any]],
+        batch_size: int = 500,
+        max_concurrency: int = 4,
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """
+        `add_chunks` for inputs of any size: sent in batches, up to
+        `max_concurrency` in flight. Results are in input order.
+        """
+        return self._pipelined(
+            _batches(chunks, batch_size),
+            lambda batch: self.add_chunks(lib_id, list(batch), dedupe, dedupe_distance),
+            max_concurrency,
+        )
+
+    def dedupe(
+        self,
+        lib_id: str,
+        max_distance: float = 0.0,
+        action: str = "report"
+    ) -> Dict[str, Any]:
+        return self._request(
+            'post',
+            f'/libraries/{lib_id}/dedupe',
+            json={"max_distance": max_distance, "action": action}
+        )
+
+    def add_text_chunk(
+        self,
+        lib_id: str,
+        doc_id: UUID,
+        text: str,
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self._request(
+            'post',
+            f'/libraries/{lib_id}/chunks/text',
+            json={"doc_id": str(doc_id), "text": text, "metadata": metadata}
+        )
+
     def get_chunks(self, lib_id: str) -> List[Dict[str, Any]]:
         return self._request('get', f'/libraries/{lib_id}/chunks')
 
+    def get_chunk_page(
+        self,
+        lib_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of chunks and the cursor of the next page (None at the end)."""
+        params: Dict[str, Any] = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        resp = self._send('get', f'/libraries/{lib_id}/chunks', params=params)
+        return _decode(resp.headers.get("content-type", ""), resp.content), \
+            resp.headers.get("X-Next-Cursor")
+
+    def iter_chunks(
+        self,
+        lib_id: str,
+        cursor: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Streams every chunk of the library (NDJSON), one dict at a time."""
+        params: Dict[str, Any] = {"format": "ndjson"}
+        if cursor:
+            params["cursor"] = cursor
+        with self._send(
+            'get', f'/libraries/{lib_id}/chunks', params=params, stream=True
+        ) as resp:
+            for line in resp.iter_lines():
+                if line:
+                    yield json.loads(line)
+
     def update_chunk(
         self,
         lib_id: str,
@@ -82,12 +283,107 @@ class VectorDBClient:
         embedding: List[float],
         k: int = 1,
         algorithm: str = "kd",
-        metadata_filter: Optional[Dict[str, Any]] = None
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        text: Optional[str] = None,
+        **options: Any
     ) -> List[Dict[str, Any]]:
-        body = {"embedding": embedding, "k": k, "algorithm": algorithm}
+        """`options` are passed through, e.g. rerank="mmr", max_per_document=2."""
+        body = _search_body(embedding, k, algorithm, metadata_filter, mode, text, options)
+        return self._request('post', f'/libraries/{lib_id}/search', json=body)['results']
+
+    def batch_search(
+        self,
+        lib_id: str,
+        embeddings: Optional[Sequence[List[float]]] = None,
+        k: int = 1,
+        algorithm: str = "kd",
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        texts: Optional[Sequence[str]] = None,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        **options: Any
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        One result list per query. Queries are sent to the batch endpoint
+        `batch_size` at a time, up to `max_concurrency` requests in flight.
+        """
+        queries = list(zip(
+            embeddings if embeddings is not None else [None] * len(texts or []),
+            texts if texts is not None else [None] * len(embeddings or []),
+        ))
+
+        def send(batch: Sequence[Tuple[Any, Any]]) -> List[List[Dict[str, Any]]]:
+            body = _search_body(None, k, algorithm, metadata_filter, mode, None, options)
+            del body['embedding']
+            if embeddings is not None:
+                body['embeddings'] = [e for e, _ in batch]
+            if texts is not None:
+                body['texts'] = [t for _, t in batch]
+            return self._request('post', f'/libraries/{lib_id}/search/batch', json=body)['results']
+
+        return self._pipelined(_batches(queries, batch_size), send, max_concurrency)
+
+    def federated_search(
+        self,
+        embedding: Optional[List[float]],
+        library_ids: Optional[List[str]] = None,
+        library_filter: Optional[Dict[str, Any]] = None,
+        k: int = 1,
+        **options: Any
+    ) -> List[Dict[str, Any]]:
+        """Searches several libraries at once; pass `library_ids` or `library_filter`."""
+        body = {"embedding": embedding, "k": k, **options}
+        if library_ids is not None:
+            body['library_ids'] = [str(lib_id) for lib_id in library_ids]
+        if library_filter is not None:
+            body['library_filter'] = library_filter
+        return self._request('post', '/search', json=body)['results']
+
+    def search_text(
+        self,
+        lib_id: str,
+        text: str,
+        k: int = 1,
+        algorithm: str = "kd",
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = "vector"
+    ) -> List[Dict[str, Any]]:
+        body = {"text": text, "k": k, "algorithm": algorithm, "mode": mode}
         if metadata_filter:
             body['metadata_filter'] = metadata_filter
-        return self._request('post', f'/libraries/{lib_id}/search', json=body)['results']
+        return self._request('post', f'/libraries/{lib_id}/search/text', json=body)['results']
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Accept": f"{MSGPACK}, application/json"} if msgpack is not None else {}
+        if self.version_token:
+            headers[VERSION_TOKEN_HEADER] = self.version_token
+        return headers
+
+    def _remember_token(self, resp: Any) -> None:
+        self.version_token = resp.headers.get(VERSION_TOKEN_HEADER, self.version_token)
+
+    def _pipelined(
+        self,
+        batches: List[T],
+        send: Callable[[T], List[R]],
+        max_concurrency: int
+    ) -> List[R]:
+        if not batches:
+            return []
+        workers = max(1, min(max_concurrency, len(batches), self.pool_size))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [item for result in pool.map(send, batches) for item in result]
+
+    def _send(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        resp = self.session.request(
+            method.upper(), self.base + path,
+            headers=self._headers(), timeout=self.timeout, **kwargs
+        )
+        self._remember_token(resp)
+        resp.raise_for_status()
+        return resp
 
     def _request(
         self,
@@ -95,13 +391,212 @@ class VectorDBClient:
         path: str,
         json: Optional[Dict[str, Any]] = None
     ) -> Any:
-        url = self.base + path
-        resp = getattr(requests, method)(url, json=json, timeout=self.timeout)
-        try:
+        resp = self._send(method, path, json=json)
+        return _decode(resp.headers.get("content-type", ""), resp.content)
+
+
+class AsyncVectorDBClient:
+    """
+    asyncio counterpart of `VectorDBClient` over a pooled `httpx.AsyncClient`.
+    `transport` can be given to talk to an app in-process (httpx.ASGITransport).
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 5,
+        max_retries: int = 3,
+        pool_size: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base: str = base_url.rstrip("/")
+        self.version_token: Optional[str] = None
+        if transport is None:
+            # httpx retries failed connection attempts only, never a sent request
+            transport = httpx.AsyncHTTPTransport(
+                retries=max_retries,
+                limits=httpx.Limits(
+                    max_connections=pool_size, max_keepalive_connections=pool_size
+                ),
+            )
+        self.client = httpx.AsyncClient(base_url=self.base, timeout=timeout, transport=transport)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncVectorDBClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def create_library(self, name: str, metadata: Dict[str, Any], shards: int = 1) -> Dict[str, Any]:
+        return await self._request(
+            'post', '/libraries', json={"name": name, "metadata": metadata, "shards": shards}
+        )
+
+    async def get_library(self, lib_id: str) -> Dict[str, Any]:
+        return await self._request('get', f'/libraries/{lib_id}')
+
+    async def delete_library(self, lib_id: str) -> None:
+        await self._request('delete', f'/libraries/{lib_id}')
+
+    async def create_document(
+        self,
+        lib_id: str,
+        doc_id: str,
+        title: str,
+        metadata: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        return await self._request(
+            'post',
+            f"/libraries/{lib_id}/documents",
+            json={"id": str(doc_id), "title": title, "metadata": metadata},
+        )
+
+    async def add_chunks(
+        self,
+        lib_id: str,
+        chunks: Sequence[Dict[str, Any]],
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        body = _bulk_body(chunks, dedupe, dedupe_distance)
+        return await self._request('post', f'/libraries/{lib_id}/chunks/bulk', json=body)
+
+    async def bulk_add_chunks(
+        self,
+        lib_id: str,
+        chunks: Sequence[Dict[str, Any]],
+        batch_size: int = 500,
+        max_concurrency: int = 4,
+        dedupe: Optional[str] = None,
+        dedupe_distance: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        return await self._pipelined(
+            _batches(chunks, batch_size),
+            lambda batch: self.add_chunks(lib_id, batch, dedupe, dedupe_distance),
+            max_concurrency,
+        )
+
+    async def get_chunk_page(
+        self,
+        lib_id: str,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        params: Dict[str, Any] = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        resp = await self._send('get', f'/libraries/{lib_id}/chunks', params=params)
+        return _decode(resp.headers.get("content-type", ""), resp.content), \
+            resp.headers.get("X-Next-Cursor")
+
+    async def iter_chunks(
+        self,
+        lib_id: str,
+        cursor: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        params: Dict[str, Any] = {"format": "ndjson"}
+        if cursor:
+            params["cursor"] = cursor
+        async with self.client.stream(
+            'GET', f'/libraries/{lib_id}/chunks', params=params, headers=self._headers()
+        ) as resp:
+            self._remember_token(resp)
             resp.raise_for_status()
-        except HTTPError as e:
-            raise
-        try:
-            return resp.json()
-        except (ValueError, JSONDecodeError):
-            return None
+            async for line in resp.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def search(
+        self,
+        lib_id: str,
+        embedding: List[float],
+        k: int = 1,
+        algorithm: str = "kd",
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        text: Optional[str] = None,
+        **options: Any
+    ) -> List[Dict[str, Any]]:
+        body = _search_body(embedding, k, algorithm, metadata_filter, mode, text, options)
+        return (await self._request('post', f'/libraries/{lib_id}/search', json=body))['results']
+
+    async def batch_search(
+        self,
+        lib_id: str,
+        embeddings: Optional[Sequence[List[float]]] = None,
+        k: int = 1,
+        algorithm: str = "kd",
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        mode: str = "vector",
+        texts: Optional[Sequence[str]] = None,
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        **options: Any
+    ) -> List[List[Dict[str, Any]]]:
+        queries = list(zip(
+            embeddings if embeddings is not None else [None] * len(texts or []),
+            texts if texts is not None else [None] * len(embeddings or []),
+        ))
+
+        async def send(batch: Sequence[Tuple[Any, Any]]) -> List[List[Dict[str, Any]]]:
+            body = _search_body(None, k, algorithm, metadata_filter, mode, None, options)
+            del body['embedding']
+            if embeddings is not None:
+                body['embeddings'] = [e for e, _ in batch]
+            if texts is not None:
+                body['texts'] = [t for _, t in batch]
+            resp = await self._request('post', f'/libraries/{lib_id}/search/batch', json=body)
+            return resp['results']
+
+        return await self._pipelined(_batches(queries, batch_size), send, max_concurrency)
+
+    async def federated_search(
+        self,
+        embedding: Optional[List[float]],
+        library_ids: Optional[List[str]] = None,
+        library_filter: Optional[Dict[str, Any]] = None,
+        k: int = 1,
+        **options: Any
+    ) -> List[Dict[str, Any]]:
+        body = {"embedding": embedding, "k": k, **options}
+        if library_ids is not None:
+            body['library_ids'] = [str(lib_id) for lib_id in library_ids]
+        if library_filter is not None:
+            body['library_filter'] = library_filter
+        return (await self._request('post', '/search', json=body))['results']
+
+    _headers = VectorDBClient._headers
+    _remember_token = VectorDBClient._remember_token
+
+    async def _pipelined(
+        self,
+        batches: List[T],
+        send: Callable[[T], Awaitable[List[R]]],
+        max_concurrency: int
+    ) -> List[R]:
+        gate = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def bounded(batch: T) -> List[R]:
+            async with gate:
+                return await send(batch)
+
+        results = await asyncio.gather(*(bounded(b) for b in batches))
+        return [item for result in results for item in result]
+
+    async def _send(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        resp = await self.client.request(method.upper(), path, headers=self._headers(), **kwargs)
+        self._remember_token(resp)
+        resp.raise_for_status()
+        return resp
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        resp = await self._send(method, path, json=json)
+        return _decode(resp.headers.get("content-type", ""), resp.content)
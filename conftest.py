@@ -1,6 +1,15 @@
 import sys
 import os
 
+import pytest
+
 PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+
+
+@pytest.fixture(autouse=True)
+def data_paths(tmp_path, monkeypatch):
+    """Points the app's repositories at each test's own directory, not the checkout."""
+    for var, name in (("JSON_PATH", "data.json"), ("PICKLE_PATH", "data.pkl"), ("SQLITE_PATH", "data.db")):
+        monkeypatch.setenv(var, str(tmp_path / name))
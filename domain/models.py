@@ -1,30 +1,334 @@
+import itertools
 from uuid import UUID
-from typing import List, Dict, Any
-from pydantic import BaseModel, ConfigDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 
-class Chunk(BaseModel):
-    id: UUID
-    text: str
-    embedding: List[float]
-    metadata: Dict[str, Any]
 
-    model_config = ConfigDict(from_attributes=True)
+def _vector(embedding: Sequence[float]) -> np.ndarray:
+    """A read-only 1-row float32 matrix holding a copy of `embedding`."""
+    row = np.array(embedding, dtype=np.float32)
+    if row.ndim != 1:
+        raise ValueError("embedding must be a flat list of numbers")
+    row = row.reshape(1, -1)
+    row.flags.writeable = False
+    return row
 
 
-class Document(BaseModel):
-    id: UUID
-    title: str
-    chunks: List[Chunk]
-    metadata: Dict[str, Any]
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
 
-    model_config = ConfigDict(from_attributes=True)
 
+class _Record:
+    """
+    Base of the slotted domain records. They do no validation: the API
+    schemas validate requests, and repositories load what was dumped.
+    """
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    # values of fields added since records were first pickled
+    _defaults: Dict[str, Any] = {}
 
-class Library(BaseModel):
-    id: UUID
-    name: str
-    documents: List[Document]
-    metadata: Dict[str, Any]
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(_same(getattr(self, f), getattr(other, f)) for f in self._fields)
 
-    model_config = ConfigDict(from_attributes=True)
+    __hash__ = None  # mutable
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        state = state.get("__dict__", state)  # pickled as pydantic models
+        for key, value in {**self._defaults, **state}.items():
+            setattr(self, key, value)
+
+
+class Chunk(_Record):
+    """
+    A span of text and its embedding. The embedding is a float32 row of a
+    matrix the chunk does not own: its own 1-row matrix when set, the
+    library's shared matrix once the library is packed. Assigning an
+    embedding never writes into a shared matrix.
+    """
+    __slots__ = ("id", "text", "metadata", "_slot")
+    _fields = ("id", "text", "embedding", "metadata")
+
+    def __init__(
+        self,
+        id: UUID,
+        text: str,
+        embedding: Sequence[float],
+        metadata: Dict[str, Any]
+    ) -> None:
+        self.id = id
+        self.text = text
+        self.embedding = embedding
+        self.metadata = metadata
+
+    @property
+    def embedding(self) -> np.ndarray:
+        matrix, row = self._slot  # one attribute, so a concurrent pack is never half-seen
+        return matrix[row]
+
+    @embedding.setter
+    def embedding(self, value: Sequence[float]) -> None:
+        self._slot = (_vector(value), 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "text": self.text,
+            "embedding": self.embedding.tolist(),
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        slot: Optional[Tuple[np.ndarray, int]] = None
+    ) -> "Chunk":
+        """`slot` is a (matrix, row) already holding the embedding, which is then not copied."""
+        chunk = cls.__new__(cls)
+        chunk.id = UUID(str(data["id"]))
+        chunk.text = data["text"]
+        chunk.metadata = data["metadata"]
+        if slot is None:
+            chunk.embedding = data["embedding"]
+        else:
+            chunk._slot = slot
+        return chunk
+
+
+class Document(_Record):
+    __slots__ = ("id", "title", "chunks", "metadata")
+    _fields = __slots__
+
+    def __init__(
+        self,
+        id: UUID,
+        title: str,
+        chunks: List[Chunk],
+        metadata: Dict[str, Any]
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.chunks = chunks
+        self.metadata = metadata
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "title": self.title,
+            "chunks": [c.to_dict() for c in self.chunks],
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        slots: Optional[Iterator[Tuple[np.ndarray, int]]] = None
+    ) -> "Document":
+        return cls(
+            UUID(str(data["id"])),
+            data["title"],
+            [Chunk.from_dict(c, next(slots) if slots else None) for c in data["chunks"]],
+            data["metadata"],
+        )
+
+
+class Library(_Record):
+    __slots__ = (
+        "id", "name", "_documents", "metadata", "version", "embedder", "shards",
+        "index_config", "_embeddings", "_loader",
+    )
+    _fields = (
+        "id", "name", "documents", "metadata", "version", "embedder", "shards",
+        "index_config",
+    )
+    _defaults = {"version": 0, "embedder": None, "shards": 1, "index_config": None}
+
+    def __init__(
+        self,
+        id: UUID,
+        name: str,
+        documents: List[Document],
+        metadata: Dict[str, Any],
+        version: int = 0,
+        embedder: Optional[str] = None,
+        shards: int = 1,
+        index_config: Optional[Dict[str, Any]] = None  # chosen by the auto-tuner
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.documents = documents  # also marks the library loaded
+        self.metadata = metadata
+        self.version = version
+        self.embedder = embedder
+        self.shards = shards
+        self.index_config = index_config
+        self._embeddings: Optional[np.ndarray] = None
+        self.pack()
+
+    @classmethod
+    def lazy(
+        cls,
+        header: Dict[str, Any],
+        load: Callable[[], Optional["Library"]]
+    ) -> "Library":
+        """
+        A library read without its documents (`header` is a `to_dict`
+        without them). They are taken from `load()` on first access; the
+        header fields are kept as read, so edits made before then survive.
+        """
+        lib = cls.from_dict({**header, "documents": []})
+        lib._loader = load
+        return lib
+
+    @property
+    def documents(self) -> List[Document]:
+        if self._loader is not None:
+            self._load()
+        return self._documents
+
+    @documents.setter
+    def documents(self, documents: List[Document]) -> None:
+        self._documents = documents
+        self._loader = None
+
+    @property
+    def loaded(self) -> bool:
+        """False for a `lazy` library whose documents were never accessed."""
+        return self._loader is None
+
+    def _load(self) -> None:
+        load = self._loader
+        full = load() if load is not None else None
+        if self._loader is load:  # not loaded meanwhile by another thread
+            self._documents = full._documents if full is not None else []
+            self._embeddings = full._embeddings if full is not None else None
+            self._loader = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        self.documents  # a lazy library is pickled in full
+        state = super().__getstate__()
+        del state["_embeddings"]  # rebuilt by `pack` on load
+        del state["_loader"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._embeddings = None
+        self._loader = None
+        super().__setstate__(state)
+        self.pack()  # loaded libraries start out packed
+
+    def pack(self, force: bool = True) -> bool:
+        """
+        Moves every chunk embedding into one float32 matrix, a row per chunk
+        in document order. Unless `force`, only packs once chunks outside
+        the matrix, or rows no chunk uses any more, make up half of it, so
+        writes pay for packing in amortized constant time. Libraries whose
+        embeddings differ in length are left as they are, and so are lazy
+        libraries not loaded yet.
+        """
+        if not self.loaded:
+            return False
+        chunks = [c for d in self.documents for c in d.chunks]
+        if not force and self._embeddings is not None:
+            packed = sum(1 for c in chunks if c._slot[0] is self._embeddings)
+            stale = (len(chunks) - packed) + (len(self._embeddings) - packed)
+            if 2 * stale < len(self._embeddings):
+                return False
+        if chunks and _run(chunks) is not None and len(chunks[0]._slot[0]) == len(chunks):
+            self._embeddings = chunks[0]._slot[0]  # already exactly one matrix
+            return True
+        vectors = [c.embedding for c in chunks]
+        if not vectors or len({v.shape for v in vectors}) != 1:
+            self._embeddings = None
+            return False
+        matrix = np.stack(vectors)
+        matrix.flags.writeable = False
+        for row, chunk in enumerate(chunks):
+            chunk._slot = (matrix, row)
+        self._embeddings = matrix
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "documents": [d.to_dict() for d in self.documents],
+            "metadata": self.metadata,
+            "version": self.version,
+            "embedder": self.embedder,
+            "shards": self.shards,
+            "index_config": self.index_config,
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        embeddings: Optional[np.ndarray] = None
+    ) -> "Library":
+        """
+        Builds the packed matrix in one conversion, not one per chunk.
+        `embeddings` are the chunk embeddings in document order when the
+        caller has them as a matrix already; the chunks' own are then ignored.
+        """
+        matrix = embeddings
+        if matrix is None:
+            vectors = [c["embedding"] for d in data["documents"] for c in d["chunks"]]
+            try:
+                matrix = np.array(vectors, dtype=np.float32)
+            except ValueError:  # embeddings differ in length
+                matrix = None
+        slots = None
+        if matrix is not None and matrix.ndim == 2:
+            matrix.flags.writeable = False
+            slots = zip(itertools.repeat(matrix), itertools.count())
+        return cls(
+            UUID(str(data["id"])),
+            data["name"],
+            [Document.from_dict(d, slots) for d in data["documents"]],
+            data["metadata"],
+            version=data.get("version", 0),
+            embedder=data.get("embedder"),
+            shards=data.get("shards", 1),
+            index_config=data.get("index_config"),
+        )
+
+
+def _run(chunks: Sequence[Chunk]) -> Optional[np.ndarray]:
+    """The rows of `chunks` when they are consecutive rows of one matrix."""
+    if not chunks:
+        return None
+    matrix, first = chunks[0]._slot
+    for i, chunk in enumerate(chunks):
+        held, row = chunk._slot
+        if held is not matrix or row != first + i:
+            return None
+    return matrix[first:first + len(chunks)]
+
+
+def embedding_matrix(chunks: Sequence[Chunk]) -> np.ndarray:
+    """
+    The embeddings of `chunks` as an (n, dim) float32 matrix: a view of the
+    library's packed matrix when they are a run of its rows, else a copy.
+    No chunks give an empty 1-D array, as no dimension is known.
+    """
+    run = _run(chunks)
+    if run is not None:
+        return run
+    if not chunks:
+        return np.empty(0, dtype=np.float32)
+    return np.stack([c.embedding for c in chunks])
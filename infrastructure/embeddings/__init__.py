@@ -0,0 +1,12 @@
+from .base import Embedder, PooledEmbedder
+from .cohere import CohereEmbedder
+from .hashing import HashingEmbedder
+from .factory import EmbedderFactory
+
+__all__ = [
+    'Embedder',
+    'PooledEmbedder',
+    'CohereEmbedder',
+    'HashingEmbedder',
+    'EmbedderFactory',
+]
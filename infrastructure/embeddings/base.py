@@ -0,0 +1,80 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+
+class Embedder(ABC):
+    """Turns texts into fixed-size float vectors."""
+
+    name: str = ""
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int: ...
+
+    @abstractmethod
+    def embed(
+        self,
+        texts: List[str],
+        input_type: str = "search_document"
+    ) -> List[List[float]]: ...
+
+    def embed_one(self, text: str, input_type: str = "search_document") -> List[float]:
+        return self.embed([text], input_type)[0]
+
+
+def _embed_chunk(args: Tuple[Embedder, List[str], str]) -> List[List[float]]:
+    embedder, texts, input_type = args
+    return embedder.embed(texts, input_type)
+
+
+class PooledEmbedder(Embedder):
+    """
+    Splits each call into chunks and embeds them on a thread or process
+    pool. Process pools give CPU-bound local embedders real parallelism;
+    the wrapped embedder must then be picklable.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        kind: str = "thread",
+        workers: int = 4,
+        chunk_size: int = 64
+    ) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError("kind must be one of: thread, process")
+        self.embedder = embedder
+        self.name = embedder.name
+        self.kind = kind
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor: Optional[Executor] = None
+
+    @property
+    def dimension(self) -> int:
+        return self.embedder.dimension
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            cls = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            self._executor = cls(max_workers=self.workers)
+        return self._executor
+
+    def embed(
+        self,
+        texts: List[str],
+        input_type: str = "search_document"
+    ) -> List[List[float]]:
+        if len(texts) <= self.chunk_size:
+            return self.embedder.embed(texts, input_type)
+        chunks = [
+            (self.embedder, texts[i:i + self.chunk_size], input_type)
+            for i in range(0, len(texts), self.chunk_size)
+        ]
+        return [vec for part in self._pool().map(_embed_chunk, chunks) for vec in part]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
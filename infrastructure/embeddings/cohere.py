@@ -0,0 +1,34 @@
+from typing import Dict, List
+
+from utils.cohere_client import CohereClient
+from .base import Embedder
+
+
+class CohereEmbedder(Embedder):
+    """Remote Cohere embeddings, one pooled client per input type."""
+
+    name = "cohere"
+
+    def __init__(self, **kwargs) -> None:
+        self._kwargs = kwargs
+        self._clients: Dict[str, CohereClient] = {
+            "search_document": CohereClient(input_type="search_document", **kwargs)
+        }
+
+    def _client(self, input_type: str) -> CohereClient:
+        if input_type not in self._clients:
+            self._clients[input_type] = CohereClient(
+                input_type=input_type, **self._kwargs
+            )
+        return self._clients[input_type]
+
+    @property
+    def dimension(self) -> int:
+        return self._clients["search_document"].embedding_size
+
+    def embed(
+        self,
+        texts: List[str],
+        input_type: str = "search_document"
+    ) -> List[List[float]]:
+        return self._client(input_type).get_embeddings(texts)
@@ -0,0 +1,39 @@
+from typing import Type, Dict, Optional
+
+from .base import Embedder, PooledEmbedder
+from .cohere import CohereEmbedder
+from .hashing import HashingEmbedder
+
+
+class EmbedderFactory:
+    _embedder_types: Dict[str, Type[Embedder]] = {
+        'cohere': CohereEmbedder,
+        'hashing': HashingEmbedder,
+    }
+
+    @classmethod
+    def register(cls, name: str, embedder_class: Type[Embedder]) -> None:
+        cls._embedder_types[name] = embedder_class
+
+    @classmethod
+    def supports(cls, name: str) -> bool:
+        return name in cls._embedder_types
+
+    @classmethod
+    def create(
+        cls,
+        name: str,
+        pool: Optional[str] = None,
+        workers: int = 4,
+        **kwargs
+    ) -> Embedder:
+        if name not in cls._embedder_types:
+            raise ValueError(
+                f"Unsupported embedder '{name}'. "
+                f"Supported types are: {list(cls._embedder_types.keys())}"
+            )
+
+        embedder = cls._embedder_types[name](**kwargs)
+        if pool:
+            return PooledEmbedder(embedder, kind=pool, workers=workers)
+        return embedder
@@ -0,0 +1,63 @@
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+from .base import Embedder
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local, network-free embedder: word and character n-gram features hashed
+    into `dim` signed buckets (the hashing trick), log-scaled and
+    L2-normalised. Deterministic across processes and CPU-only, so it suits
+    offline ingestion, tests and benchmarks; it captures lexical overlap,
+    not semantics.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256, ngram: int = 3) -> None:
+        self.dim = dim
+        self.ngram = ngram
+
+    @property
+    def dimension(self) -> int:
+        return self.dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        feats = [f"w:{w}" for w in words]
+        feats += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        n = self.ngram
+        for w in words:
+            padded = f"#{w}#"
+            feats += [f"c:{padded[i:i + n]}" for i in range(max(len(padded) - n + 1, 1))]
+        return feats
+
+    def _vector(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        feats = self._features(text)
+        if not feats:
+            return vec
+        hashes = np.fromiter(
+            (zlib.crc32(f.encode("utf-8")) for f in feats),
+            dtype=np.uint64,
+            count=len(feats),
+        )
+        buckets = (hashes % self.dim).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+        np.add.at(vec, buckets, signs)
+        vec = np.sign(vec) * np.log1p(np.abs(vec))
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def embed(
+        self,
+        texts: List[str],
+        input_type: str = "search_document"
+    ) -> List[List[float]]:
+        return [self._vector(t).tolist() for t in texts]
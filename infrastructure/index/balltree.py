@@ -3,11 +3,13 @@ from typing import List, Tuple, Optional, Union
 from dataclasses import dataclass
 import heapq
 from .base import BaseIndex, IndexType
+from .stats import record
+from .store import VectorStore
 
 
 @dataclass
 class BallNode:
-    points_idx: np.ndarray
+    points_idx: np.ndarray  # rows held by a leaf, empty for inner nodes
     center: np.ndarray
     radius: float
     left: Optional['BallNode'] = None
@@ -18,83 +20,165 @@ class BallTree(BaseIndex):
     """
     Build: O(n log n)
     Query: average O(log n)
+    Insert: O(log n) descent into a leaf, growing the radii on the way down
     """
 
     def __init__(
-        self, 
-        data: List[List[float]], 
-        leaf_size: int = 40, 
+        self,
+        data: List[List[float]],
+        leaf_size: int = 40,
         **kwargs
     ) -> None:
-        self.data = np.array(data, dtype=np.float32)
         self.leaf_size = leaf_size
-        self.root = self._build(np.arange(len(data)))
+        self._init_index(data, **kwargs)
+
+    def _build_root(self, store: VectorStore) -> Optional[BallNode]:
+        if store.dim is None:
+            return None
+        return self._build(store.vectors, store.live_rows())
 
     def _build(
-        self, 
+        self,
+        data: np.ndarray,
         idxs: np.ndarray
     ) -> Optional[BallNode]:
         if len(idxs) == 0:
             return None
-            
+
+        points = data[idxs]
+        center = np.mean(points, axis=0)
+        radius = float(np.max(np.linalg.norm(points - center, axis=1)))
         if len(idxs) <= self.leaf_size:
-            points = self.data[idxs]
-            center = np.mean(points, axis=0)
-            radius = np.max(np.linalg.norm(points - center, axis=1))
             return BallNode(idxs, center, radius)
 
-        points = self.data[idxs]
         var = np.var(points, axis=0)
         split_dim = np.argmax(var)
         median_idx = len(idxs) // 2
         partition_idx = np.argpartition(points[:, split_dim], median_idx)
         left_idxs = idxs[partition_idx[:median_idx]]
         right_idxs = idxs[partition_idx[median_idx:]]
-        center = np.mean(points, axis=0)
-        radius = np.max(np.linalg.norm(points - center, axis=1))
-        
+
         return BallNode(
-            points_idx=idxs,
+            points_idx=np.empty(0, dtype=np.int64),
             center=center,
             radius=radius,
-            left=self._build(left_idxs),
-            right=self._build(right_idxs)
+            left=self._build(data, left_idxs),
+            right=self._build(data, right_idxs)
         )
 
+    def _insert(self, row: int) -> None:
+        point = self.store.vectors[row]
+        if self.root is None:
+            self.root = BallNode(np.array([row], dtype=np.int64), point.copy(), 0.0)
+            return
+
+        node = self.root
+        while True:
+            node.radius = max(node.radius, float(np.linalg.norm(point - node.center)))
+            if node.left is None and node.right is None:
+                break
+            if node.left is None or node.right is None:
+                node = node.left or node.right
+                continue
+            left_dist = np.linalg.norm(point - node.left.center)
+            right_dist = np.linalg.norm(point - node.right.center)
+            node = node.left if left_dist < right_dist else node.right
+
+        node.points_idx = np.append(node.points_idx, row)
+        if len(node.points_idx) > 2 * self.leaf_size:
+            split = self._build(self.store.vectors, node.points_idx)
+            node.points_idx, node.center, node.radius = split.points_idx, split.center, split.radius
+            node.left, node.right = split.left, split.right
+
     def nearest(
-        self, 
-        target: Union[List[float], np.ndarray], 
-        k: int = 1
+        self,
+        target: Union[List[float], np.ndarray],
+        k: int = 1,
+        max_distance: Optional[float] = None
     ) -> List[IndexType]:
         target = np.array(target, dtype=np.float32)
         heap: List[Tuple[float, IndexType]] = []
-        
-        def search(node: Optional[BallNode]) -> None:
-            if node is None:
-                return
-                
-            dist_to_center = np.linalg.norm(target - node.center)
-            if len(heap) == k and dist_to_center - node.radius > -heap[0][0]:
-                return
-            
-            points = self.data[node.points_idx]
-            dists = np.linalg.norm(points - target, axis=1)
-            for dist, idx in zip(dists, node.points_idx):
-                if len(heap) < k:
-                    heapq.heappush(heap, (-dist, idx))
-                elif -dist > heap[0][0]:
-                    heapq.heapreplace(heap, (-dist, idx))
-            if node.left and node.right:
-                left_dist = np.linalg.norm(target - node.left.center)
-                right_dist = np.linalg.norm(target - node.right.center)
-                if left_dist < right_dist:
-                    search(node.left)
-                    search(node.right)
+        limit = np.inf if max_distance is None else max_distance
+        nodes = leaves = distances = pruned = 0
+
+        with self._lock:
+            data, deleted = self.store.vectors, self.store.deleted
+
+            def search(node: Optional[BallNode]) -> None:
+                nonlocal nodes, leaves, distances, pruned
+                if node is None:
+                    return
+
+                nodes += 1
+                distances += 1
+                dist_to_center = np.linalg.norm(target - node.center)
+                bound = -heap[0][0] if len(heap) == k else limit
+                if dist_to_center - node.radius > bound:
+                    pruned += 1
+                    return
+
+                if node.left is None and node.right is None:
+                    leaves += 1
+                    rows = node.points_idx[~deleted[node.points_idx]]
+                    distances += len(rows)
+                    dists = np.linalg.norm(data[rows] - target, axis=1)
+                    for dist, row in zip(dists, rows):
+                        if dist > limit:
+                            continue
+                        if len(heap) < k:
+                            heapq.heappush(heap, (-dist, row))
+                        elif -dist > heap[0][0]:
+                            heapq.heapreplace(heap, (-dist, row))
+                    return
+
+                if node.left and node.right:
+                    distances += 2
+                    left_dist = np.linalg.norm(target - node.left.center)
+                    right_dist = np.linalg.norm(target - node.right.center)
+                    if left_dist < right_dist:
+                        search(node.left)
+                        search(node.right)
+                    else:
+                        search(node.right)
+                        search(node.left)
                 else:
-                    search(node.right)
                     search(node.left)
-            else:
-                search(node.left)
-                search(node.right)
-        search(self.root)
-        return [idx for _, idx in sorted(heap, reverse=True)]
+                    search(node.right)
+
+            search(self.root)
+            record(nodes, leaves, distances, pruned)
+            ids = self.store.ids
+            return [int(ids[row]) for _, row in sorted(heap, reverse=True)]
+
+    def radius_search(
+        self,
+        target: Union[List[float], np.ndarray],
+        radius: float
+    ) -> List[IndexType]:
+        target = np.array(target, dtype=np.float32)
+        found: List[Tuple[float, int]] = []
+        nodes = leaves = distances = pruned = 0
+
+        with self._lock:
+            data, deleted = self.store.vectors, self.store.deleted
+            stack = [self.root] if self.root is not None else []
+            while stack:
+                node = stack.pop()
+                nodes += 1
+                distances += 1
+                if np.linalg.norm(target - node.center) - node.radius > radius:
+                    pruned += 1
+                    continue
+                if node.left is None and node.right is None:
+                    leaves += 1
+                    rows = node.points_idx[~deleted[node.points_idx]]
+                    distances += len(rows)
+                    dists = np.linalg.norm(data[rows] - target, axis=1)
+                    hit = dists <= radius
+                    found.extend(zip(dists[hit].tolist(), rows[hit].tolist()))
+                    continue
+                stack.extend(child for child in (node.left, node.right) if child is not None)
+
+            record(nodes, leaves, distances, pruned)
+            ids = self.store.ids
+            return [int(ids[row]) for _, row in sorted(found)]
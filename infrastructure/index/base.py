@@ -1,19 +1,189 @@
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import Any, Iterable, List, Optional, Sequence, Union
 import numpy as np
 
+from .store import VectorStore
+
 IndexType = np.float32
 
 
 class BaseIndex(ABC):
-    """Base class for all index implementations."""
-    
+    """
+    Base class for all index implementations.
+
+    Rows are kept in a `VectorStore` under integer ids (row positions unless
+    `ids` is passed) and `nearest` returns those ids. `add` places new rows
+    straight into the structure and `remove` tombstones them; once the
+    tombstone ratio or the share of rows inserted since the last build
+    crosses its threshold, the structure is rebuilt in a background thread
+    and swapped in, while reads keep using the current one.
+    """
+
+    max_tombstone_ratio: float = 0.25
+    max_insert_ratio: float = 0.5
+
     @abstractmethod
     def __init__(self, data: List[List[float]], **kwargs) -> None: ...
-    
+
     @abstractmethod
     def nearest(
         self,
         target: Union[List[float], np.ndarray],
-        k: int = 1
-    ) -> List[IndexType]: ...
\ No newline at end of file
+        k: int = 1,
+        max_distance: Optional[float] = None
+    ) -> List[IndexType]:
+        """Ids of the k closest rows, skipping any beyond `max_distance`."""
+
+    @abstractmethod
+    def radius_search(
+        self,
+        target: Union[List[float], np.ndarray],
+        radius: float
+    ) -> List[IndexType]:
+        """Ids of every row within `radius` of `target`, closest first."""
+
+    def _build_root(self, store: VectorStore) -> Any:
+        """Build the search structure over the live rows of `store`."""
+        return None
+
+    def _insert(self, row: int) -> None:
+        """Place a freshly appended row of `self.store` into the structure."""
+
+    def _init_index(
+        self,
+        data: List[List[float]],
+        ids: Optional[Sequence[int]] = None,
+        max_tombstone_ratio: Optional[float] = None,
+        max_insert_ratio: Optional[float] = None,
+        background_rebuild: bool = True,
+        **kwargs
+    ) -> None:
+        if max_tombstone_ratio is not None:
+            self.max_tombstone_ratio = max_tombstone_ratio
+        if max_insert_ratio is not None:
+            self.max_insert_ratio = max_insert_ratio
+        self.background_rebuild = background_rebuild
+        self._lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._rebuilding = False
+        self._pending: Optional[List[tuple]] = None
+        self.store = VectorStore(data, ids)
+        self.root = self._build_root(self.store)
+        self._built_rows = self.store.live
+        self._inserted = 0
+
+    @property
+    def data(self) -> np.ndarray:
+        return self.store.vectors
+
+    def __len__(self) -> int:
+        return self.store.live
+
+    def memory_bytes(self) -> int:
+        """Estimated bytes held: the vector store plus the tree's nodes."""
+        total = self.store.nbytes
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            total += 64  # object header and fields
+            for value in vars(node).values():
+                if isinstance(value, np.ndarray):
+                    total += value.nbytes
+                elif value.__class__ is node.__class__:  # child node
+                    stack.append(value)
+        return total
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return self.store.tombstones / max(self.store.size, 1)
+
+    @property
+    def imbalance(self) -> float:
+        """Rows inserted since the last build relative to the built size."""
+        return self._inserted / max(self._built_rows, 1)
+
+    def add(
+        self,
+        ids: Sequence[int],
+        vectors: Sequence[Sequence[float]]
+    ) -> None:
+        """Insert rows; ids already present are replaced."""
+        ids = list(ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._add(ids, vectors)
+            if self._pending is not None:
+                self._pending.append(("add", ids, vectors))
+        self._maybe_rebuild()
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Tombstone rows; unknown ids are ignored."""
+        ids = list(ids)
+        with self._lock:
+            self._remove(ids)
+            if self._pending is not None:
+                self._pending.append(("remove", ids, None))
+        self._maybe_rebuild()
+
+    def _add(self, ids: List[int], vectors: np.ndarray) -> None:
+        self._remove(ids)
+        for row in self.store.append(ids, vectors):
+            self._insert(int(row))
+        self._inserted += len(ids)
+
+    def _remove(self, ids: Iterable[int]) -> None:
+        self.store.delete(ids)
+
+    def needs_rebuild(self) -> bool:
+        return (
+            self.tombstone_ratio > self.max_tombstone_ratio
+            or self.imbalance > self.max_insert_ratio
+        )
+
+    def _maybe_rebuild(self) -> None:
+        with self._lock:
+            if self._rebuilding or not self.needs_rebuild():
+                return
+            self._rebuilding = True
+            if not self.background_rebuild:
+                self.rebuild()
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self.rebuild, daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def rebuild(self) -> None:
+        """
+        Compact the store and rebuild the structure from scratch. Writes that
+        land while the new structure is being built are replayed onto it
+        before it is swapped in.
+        """
+        with self._lock:
+            store = self.store.compact()
+            self._pending = []
+            self._rebuilding = True
+        try:
+            root = self._build_root(store)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+                self._rebuilding = False
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self.store, self.root = store, root
+            self._built_rows = store.live
+            self._inserted = 0
+            for op, ids, vectors in pending:
+                if op == "add":
+                    self._add(ids, vectors)
+                else:
+                    self._remove(ids)
+            self._rebuilding = False
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None) -> None:
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
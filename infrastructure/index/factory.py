@@ -12,6 +12,10 @@ class IndexFactory:
         'linear': LinearIndex
     }
 
+    @classmethod
+    def algorithms(cls) -> List[str]:
+        return list(cls._index_types)
+
     @classmethod
     def create(cls, algorithm: str, data: List[List[float]], **kwargs) -> BaseIndex:
         if algorithm not in cls._index_types:
@@ -3,6 +3,8 @@ from typing import List, Tuple, Optional, Union
 from dataclasses import dataclass
 import heapq
 from .base import BaseIndex, IndexType
+from .stats import record
+from .store import VectorStore
 
 
 @dataclass
@@ -18,82 +20,178 @@ class KDTree(BaseIndex):
     """
     Build: O(n log n)
     Query: average O(log n), worst-case O(n)
+    Insert: O(log n) descent into a leaf, leaf split past 2 * leaf_size
     """
 
     def __init__(
-        self, 
-        data: List[List[float]], 
-        leaf_size: int = 40, 
+        self,
+        data: List[List[float]],
+        leaf_size: int = 40,
         **kwargs
     ) -> None:
-        self.data = np.array(data, dtype=np.float32)
         self.leaf_size = leaf_size
-        self.dimensions = self.data.shape[1]
-        self.root = self._build(np.arange(len(data)), depth=0)
+        self._init_index(data, **kwargs)
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return self.store.dim
 
     def _select_axis(self, points: np.ndarray, depth: int) -> int:
-        if points.shape[0] < self.dimensions * 4:
-            return depth % self.dimensions
+        dimensions = points.shape[1]
+        if points.shape[0] < dimensions * 4:
+            return depth % dimensions
         variances = np.var(points, axis=0)
-        return np.argmax(variances)
+        return int(np.argmax(variances))
+
+    def _build_root(self, store: VectorStore) -> Optional[KDNode]:
+        if store.dim is None:
+            return None
+        return self._build(store.vectors, store.live_rows(), depth=0)
 
-    def _build(self, idxs: np.ndarray, depth: int) -> Optional[KDNode]:
+    def _build(
+        self,
+        data: np.ndarray,
+        idxs: np.ndarray,
+        depth: int
+    ) -> Optional[KDNode]:
         if len(idxs) == 0:
             return None
-        points = self.data[idxs]
-        
+        points = data[idxs]
+
         if len(idxs) <= self.leaf_size:
-            return KDNode(points=points, indices=idxs, axis=depth % self.dimensions)
+            return KDNode(points=points, indices=idxs, axis=depth % data.shape[1])
 
         axis = self._select_axis(points, depth)
         median_idx = len(idxs) // 2
-        
+
         partition_idx = np.argpartition(points[:, axis], median_idx)
         left_idxs = idxs[partition_idx[:median_idx]]
         right_idxs = idxs[partition_idx[median_idx + 1:]]
         median_idx_actual = partition_idx[median_idx]
-        
+
         return KDNode(
             points=points[median_idx_actual:median_idx_actual+1],
             indices=idxs[median_idx_actual:median_idx_actual+1],
             axis=axis,
-            left=self._build(left_idxs, depth + 1),
-            right=self._build(right_idxs, depth + 1)
+            left=self._build(data, left_idxs, depth + 1),
+            right=self._build(data, right_idxs, depth + 1)
+        )
+
+    def _insert(self, row: int) -> None:
+        point = self.store.vectors[row]
+        leaf = KDNode(
+            points=point[None, :].copy(),
+            indices=np.array([row], dtype=np.int64),
+            axis=0
         )
+        if self.root is None:
+            self.root = leaf
+            return
+
+        node, depth = self.root, 0
+        while node.left is not None or node.right is not None:
+            go_left = point[node.axis] < node.points[0][node.axis]
+            child = node.left if go_left else node.right
+            if child is None:
+                leaf.axis = (depth + 1) % self.dimensions
+                if go_left:
+                    node.left = leaf
+                else:
+                    node.right = leaf
+                return
+            node, depth = child, depth + 1
+
+        node.points = np.vstack([node.points, point])
+        node.indices = np.append(node.indices, row)
+        if len(node.indices) > 2 * self.leaf_size:
+            split = self._build(self.store.vectors, node.indices, depth)
+            node.points, node.indices, node.axis = split.points, split.indices, split.axis
+            node.left, node.right = split.left, split.right
 
     def nearest(
         self,
         target: Union[List[float], np.ndarray],
-        k: int = 1
+        k: int = 1,
+        max_distance: Optional[float] = None
     ) -> List[IndexType]:
         target = np.array(target, dtype=np.float32)
         heap: List[Tuple[float, IndexType]] = []
-        
-        def squared_distance(p1: np.ndarray, p2: np.ndarray) -> float:
-            diff = p1 - p2
-            return np.dot(diff, diff)
+        limit = np.inf if max_distance is None else max_distance
+        nodes = leaves = distances = pruned = 0
 
-        def search(node: Optional[KDNode]) -> None:
-            if node is None:
-                return
-            for point, idx in zip(node.points, node.indices):
-                dist = np.sqrt(squared_distance(target, point))
-                if len(heap) < k:
-                    heapq.heappush(heap, (-dist, idx))
-                elif -dist > heap[0][0]:
-                    heapq.heapreplace(heap, (-dist, idx))
-            
-            if node.left is None and node.right is None:
-                return
-            axis_dist = target[node.axis] - node.points[0][node.axis]
-            if axis_dist < 0:
-                first, second = node.left, node.right
-            else:
-                first, second = node.right, node.left
-                
-            search(first)
-            if len(heap) < k or axis_dist * axis_dist < -heap[0][0]:
-                search(second)
-                
-        search(self.root)
-        return [idx for _, idx in sorted(heap, reverse=True)]
+        with self._lock:
+            deleted = self.store.deleted
+
+            def bound() -> float:
+                return -heap[0][0] if len(heap) == k else limit
+
+            def search(node: Optional[KDNode]) -> None:
+                nonlocal nodes, leaves, distances, pruned
+                if node is None:
+                    return
+                nodes += 1
+                distances += len(node.points)
+                dists = np.linalg.norm(node.points - target, axis=1)
+                for dist, row in zip(dists, node.indices):
+                    if deleted[row] or dist > limit:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-dist, row))
+                    elif -dist > heap[0][0]:
+                        heapq.heapreplace(heap, (-dist, row))
+
+                if node.left is None and node.right is None:
+                    leaves += 1
+                    return
+                axis_dist = target[node.axis] - node.points[0][node.axis]
+                if axis_dist < 0:
+                    first, second = node.left, node.right
+                else:
+                    first, second = node.right, node.left
+
+                search(first)
+                if abs(axis_dist) <= bound():
+                    search(second)
+                elif second is not None:
+                    pruned += 1
+
+            search(self.root)
+            record(nodes, leaves, distances, pruned)
+            ids = self.store.ids
+            return [int(ids[row]) for _, row in sorted(heap, reverse=True)]
+
+    def radius_search(
+        self,
+        target: Union[List[float], np.ndarray],
+        radius: float
+    ) -> List[IndexType]:
+        target = np.array(target, dtype=np.float32)
+        found: List[Tuple[float, int]] = []
+        nodes = leaves = distances = pruned = 0
+
+        with self._lock:
+            deleted = self.store.deleted
+            stack = [self.root] if self.root is not None else []
+            while stack:
+                node = stack.pop()
+                nodes += 1
+                distances += len(node.points)
+                dists = np.linalg.norm(node.points - target, axis=1)
+                hit = (dists <= radius) & ~deleted[node.indices]
+                found.extend(zip(dists[hit].tolist(), node.indices[hit].tolist()))
+
+                if node.left is None and node.right is None:
+                    leaves += 1
+                    continue
+                axis_dist = target[node.axis] - node.points[0][node.axis]
+                for child, reachable in ((node.left, axis_dist <= radius),
+                                         (node.right, axis_dist >= -radius)):
+                    if child is not None:
+                        if reachable:
+                            stack.append(child)
+                        else:
+                            pruned += 1
+
+            record(nodes, leaves, distances, pruned)
+            ids = self.store.ids
+            return [int(ids[row]) for _, row in sorted(found)]
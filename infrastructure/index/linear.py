@@ -1,26 +1,57 @@
 import numpy as np
-from typing import List, Union
+from typing import List, Optional, Union
 from .base import BaseIndex, IndexType
+from .stats import record
 
 
 class LinearIndex(BaseIndex):
     """
     Build: O(1)
     Query: O(n)
+    Insert: O(1) amortized append
     """
+
+    max_insert_ratio = float("inf")
+
     def __init__(self, data: List[List[float]], **kwargs) -> None:
-        self.data = np.array(data, dtype=np.float32)
+        self._init_index(data, **kwargs)
 
     def nearest(
-        self, 
-        target: Union[List[float], np.ndarray], 
-        k: int = 1
+        self,
+        target: Union[List[float], np.ndarray],
+        k: int = 1,
+        max_distance: Optional[float] = None
     ) -> List[IndexType]:
 
         target = np.array(target, dtype=np.float32)
-        dists = [
-            (float(np.linalg.norm(target - pt)), i)
-            for i, pt in enumerate(self.data)
-        ]
-        dists.sort(key=lambda x: x[0])
-        return [i for _, i in dists[:k]]
+        with self._lock:
+            rows = self.store.live_rows()
+            if len(rows) == 0:
+                return []
+            dists = np.linalg.norm(self.store.vectors[rows] - target, axis=1)
+            record(0, 0, len(rows))
+            if max_distance is not None:
+                keep = dists <= max_distance
+                rows, dists = rows[keep], dists[keep]
+            if k < len(rows):
+                top = np.argpartition(dists, k - 1)[:k]
+                top = top[np.lexsort((top, dists[top]))]
+            else:
+                top = np.argsort(dists, kind="stable")
+            return [int(i) for i in self.store.ids[rows[top]]]
+
+    def radius_search(
+        self,
+        target: Union[List[float], np.ndarray],
+        radius: float
+    ) -> List[IndexType]:
+        target = np.array(target, dtype=np.float32)
+        with self._lock:
+            rows = self.store.live_rows()
+            if len(rows) == 0:
+                return []
+            dists = np.linalg.norm(self.store.vectors[rows] - target, axis=1)
+            record(0, 0, len(rows))
+            hit = np.flatnonzero(dists <= radius)
+            hit = hit[np.argsort(dists[hit], kind="stable")]
+            return [int(i) for i in self.store.ids[rows[hit]]]
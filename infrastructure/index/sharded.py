@@ -0,0 +1,139 @@
+import contextvars
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from .base import BaseIndex, IndexType
+from .factory import IndexFactory
+
+_shard_pool = ThreadPoolExecutor(max_workers=8)
+
+
+class ShardedIndex(BaseIndex):
+    """
+    Build: one `algorithm` index per shard, built in parallel
+    Query: every shard searched in parallel, merged by distance
+    Insert: routed to the owning shard only
+
+    Ids are assigned to shards by `shard_of` (default `id % shards`). Each
+    shard has its own store, structure and lock, so a write only locks, and
+    can only trigger a rebuild of, the shard it lands in.
+    """
+
+    def __init__(
+        self,
+        data: List[List[float]],
+        ids: Optional[Sequence[int]] = None,
+        shards: int = 4,
+        algorithm: str = "kd",
+        shard_of: Optional[Callable[[int], int]] = None,
+        **kwargs
+    ) -> None:
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.algorithm = algorithm
+        self.shard_of = shard_of or (lambda id_: id_ % shards)
+        ids = list(range(len(data))) if ids is None else [int(i) for i in ids]
+        owner = np.array([self.shard_of(i) for i in ids], dtype=np.int64)
+        data = np.asarray(data, dtype=np.float32)
+        ids_arr = np.asarray(ids, dtype=np.int64)
+
+        def build(shard: int) -> BaseIndex:
+            sel = np.flatnonzero(owner == shard)
+            vectors = data[sel] if len(sel) else []
+            return IndexFactory.create(algorithm, vectors, ids=ids_arr[sel], **kwargs)
+
+        self.shards: List[BaseIndex] = list(_shard_pool.map(build, range(shards)))
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    @property
+    def data(self) -> np.ndarray:
+        parts = [s.data for s in self.shards if s.store.dim is not None]
+        return np.vstack(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+    @property
+    def tombstone_ratio(self) -> float:
+        size = sum(s.store.size for s in self.shards)
+        return sum(s.store.tombstones for s in self.shards) / max(size, 1)
+
+    @property
+    def imbalance(self) -> float:
+        return max(s.imbalance for s in self.shards)
+
+    def memory_bytes(self) -> int:
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+    def _route(self, ids: Iterable[int]) -> List[List[int]]:
+        routed: List[List[int]] = [[] for _ in self.shards]
+        for pos, id_ in enumerate(ids):
+            routed[self.shard_of(int(id_))].append(pos)
+        return routed
+
+    def add(
+        self,
+        ids: Sequence[int],
+        vectors: Sequence[Sequence[float]]
+    ) -> None:
+        ids = list(ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for shard, positions in zip(self.shards, self._route(ids)):
+            if positions:
+                shard.add([ids[p] for p in positions], vectors[positions])
+
+    def remove(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        for shard, positions in zip(self.shards, self._route(ids)):
+            if positions:
+                shard.remove([ids[p] for p in positions])
+
+    def needs_rebuild(self) -> bool:
+        return any(shard.needs_rebuild() for shard in self.shards)
+
+    def rebuild(self) -> None:
+        list(_shard_pool.map(lambda shard: shard.rebuild(), self.shards))
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None) -> None:
+        for shard in self.shards:
+            shard.wait_for_rebuild(timeout)
+
+    def _gather(
+        self,
+        search: Callable[[BaseIndex, np.ndarray], List[IndexType]],
+        target: np.ndarray
+    ) -> List[List[Tuple[float, int]]]:
+        def run(shard: BaseIndex) -> List[Tuple[float, int]]:
+            with shard._lock:
+                ids = search(shard, target)
+                if not ids:
+                    return []
+                rows = [shard.store.row_of(i) for i in ids]
+                dists = np.linalg.norm(shard.store.vectors[rows] - target, axis=1)
+            return list(zip(dists.tolist(), ids))
+
+        # each task runs in a copy of the caller's context, so traversal
+        # stats collected around this search include every shard
+        contexts = [contextvars.copy_context() for _ in self.shards]
+        return list(_shard_pool.map(lambda ctx, shard: ctx.run(run, shard), contexts, self.shards))
+
+    def nearest(
+        self,
+        target: Union[List[float], np.ndarray],
+        k: int = 1,
+        max_distance: Optional[float] = None
+    ) -> List[IndexType]:
+        target = np.array(target, dtype=np.float32)
+        per_shard = self._gather(lambda s, t: s.nearest(t, k, max_distance), target)
+        return [id_ for _, id_ in itertools.islice(heapq.merge(*per_shard), k)]
+
+    def radius_search(
+        self,
+        target: Union[List[float], np.ndarray],
+        radius: float
+    ) -> List[IndexType]:
+        target = np.array(target, dtype=np.float32)
+        per_shard = self._gather(lambda s, t: s.radius_search(t, radius), target)
+        return [id_ for _, id_ in heapq.merge(*per_shard)]
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+
+@dataclass
+class TraversalStats:
+    """Work done by the index searches run inside one `collect()` block."""
+    searches: int = 0
+    nodes_visited: int = 0
+    leaves_scanned: int = 0
+    distance_evaluations: int = 0
+    subtrees_pruned: int = 0  # skipped because they could not beat the bound
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(
+        self,
+        nodes_visited: int,
+        leaves_scanned: int,
+        distance_evaluations: int,
+        subtrees_pruned: int
+    ) -> None:
+        with self._lock:
+            self.searches += 1
+            self.nodes_visited += nodes_visited
+            self.leaves_scanned += leaves_scanned
+            self.distance_evaluations += distance_evaluations
+            self.subtrees_pruned += subtrees_pruned
+
+
+_current: ContextVar[Optional[TraversalStats]] = ContextVar("traversal_stats", default=None)
+
+
+@contextmanager
+def collect() -> Iterator[TraversalStats]:
+    """
+    Counts index work done in this context. Sharded searches copy the
+    context into their worker threads, so their shards count here too.
+    """
+    stats = TraversalStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def record(
+    nodes_visited: int,
+    leaves_scanned: int,
+    distance_evaluations: int,
+    subtrees_pruned: int = 0
+) -> None:
+    """Called once per search by an index with the work it did."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add(nodes_visited, leaves_scanned, distance_evaluations, subtrees_pruned)
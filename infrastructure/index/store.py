@@ -0,0 +1,121 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class VectorStore:
+    """
+    Growable float32 matrix whose rows carry integer ids.
+    Deleted rows are tombstoned and only dropped by `compact`.
+    """
+
+    def __init__(
+        self,
+        data: Optional[Sequence[Sequence[float]]] = None,
+        ids: Optional[Sequence[int]] = None
+    ) -> None:
+        vectors = np.asarray(data if data is not None else [], dtype=np.float32)
+        if vectors.ndim != 2:
+            if vectors.size:
+                raise ValueError("data must be a 2-D array of vectors")
+            vectors = None
+        n = 0 if vectors is None else vectors.shape[0]
+        if ids is None:
+            ids = np.arange(n, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != n:
+            raise ValueError("ids and vectors must have the same length")
+
+        self.dim: Optional[int] = None if vectors is None else vectors.shape[1]
+        self._vectors = vectors if vectors is not None else np.empty((0, 0), np.float32)
+        self._ids = ids
+        self._deleted = np.zeros(n, dtype=bool)
+        self.size = n
+        self.tombstones = 0
+        self._row_of: Dict[int, int] = {int(i): r for r, i in enumerate(ids)}
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self.size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self.size]
+
+    @property
+    def deleted(self) -> np.ndarray:
+        return self._deleted[:self.size]
+
+    @property
+    def live(self) -> int:
+        return self.size - self.tombstones
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays (including spare capacity) and the id map."""
+        arrays = self._vectors.nbytes + self._ids.nbytes + self._deleted.nbytes
+        return arrays + 100 * len(self._row_of)
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self.deleted)
+
+    def row_of(self, id_: int) -> Optional[int]:
+        return self._row_of.get(int(id_))
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 16)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:self.size] = self.deleted
+        self._vectors, self._ids, self._deleted = vectors, ids, deleted
+
+    def append(
+        self,
+        ids: Sequence[int],
+        vectors: Sequence[Sequence[float]]
+    ) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError("ids and vectors must have the same length")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}"
+            )
+        self._reserve(len(ids))
+        rows = np.arange(self.size, self.size + len(ids), dtype=np.int64)
+        self._vectors[rows] = vectors
+        self._ids[rows] = ids
+        self._deleted[rows] = False
+        for row, id_ in zip(rows, ids):
+            self._row_of[int(id_)] = int(row)
+        self.size += len(ids)
+        return rows
+
+    def delete(self, ids: Iterable[int]) -> List[int]:
+        rows = []
+        for id_ in ids:
+            row = self._row_of.pop(int(id_), None)
+            if row is not None:
+                self._deleted[row] = True
+                rows.append(row)
+        self.tombstones += len(rows)
+        return rows
+
+    def compact(self) -> "VectorStore":
+        rows = self.live_rows()
+        store = VectorStore(self.vectors[rows].copy(), self.ids[rows].copy())
+        store.dim = self.dim
+        if store.size == 0 and self.dim is not None:
+            store._vectors = np.empty((0, self.dim), dtype=np.float32)
+        return store
@@ -1,29 +1,489 @@
-from typing import List, Optional
-from infrastructure.repositories import BaseLibraryRepository
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from domain.models import Chunk, Document, Library
+from infrastructure.repositories import BaseLibraryRepository, delta, group_commit
+
+
+@dataclass(frozen=True)
+class LogEntry:
+    seq: int
+    op: str  # the `delta` record's op
+    lib_id: str
+    payload: Optional[Dict[str, Any]]  # the `delta` record
+    created_at: float
+
+
+class LogTruncated(Exception):
+    """The requested entries were dropped from the log; catch up from a snapshot."""
+
+
+class ReplicationLog:
+    """
+    Sequenced in-memory operation log. Sequence numbers start at 1; only the
+    newest `capacity` entries are retained.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.capacity = capacity
+        self._entries: Deque[LogEntry] = deque()
+        self._last_seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    @property
+    def first_seq(self) -> int:
+        with self._cond:
+            return self._entries[0].seq if self._entries else self._last_seq + 1
+
+    def append(
+        self,
+        op: str,
+        lib_id: str,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> LogEntry:
+        with self._cond:
+            self._last_seq += 1
+            entry = LogEntry(self._last_seq, op, lib_id, payload, time.time())
+            self._entries.append(entry)
+            while len(self._entries) > self.capacity:
+                self._entries.popleft()
+            self._cond.notify_all()
+            return entry
+
+    def read(self, after_seq: int, limit: int = 256) -> List[LogEntry]:
+        """Entries with seq > `after_seq`, oldest first."""
+        with self._cond:
+            if after_seq >= self._last_seq:
+                return []
+            first = self._entries[0].seq if self._entries else self._last_seq + 1
+            if after_seq + 1 < first:
+                raise LogTruncated(f"entries after {after_seq} were truncated")
+            start = after_seq + 1 - first
+            return list(itertools.islice(self._entries, start, start + limit))
+
+    def created_at(self, seq: int) -> Optional[float]:
+        """Append time of entry `seq`, or None if it is not retained."""
+        with self._cond:
+            if not self._entries or not self._entries[0].seq <= seq <= self._last_seq:
+                return None
+            return self._entries[seq - self._entries[0].seq].created_at
+
+    def wake(self) -> None:
+        """Release every thread blocked in `wait`."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, after_seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until an entry past `after_seq` exists, or until woken."""
+        with self._cond:
+            if self._last_seq <= after_seq:
+                self._cond.wait(timeout)
+            return self._last_seq > after_seq
+
+
+class Follower:
+    """
+    Applies the leader's log to `repo` in sequence on a background thread.
+    A failed apply is retried until it succeeds; a follower whose next
+    entry has been truncated from the log (and, with `sync_on_start`, a
+    freshly started one) reloads from `snapshot`, which returns the
+    leader's libraries together with the seq they reflect.
+    """
+
+    def __init__(
+        self,
+        repo: BaseLibraryRepository,
+        log: ReplicationLog,
+        snapshot: Callable[[], Tuple[int, List[Dict[str, Any]]]],
+        name: str = "follower",
+        batch_size: int = 256,
+        retry_seconds: float = 0.1,
+        sync_on_start: bool = True
+    ) -> None:
+        self.repo = repo
+        self.log = log
+        self.snapshot = snapshot
+        self.name = name
+        self.batch_size = batch_size
+        self.retry_seconds = retry_seconds
+        self.applied_seq = 0
+        self.snapshots_loaded = 0
+        self.error: Optional[str] = None
+        # read routing stats, maintained by LeaderFollowerRepository
+        self.reads = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.unhealthy_until = 0.0
+        self._needs_snapshot = sync_on_start
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self.log.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def lag(self) -> int:
+        """Log entries not yet applied."""
+        return max(self.log.last_seq - self.applied_seq, 0)
+
+    @property
+    def staleness(self) -> float:
+        """Seconds since the oldest write this follower has not applied."""
+        if self._needs_snapshot:
+            return float("inf")
+        if self.lag == 0:
+            return 0.0
+        created = self.log.created_at(self.applied_seq + 1)
+        return float("inf") if created is None else max(time.time() - created, 0.0)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "running": self.running,
+            "applied_seq": self.applied_seq,
+            "lag": self.lag,
+            "staleness_seconds": self.staleness,
+            "snapshots_loaded": self.snapshots_loaded,
+            "error": self.error,
+            "reads": self.reads,
+            "read_failures": self.failures,
+            "in_flight": self.in_flight,
+            "latency_ewma_seconds": self.latency_ewma,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._needs_snapshot:
+                self._needs_snapshot = not self._guarded(self._load_snapshot)
+                continue
+            try:
+                entries = self.log.read(self.applied_seq, self.batch_size)
+            except LogTruncated:
+                self._needs_snapshot = True
+                continue
+            if not entries:
+                self.log.wait(self.applied_seq, timeout=0.5)
+                continue
+            self._guarded(self._apply_all, entries)
+
+    def _guarded(self, fn: Callable[..., None], *args: Any) -> bool:
+        try:
+            fn(*args)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._stop.wait(self.retry_seconds)
+            return False
+        self.error = None
+        return True
+
+    def _apply_all(self, entries: List[LogEntry]) -> None:
+        """Applies `entries` in order; their commits are waited for together."""
+        with group_commit.deferred():
+            for entry in entries:
+                if self._stop.is_set():
+                    break
+                delta.replay(self.repo, entry.payload)
+                self.applied_seq = entry.seq
+
+    def _load_snapshot(self) -> None:
+        seq, libraries = self.snapshot()
+        keep = {str(lib["id"]) for lib in libraries}
+        for lib in self.repo.list_all():
+            if str(lib.id) not in keep:
+                self.repo.delete(str(lib.id))
+        for lib in libraries:
+            self.repo.update(Library.from_dict(lib))
+        self.applied_seq = seq
+        self.snapshots_loaded += 1
+
+
+READ_POLICIES = ("leader", "round_robin", "least_loaded", "latency")
+
+
+@dataclass
+class ReplicaSession:
+    """
+    Read-your-writes state of one client: the highest log seq it has
+    written or been handed back as its version token.
+    """
+    min_seq: int = 0
+
+
+_session: ContextVar[Optional[ReplicaSession]] = ContextVar("replica_session", default=None)
+
+
+@contextmanager
+def read_session(min_seq: int = 0) -> Iterator[ReplicaSession]:
+    """
+    Bind a client session to the current context. Reads inside it are only
+    served by followers that have applied `min_seq`; writes raise it.
+    """
+    session = ReplicaSession(min_seq)
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
 
 
 class LeaderFollowerRepository(BaseLibraryRepository):
-    def __init__(self, leader: BaseLibraryRepository, followers: List[BaseLibraryRepository]):
+    """
+    Writes go to the leader and are appended, in the same critical section,
+    to a sequenced log that each follower applies asynchronously; write
+    latency no longer depends on the followers. Fine-grained writes are
+    logged as `delta` records, so followers receive only the change. The
+    leader's commit is waited for after the write lock is released, so
+    concurrent writes share a group commit.
+
+    Reads are routed by `read_policy`: `leader` sends them all to the
+    leader; `round_robin`, `least_loaded` (fewest reads in flight) and
+    `latency` (lowest moving-average read time) spread them over followers
+    that are replicating without error, within `max_staleness_seconds`, and
+    past the current `read_session`'s seq. A follower whose read fails is
+    skipped for `failure_cooldown_seconds`; with no eligible follower the
+    leader answers. Reads that feed a write use `get_for_update`, which
+    always goes to the leader.
+    """
+
+    def __init__(
+        self,
+        leader: BaseLibraryRepository,
+        followers: List[BaseLibraryRepository],
+        read_policy: str = "leader",
+        max_staleness_seconds: Optional[float] = None,
+        log_capacity: int = 1024,
+        failure_cooldown_seconds: float = 5.0
+    ) -> None:
+        if read_policy not in READ_POLICIES:
+            raise ValueError(
+                f"Unsupported read_policy '{read_policy}'. "
+                f"Supported policies are: {list(READ_POLICIES)}"
+            )
         self.leader = leader
-        self.followers = followers
+        self.read_policy = read_policy
+        self.max_staleness_seconds = max_staleness_seconds
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+        self.log = ReplicationLog(log_capacity)
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._turn = itertools.count()
+        self.followers = [
+            Follower(repo, self.log, self._snapshot, name=f"follower-{i}")
+            for i, repo in enumerate(followers)
+        ]
+        for follower in self.followers:
+            follower.start()
+
+    def _snapshot(self) -> Tuple[int, List[Dict[str, Any]]]:
+        with self._write_lock:
+            return self.log.last_seq, [
+                lib.to_dict() for lib in self.leader.list_all()
+            ]
+
+    def _eligible(self, max_staleness: Optional[float]) -> List[Follower]:
+        session = _session.get()
+        min_seq = session.min_seq if session is not None else 0
+        now = time.monotonic()
+        return [
+            f for f in self.followers
+            if f.running
+            and f.error is None
+            and f.unhealthy_until <= now
+            and f.applied_seq >= min_seq
+            and (max_staleness is None or f.staleness <= max_staleness)
+        ]
+
+    def _pick(self, max_staleness: Optional[float]) -> Optional[Follower]:
+        if self.read_policy == "leader":
+            return None
+        eligible = self._eligible(max_staleness)
+        if not eligible:
+            return None
+        turn = next(self._turn) % len(eligible)
+        if self.read_policy == "round_robin":
+            return eligible[turn]
+        rotated = eligible[turn:] + eligible[:turn]  # rotate so ties spread out
+        if self.read_policy == "least_loaded":
+            return min(rotated, key=lambda f: f.in_flight)
+        return min(rotated, key=lambda f: (f.latency_ewma, f.in_flight))
+
+    def _read(self, max_staleness: Optional[float], fn: Callable[[BaseLibraryRepository], Any]) -> Any:
+        bound = self.max_staleness_seconds if max_staleness is None else max_staleness
+        follower = self._pick(bound)
+        if follower is None:
+            return fn(self.leader)
+        with self._stats_lock:
+            follower.in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = fn(follower.repo)
+        except Exception:
+            with self._stats_lock:
+                follower.in_flight -= 1
+                follower.failures += 1
+                follower.unhealthy_until = time.monotonic() + self.failure_cooldown_seconds
+            return fn(self.leader)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            follower.in_flight -= 1
+            follower.reads += 1
+            follower.latency_ewma = (
+                elapsed if follower.reads == 1
+                else 0.8 * follower.latency_ewma + 0.2 * elapsed
+            )
+        return result
+
+    def _logged(self, record: Dict[str, Any]) -> None:
+        entry = self.log.append(record["op"], record["id"], record)
+        session = _session.get()
+        if session is not None:
+            session.min_seq = max(session.min_seq, entry.seq)
+
+    def add(self, lib: Library) -> Library:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.add(lib)
+            self._logged(delta.put(lib))
+        return lib
+
+    def get(
+        self,
+        lib_id: str,
+        max_staleness: Optional[float] = None
+    ) -> Optional[Library]:
+        return self._read(max_staleness, lambda repo: repo.get(lib_id))
 
-    def add(self, lib: BaseLibraryRepository) -> None:
-        self.leader.add(lib)
-        for f in self.followers:
-            f.add(lib)
+    def get_for_update(self, lib_id: str) -> Optional[Library]:
+        return self.leader.get_for_update(lib_id)
 
-    def get(self, lib_id: str) -> Optional[BaseLibraryRepository]:
-        return self.leader.get(lib_id)
+    # reads that feed a write, like `get_for_update`
 
-    def update(self, lib: BaseLibraryRepository) -> None:
-        self.leader.update(lib)
-        for f in self.followers:
-            f.update(lib)
+    def get_document(self, lib_id: str, doc_id: UUID) -> Optional[Document]:
+        return self.leader.get_document(lib_id, doc_id)
+
+    def document_of(self, lib_id: str, chunk_id: UUID) -> Optional[UUID]:
+        return self.leader.document_of(lib_id, chunk_id)
+
+    def get_header(
+        self,
+        lib_id: str,
+        max_staleness: Optional[float] = None
+    ) -> Optional[Library]:
+        return self._read(max_staleness, lambda repo: repo.get_header(lib_id))
+
+    def list_documents(
+        self,
+        lib_id: str,
+        max_staleness: Optional[float] = None
+    ) -> Optional[List[Document]]:
+        return self._read(max_staleness, lambda repo: repo.list_documents(lib_id))
+
+    def get_chunks(
+        self,
+        lib_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_staleness: Optional[float] = None
+    ) -> Optional[List[Chunk]]:
+        return self._read(max_staleness, lambda repo: repo.get_chunks(lib_id, offset, limit))
+
+    def get_document_chunks(
+        self,
+        lib_id: str,
+        doc_id: UUID,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_staleness: Optional[float] = None
+    ) -> Optional[List[Chunk]]:
+        return self._read(
+            max_staleness, lambda repo: repo.get_document_chunks(lib_id, doc_id, offset, limit)
+        )
+
+    def update(self, lib: Library) -> Library:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.update(lib)
+            self._logged(delta.put(lib))
+        return lib
 
     def delete(self, lib_id: str) -> None:
-        self.leader.delete(lib_id)
-        for f in self.followers:
-            f.delete(lib_id)
+        with group_commit.deferred(), self._write_lock:
+            self.leader.delete(lib_id)
+            self._logged(delta.delete(lib_id))
+
+    def update_header(self, lib: Library) -> None:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.update_header(lib)
+            self._logged(delta.header(lib))
+
+    def upsert_document(self, lib: Library, document: Document) -> None:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.upsert_document(lib, document)
+            self._logged(delta.document(lib, document))
+
+    def add_chunks(self, lib: Library, chunks: Sequence[Tuple[UUID, Chunk]]) -> None:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.add_chunks(lib, chunks)
+            self._logged(delta.chunks_added(lib, chunks))
+
+    def update_chunk(self, lib: Library, chunk: Chunk) -> None:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.update_chunk(lib, chunk)
+            self._logged(delta.chunk_updated(lib, chunk))
+
+    def delete_chunks(self, lib: Library, chunk_ids: Sequence[UUID]) -> None:
+        with group_commit.deferred(), self._write_lock:
+            self.leader.delete_chunks(lib, chunk_ids)
+            self._logged(delta.chunks_deleted(lib, chunk_ids))
+
+    def list_all(self, max_staleness: Optional[float] = None) -> List[Library]:
+        return self._read(max_staleness, lambda repo: repo.list_all())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "read_policy": self.read_policy,
+            "last_seq": self.log.last_seq,
+            "first_seq": self.log.first_seq,
+            "followers": [f.status() for f in self.followers],
+        }
+
+    def wait_for_replication(self, timeout: Optional[float] = None) -> bool:
+        """Block until every running follower has applied the whole log."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        target = self.log.last_seq
+        while any(f.running and f.applied_seq < target for f in self.followers):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def flush(self) -> None:
+        self.leader.flush()
 
-    def list_all(self) -> List[BaseLibraryRepository]:
-        return self.leader.list_all()
+    def close(self) -> None:
+        for follower in self.followers:
+            follower.stop()
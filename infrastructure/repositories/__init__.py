@@ -1,4 +1,5 @@
 from .base import BaseLibraryRepository
+from .file_repo import FileLibraryRepository
 from .json_repo import JSONLibraryRepository
 from .pickle_repo import PickleLibraryRepository
 from .sqlite_repo import SQLiteLibraryRepository
@@ -6,6 +7,7 @@ from .factory import RepositoryFactory
 
 __all__ = [
     'BaseLibraryRepository',
+    'FileLibraryRepository',
     'JSONLibraryRepository',
     'PickleLibraryRepository',
     'SQLiteLibraryRepository',
@@ -1,6 +1,21 @@
+import itertools
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from domain.models import Library
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from domain.models import Chunk, Document, Library
+from utils import metrics
+
+PERSIST_SECONDS = metrics.histogram(
+    "vectordb_repository_persist_seconds",
+    "Time to write libraries to storage.",
+    ["backend"],
+)
+PERSIST_BYTES = metrics.counter(
+    "vectordb_repository_persist_bytes_total",
+    "Bytes written to storage.",
+    ["backend"],
+)
 
 
 class BaseLibraryRepository(ABC):
@@ -13,4 +28,93 @@ class BaseLibraryRepository(ABC):
     @abstractmethod
     def delete(self, lib_id: str) -> None: ...
     @abstractmethod
-    def list_all(self) -> List[Library]: ... 
\ No newline at end of file
+    def list_all(self) -> List[Library]: ...
+
+    def get_for_update(self, lib_id: str) -> Optional[Library]:
+        """Like `get`, but never served by a lagging replica."""
+        return self.get(lib_id)
+
+    def flush(self) -> None:
+        """Blocks until every write made so far is durable."""
+
+    # Fine-grained writes. `lib` already holds the change, and the header
+    # it leaves (the version, say); each method persists the header and
+    # just the part named. These defaults write the whole library; every
+    # backend overrides them so a write costs the size of the change.
+
+    def update_header(self, lib: Library) -> None:
+        """Persists the fields of `lib` other than its documents."""
+        self.update(lib)
+
+    def upsert_document(self, lib: Library, document: Document) -> None:
+        """Persists the title and metadata of `document`, appended if new."""
+        self.update(lib)
+
+    def add_chunks(self, lib: Library, chunks: Sequence[Tuple[UUID, Chunk]]) -> None:
+        """Persists (document id, chunk) pairs appended to those documents."""
+        self.update(lib)
+
+    def update_chunk(self, lib: Library, chunk: Chunk) -> None:
+        """Persists the text, embedding and metadata of `chunk`."""
+        self.update(lib)
+
+    def delete_chunks(self, lib: Library, chunk_ids: Sequence[UUID]) -> None:
+        self.update(lib)
+
+    # Partial reads. These defaults go through `get`, which is constant time
+    # for the in-memory backends; backends that load from storage override
+    # them to read only what is asked for.
+
+    def get_header(self, lib_id: str) -> Optional[Library]:
+        """The library with its documents loaded on first access (`Library.lazy`)."""
+        return self.get(lib_id)
+
+    def list_documents(self, lib_id: str) -> Optional[List[Document]]:
+        """The library's documents without their chunks (`chunks` is empty)."""
+        lib = self.get(lib_id)
+        if lib is None:
+            return None
+        return [Document(d.id, d.title, [], d.metadata) for d in lib.documents]
+
+    def get_chunks(
+        self,
+        lib_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Optional[List[Chunk]]:
+        """A page of the library's chunks in document order."""
+        lib = self.get(lib_id)
+        if lib is None:
+            return None
+        chunks = (c for d in lib.documents for c in d.chunks)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(chunks, offset, stop))
+
+    def get_document(self, lib_id: str, doc_id: UUID) -> Optional[Document]:
+        """One document with its chunks; None if it or the library is gone."""
+        lib = self.get(lib_id)
+        if lib is None:
+            return None
+        return next((d for d in lib.documents if d.id == doc_id), None)
+
+    def document_of(self, lib_id: str, chunk_id: UUID) -> Optional[UUID]:
+        """The id of the document holding the chunk, if any."""
+        lib = self.get(lib_id)
+        if lib is None:
+            return None
+        return next((d.id for d in lib.documents for c in d.chunks if c.id == chunk_id), None)
+
+    def get_document_chunks(
+        self,
+        lib_id: str,
+        doc_id: UUID,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Optional[List[Chunk]]:
+        """A page of one document's chunks (none if the document is gone)."""
+        lib = self.get(lib_id)
+        if lib is None:
+            return None
+        doc = next((d for d in lib.documents if d.id == doc_id), None)
+        chunks = doc.chunks if doc is not None else []
+        return chunks[offset:None if limit is None else offset + limit]
@@ -0,0 +1,141 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from domain.models import Chunk, Library
+
+try:  # optional: several times faster than the stdlib on large files
+    import orjson
+except ImportError:
+    orjson = None
+
+# 1: a bare list of libraries, embeddings as lists of floats
+# 2: {"format": 2, "libraries": [...]}, embeddings as base64 little-endian float32
+FORMAT_VERSION = 2
+
+_FLOAT32 = np.dtype("<f4")
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON (no indentation or spaces) with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def vector_bytes(vector: np.ndarray) -> bytes:
+    return vector.astype(_FLOAT32, copy=False).tobytes()
+
+
+def vector_from_bytes(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=_FLOAT32)
+
+
+def vectors_from_bytes(blobs: List[bytes]) -> Optional[np.ndarray]:
+    """The (n, dim) matrix of `blobs`, or None unless they all have one non-zero length."""
+    if not blobs or len({len(b) for b in blobs}) != 1 or not blobs[0]:
+        return None
+    return np.frombuffer(b"".join(blobs), dtype=_FLOAT32).reshape(len(blobs), -1)
+
+
+def _blob(vector: np.ndarray) -> str:
+    return base64.b64encode(vector_bytes(vector)).decode("ascii")
+
+
+def encode_chunk(chunk: Chunk) -> Dict[str, Any]:
+    return {
+        "id": str(chunk.id),
+        "text": chunk.text,
+        "embedding": _blob(chunk.embedding),
+        "metadata": chunk.metadata,
+    }
+
+
+def decode_chunk(record: Dict[str, Any]) -> Chunk:
+    return Chunk.from_dict({
+        **record, "embedding": vector_from_bytes(base64.b64decode(record["embedding"]))
+    })
+
+
+def encode_header(lib: Library) -> Dict[str, Any]:
+    """The fields of `lib` other than its documents, as a current-format record."""
+    return {
+        "format": FORMAT_VERSION,
+        "id": str(lib.id),
+        "name": lib.name,
+        "metadata": lib.metadata,
+        "version": lib.version,
+        "embedder": lib.embedder,
+        "shards": lib.shards,
+        "index_config": lib.index_config,
+    }
+
+
+def encode_library(lib: Library) -> Dict[str, Any]:
+    """`lib` as a current-format record."""
+    return {
+        **encode_header(lib),
+        "documents": [
+            {
+                "id": str(d.id),
+                "title": d.title,
+                "chunks": [encode_chunk(c) for c in d.chunks],
+                "metadata": d.metadata,
+            }
+            for d in lib.documents
+        ],
+    }
+
+
+def decode_library(record: Dict[str, Any]) -> Library:
+    """A library from a record of any known format."""
+    fmt = record.get("format", 1)
+    if fmt == 1:
+        return Library.from_dict(record)
+    if fmt != FORMAT_VERSION:
+        raise ValueError(f"Unsupported library format {fmt}")
+    chunks = [c for d in record["documents"] for c in d["chunks"]]
+    blobs = [base64.b64decode(c["embedding"]) for c in chunks]
+    return assemble(record, chunks, blobs)
+
+
+def assemble(
+    record: Dict[str, Any],
+    chunks: List[Dict[str, Any]],
+    blobs: List[bytes]
+) -> Library:
+    """The library of `record`, whose `chunks` have their embeddings in `blobs`."""
+    matrix = vectors_from_bytes(blobs)
+    if matrix is not None:
+        return Library.from_dict(record, matrix)
+    for chunk, blob in zip(chunks, blobs):  # embeddings differ in length
+        chunk["embedding"] = vector_from_bytes(blob)
+    return Library.from_dict(record)
+
+
+def encode_file(libraries: List[Library], seq: int = 0) -> bytes:
+    """`seq` is the last journal record the file includes."""
+    return dumps({
+        "format": FORMAT_VERSION,
+        "seq": seq,
+        "libraries": [encode_library(lib) for lib in libraries],
+    })
+
+
+def decode_file(data: bytes) -> Tuple[int, int, List[Library]]:
+    """The format, journal seq and libraries of a file in any known format."""
+    raw = loads(data)
+    if isinstance(raw, list):
+        return 1, 0, [decode_library(record) for record in raw]
+    fmt = raw.get("format")
+    if fmt != FORMAT_VERSION:
+        raise ValueError(f"Unsupported file format {fmt}")
+    return fmt, raw.get("seq", 0), [decode_library(record) for record in raw["libraries"]]
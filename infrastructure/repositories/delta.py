@@ -0,0 +1,138 @@
+"""
+Repository writes as records, for write-ahead journals and replication logs.
+
+A record's "op" names the repository method that makes the write: "put"
+(`update`), "delete", and the fine-grained `update_header`,
+`upsert_document`, `add_chunks`, `update_chunk` and `delete_chunks`, whose
+records carry the library header they leave behind and only the
+documents, chunks or ids they change.
+"""
+from typing import Any, Dict, Sequence, Tuple
+from uuid import UUID
+
+from domain.models import Chunk, Document, Library
+from . import codec
+from .base import BaseLibraryRepository
+
+
+def put(lib: Library) -> Dict[str, Any]:
+    return {"op": "put", "id": str(lib.id), "library": codec.encode_library(lib)}
+
+
+def delete(lib_id: str) -> Dict[str, Any]:
+    return {"op": "delete", "id": lib_id}
+
+
+def _record(op: str, lib: Library, **fields: Any) -> Dict[str, Any]:
+    return {"op": op, "id": str(lib.id), "header": codec.encode_header(lib), **fields}
+
+
+def header(lib: Library) -> Dict[str, Any]:
+    return _record("update_header", lib)
+
+
+def document(lib: Library, doc: Document) -> Dict[str, Any]:
+    return _record("upsert_document", lib, document={
+        "id": str(doc.id), "title": doc.title, "metadata": doc.metadata,
+    })
+
+
+def chunks_added(lib: Library, chunks: Sequence[Tuple[UUID, Chunk]]) -> Dict[str, Any]:
+    return _record("add_chunks", lib, chunks=[
+        [str(doc_id), codec.encode_chunk(c)] for doc_id, c in chunks
+    ])
+
+
+def chunk_updated(lib: Library, chunk: Chunk) -> Dict[str, Any]:
+    return _record("update_chunk", lib, chunk=codec.encode_chunk(chunk))
+
+
+def chunks_deleted(lib: Library, chunk_ids: Sequence[UUID]) -> Dict[str, Any]:
+    return _record("delete_chunks", lib, ids=[str(cid) for cid in chunk_ids])
+
+
+def _change(lib: Library, record: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Makes the change of a fine-grained `record` to `lib` and returns the
+    arguments of the repository method that persists it. A lazy library
+    not loaded yet only takes the header: its documents are read from
+    storage, after the write.
+
+    A record may be applied to a library that already holds its change: a
+    snapshot taken after the change was made in memory but before its
+    record was numbered still sees it replayed. Every change is therefore
+    idempotent; chunks already held are not added again, and a header
+    older than the library's is not taken.
+    """
+    head = record["header"]
+    if head["version"] >= lib.version:
+        lib.name, lib.metadata, lib.version = head["name"], head["metadata"], head["version"]
+        lib.embedder, lib.shards = head.get("embedder"), head.get("shards", 1)
+        lib.index_config = head.get("index_config")
+    op = record["op"]
+    if op == "update_header":
+        return ()
+    if op == "upsert_document":
+        data = record["document"]
+        doc = Document(UUID(data["id"]), data["title"], [], data["metadata"])
+        if lib.loaded:
+            held = next((d for d in lib.documents if d.id == doc.id), None)
+            if held is None:
+                lib.documents.append(doc)
+            else:
+                held.title, held.metadata = doc.title, doc.metadata
+        return (doc,)
+    if op == "add_chunks":
+        chunks = [(UUID(doc_id), codec.decode_chunk(c)) for doc_id, c in record["chunks"]]
+        if lib.loaded:
+            docs = {d.id: d for d in lib.documents}
+            held = {c.id for d in lib.documents for c in d.chunks}
+            chunks = [(doc_id, c) for doc_id, c in chunks if c.id not in held]
+            for doc_id, chunk in chunks:
+                docs[doc_id].chunks.append(chunk)
+        return (chunks,)
+    if op == "update_chunk":
+        chunk = codec.decode_chunk(record["chunk"])
+        if lib.loaded:
+            for d in lib.documents:
+                for i, c in enumerate(d.chunks):
+                    if c.id == chunk.id:
+                        d.chunks[i] = chunk
+        return (chunk,)
+    if op == "delete_chunks":
+        ids = [UUID(cid) for cid in record["ids"]]
+        if lib.loaded:
+            gone = set(ids)
+            for d in lib.documents:
+                d.chunks = [c for c in d.chunks if c.id not in gone]
+        return (ids,)
+    raise ValueError(f"Unsupported write '{op}'")
+
+
+def apply(libraries: Dict[str, Library], record: Dict[str, Any]) -> None:
+    """Makes the write of `record` to in-memory `libraries` (by id)."""
+    op = record["op"]
+    if op == "put":
+        libraries[record["id"]] = codec.decode_library(record["library"])
+    elif op == "delete":
+        libraries.pop(record["id"], None)
+    else:
+        _change(libraries[record["id"]], record)
+
+
+def replay(repo: BaseLibraryRepository, record: Dict[str, Any]) -> None:
+    """Makes the write of `record` to `repo` with the method that wrote it."""
+    op = record["op"]
+    if op == "put":
+        repo.update(codec.decode_library(record["library"]))
+    elif op == "delete":
+        repo.delete(record["id"])
+    else:
+        lib = repo.get_for_update(record["id"])
+        if lib is None:
+            raise ValueError(f"Library {record['id']} not found")
+        args = _change(lib, record)
+        if op == "add_chunks" and not lib.loaded:  # held chunks are only known to storage
+            args = ([(d, c) for d, c in args[0] if repo.document_of(record["id"], c.id) is None],)
+        lib.pack(force=False)
+        getattr(repo, op)(lib, *args)
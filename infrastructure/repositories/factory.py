@@ -1,4 +1,4 @@
-from typing import Type, Dict
+from typing import Type, Dict, List
 
 from .base import BaseLibraryRepository
 from .json_repo import JSONLibraryRepository
@@ -14,14 +14,25 @@ class RepositoryFactory:
         'sql': SQLiteLibraryRepository,
         'db': SQLiteLibraryRepository,
     }
+    @classmethod
+    def backends(cls) -> List[str]:
+        """One name per backend (aliases left out)."""
+        seen: Dict[Type[BaseLibraryRepository], str] = {}
+        for name, repo_class in cls._repo_types.items():
+            seen.setdefault(repo_class, name)
+        return list(seen.values())
+
     @classmethod
     def create(
         cls,
         backend_type: str = "json",
         json_path: str = "data.json",
         pickle_path: str = "data.pkl",
-        sqlite_path: str = "data.db"
+        sqlite_path: str = "data.db",
+        durability: str = "group",
+        commit_wait_seconds: float = 0.002
     ) -> BaseLibraryRepository:
+        """`durability` and `commit_wait_seconds` configure the backend's `GroupCommitter`."""
         bt = backend_type.lower()
         if bt not in cls._repo_types:
             raise ValueError(
@@ -30,9 +41,10 @@ class RepositoryFactory:
             )
         
         repo_class = cls._repo_types[bt]
+        commit = dict(durability=durability, max_wait_seconds=commit_wait_seconds)
         if bt in ('sqlite', 'sql', 'db'):
-            return repo_class(sqlite_path)
+            return repo_class(sqlite_path, **commit)
         elif bt == 'pickle':
-            return repo_class(pickle_path)
+            return repo_class(pickle_path, **commit)
         else:  # json
-            return repo_class(json_path) 
\ No newline at end of file
+            return repo_class(json_path, **commit) 
\ No newline at end of file
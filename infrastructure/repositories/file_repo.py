@@ -0,0 +1,177 @@
+import os
+import time
+from abc import abstractmethod
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from domain.models import Chunk, Document, Library
+from . import delta
+from .base import BaseLibraryRepository, PERSIST_BYTES, PERSIST_SECONDS
+from .group_commit import GroupCommitter, Ticket
+
+
+class FileLibraryRepository(BaseLibraryRepository):
+    """
+    All libraries in memory, stored as a snapshot file and a journal of the
+    writes made since (`<file>.log`). A write appends its `delta` record to
+    the journal, so it costs the size of the change; once the journal
+    outgrows the snapshot (and `compact_bytes`), the snapshot is rewritten
+    and the journal emptied. Records are numbered and the snapshot holds
+    the number of the last one it includes, so records left behind by an
+    interrupted compaction, or torn by a crash, are skipped on load.
+
+    Appends go through a `GroupCommitter` (`durability` is its mode): the
+    in-memory state changes at once, and the records of concurrent writes
+    are appended and fsynced together.
+    """
+    backend = "file"
+
+    def __init__(
+        self,
+        file_path: str,
+        compact_bytes: int = 1 << 20,
+        durability: str = "group",
+        max_wait_seconds: float = 0.002,
+        max_batch_size: int = 256
+    ) -> None:
+        self._committer = GroupCommitter(
+            self._append, durability, max_wait_seconds, max_batch_size, backend=self.backend
+        )
+        self.file_path = file_path
+        self.journal_path = f"{file_path}.log"
+        self.compact_bytes = compact_bytes
+        self._lock = Lock()
+        self._data: Dict[str, Library] = {}
+        self._seq = 0
+        self._snapshot_bytes = 0
+        self._journal_bytes = 0
+        current = True
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "rb") as f:
+                data = f.read()
+            self._snapshot_bytes = len(data)
+            self._seq, libraries, current = self._load_snapshot(data)
+            self._data = {str(lib.id): lib for lib in libraries}
+        self._replay()
+        if not current or self._journal_bytes > self._compact_threshold():
+            self.compact()
+
+    @abstractmethod
+    def _dump_snapshot(self, seq: int, libraries: List[Library]) -> bytes: ...
+    @abstractmethod
+    def _load_snapshot(self, data: bytes) -> Tuple[int, List[Library], bool]:
+        """The seq and libraries of a snapshot, and whether it is in the current format."""
+    @abstractmethod
+    def _dump_record(self, record: Dict[str, Any]) -> bytes: ...
+    @abstractmethod
+    def _load_records(self, data: bytes) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Each whole record of a journal with the offset it ends at."""
+
+    def _replay(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        end = 0
+        for record, end in self._load_records(data):
+            if record["seq"] > self._seq:
+                delta.apply(self._data, record)
+                self._seq = record["seq"]
+        if end < len(data):  # torn by a crash mid-append
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(end)
+        self._journal_bytes = end
+        for lib in self._data.values():
+            lib.pack(force=False)
+
+    def _compact_threshold(self) -> int:
+        return max(self._snapshot_bytes, self.compact_bytes)
+
+    def compact(self) -> None:
+        """Rewrites the snapshot with every library and empties the journal."""
+        with self._committer.commit_lock, self._lock:
+            self._compact()
+
+    def flush(self) -> None:
+        self._committer.flush()
+
+    def _compact(self) -> None:
+        start = time.perf_counter()
+        tmp = f"{self.file_path}.tmp"
+        data = self._dump_snapshot(self._seq, list(self._data.values()))
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.file_path)
+        open(self.journal_path, "wb").close()
+        self._snapshot_bytes, self._journal_bytes = len(data), 0
+        PERSIST_SECONDS.observe(time.perf_counter() - start, backend=self.backend)
+        PERSIST_BYTES.inc(len(data), backend=self.backend)
+
+    def _append(self, records: List[bytes]) -> None:
+        """
+        Commits a batch of journal records with one write and one fsync, and
+        compacts past the threshold. Writers change their library before
+        their record is numbered, so the snapshot may hold a change whose
+        record follows it; replay skips what it already holds.
+        """
+        start = time.perf_counter()
+        data = b"".join(records)
+        with open(self.journal_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        PERSIST_SECONDS.observe(time.perf_counter() - start, backend=self.backend)
+        PERSIST_BYTES.inc(len(data), backend=self.backend)
+        with self._lock:
+            self._journal_bytes += len(data)
+            if self._journal_bytes > self._compact_threshold():
+                self._compact()
+
+    def _log(self, record: Dict[str, Any]) -> Ticket:
+        """Numbers and queues `record`; the caller holds the lock, so seqs are appended in order."""
+        self._seq += 1
+        return self._committer.submit(self._dump_record({**record, "seq": self._seq}))
+
+    def _write(self, lib: Library, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._data[str(lib.id)] = lib
+            ticket = self._log(record)
+        self._committer.ack(ticket)
+
+    def add(self, lib: Library) -> Library:
+        self._write(lib, delta.put(lib))
+        return lib
+
+    def get(self, lib_id: str) -> Optional[Library]:
+        return self._data.get(lib_id)
+
+    def update(self, lib: Library) -> Library:
+        self._write(lib, delta.put(lib))
+        return lib
+
+    def delete(self, lib_id: str) -> None:
+        with self._lock:
+            self._data.pop(lib_id, None)
+            ticket = self._log(delta.delete(lib_id))
+        self._committer.ack(ticket)
+
+    def list_all(self) -> List[Library]:
+        return list(self._data.values())
+
+    def update_header(self, lib: Library) -> None:
+        self._write(lib, delta.header(lib))
+
+    def upsert_document(self, lib: Library, document: Document) -> None:
+        self._write(lib, delta.document(lib, document))
+
+    def add_chunks(self, lib: Library, chunks: Sequence[Tuple[UUID, Chunk]]) -> None:
+        self._write(lib, delta.chunks_added(lib, chunks))
+
+    def update_chunk(self, lib: Library, chunk: Chunk) -> None:
+        self._write(lib, delta.chunk_updated(lib, chunk))
+
+    def delete_chunks(self, lib: Library, chunk_ids: Sequence[UUID]) -> None:
+        self._write(lib, delta.chunks_deleted(lib, chunk_ids))
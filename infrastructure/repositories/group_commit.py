@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Iterator, List, Optional
+
+from utils import metrics
+
+DURABILITY_MODES = ("sync", "group", "async")
+
+COMMIT_WRITES = metrics.histogram(
+    "vectordb_repository_commit_writes",
+    "Writes made durable per storage commit.",
+    ["backend"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+
+# tickets whose acknowledgement the current `deferred` block waits for
+_deferred: ContextVar[Optional[List["Ticket"]]] = ContextVar("deferred_commits", default=None)
+
+
+class Ticket:
+    """A submitted write; `done` is set once it is durable (or failed, with `error`)."""
+    __slots__ = ("item", "committer", "done", "error")
+
+    def __init__(self, item: Any, committer: "GroupCommitter") -> None:
+        self.item = item
+        self.committer = committer
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+@contextmanager
+def deferred() -> Iterator[None]:
+    """
+    Writes submitted in this block are acknowledged when it exits, not
+    when they are submitted, so a caller can release its locks before
+    waiting for the commit and let concurrent writers join the batch.
+    Nested blocks join the outermost one.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    tickets: List[Ticket] = []
+    token = _deferred.set(tickets)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        for ticket in tickets:
+            ticket.committer.wait(ticket)
+
+
+class GroupCommitter:
+    """
+    Commits the writes of concurrent callers in batches, in the order they
+    were submitted. `commit(items)` makes a batch durable in one storage
+    operation (one transaction, one appended and fsynced write).
+
+    - `sync`: every write is committed on its own before its caller returns.
+    - `group`: a worker thread collects writes for up to `max_wait_seconds`
+      after the first one (or until `max_batch_size`) and commits them
+      together; callers return once their batch is durable. It waits no
+      longer than the last commit took: when commits are cheap, waiting
+      would cost more than it saves.
+    - `async`: callers return as soon as the write is queued; the worker
+      commits in groups behind them, so a crash loses the queued writes.
+      A failed commit is kept in `error`.
+
+    A batch that fails is retried a write at a time, so a bad write fails
+    only its own caller.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[List[Any]], None],
+        mode: str = "group",
+        max_wait_seconds: float = 0.002,
+        max_batch_size: int = 256,
+        backend: str = ""
+    ) -> None:
+        if mode not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unsupported durability '{mode}'. "
+                f"Supported modes are: {list(DURABILITY_MODES)}"
+            )
+        self.commit = commit
+        self.mode = mode
+        self.max_wait_seconds = max_wait_seconds
+        self.max_batch_size = max_batch_size
+        self.backend = backend
+        # held while committing; take it to keep commits out (e.g. to compact)
+        self.commit_lock = threading.RLock()
+        self.error: Optional[BaseException] = None
+        self.commits = 0
+        self.writes = 0
+        self._cond = threading.Condition()
+        self._queue: Deque[Ticket] = deque()
+        self._last: Optional[Ticket] = None
+        self._commit_seconds = max_wait_seconds
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, item: Any) -> Ticket:
+        """
+        Queues `item` without waiting. Callers that need writes committed in
+        a given order submit them in that order (under their own lock).
+        """
+        ticket = Ticket(item, self)
+        with self._cond:
+            self._queue.append(ticket)
+            self._last = ticket
+            if self.mode != "sync":
+                self._ensure_worker()
+                self._cond.notify_all()
+        return ticket
+
+    def wait(self, ticket: Ticket) -> None:
+        """Returns once `ticket` is durable (at once in `async` mode); raises its error."""
+        if self.mode != "async":
+            self.settle(ticket)
+            if ticket.error is not None:
+                raise ticket.error
+
+    def settle(self, ticket: Ticket) -> None:
+        """Blocks until `ticket` is committed or has failed, whatever the mode."""
+        if self.mode == "sync":
+            self._drain(ticket)
+        else:
+            ticket.done.wait()
+
+    def ack(self, ticket: Ticket) -> None:
+        """Waits for `ticket`, or leaves that to the enclosing `deferred` block."""
+        tickets = _deferred.get()
+        if tickets is not None:
+            tickets.append(ticket)
+        else:
+            self.wait(ticket)
+
+    def flush(self) -> None:
+        """Blocks until every write submitted so far is committed (or failed)."""
+        with self._cond:
+            last = self._last
+        if last is not None:
+            self.settle(last)
+
+    def _drain(self, ticket: Ticket) -> None:
+        """Commits queued writes one at a time, in order, up to `ticket`."""
+        with self.commit_lock:
+            while not ticket.done.is_set():
+                with self._cond:
+                    head = self._queue.popleft()
+                self._commit([head])
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self) -> List[Ticket]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + min(self.max_wait_seconds, self._commit_seconds)
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            start = time.perf_counter()
+            with self.commit_lock:
+                self._commit(batch)
+            self._commit_seconds = time.perf_counter() - start
+
+    def _commit(self, batch: List[Ticket]) -> None:
+        try:
+            self.commit([t.item for t in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                for ticket in batch:
+                    self._commit([ticket])
+                return
+            batch[0].error = e
+            if self.mode == "async":  # nobody is waiting for it
+                self.error = e
+        else:
+            self.commits += 1
+            self.writes += len(batch)
+            COMMIT_WRITES.observe(len(batch), backend=self.backend)
+        for ticket in batch:
+            ticket.done.set()
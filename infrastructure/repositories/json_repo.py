@@ -1,54 +1,35 @@
-import os
-import json
-from threading import Lock
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Tuple
 
 from domain.models import Library
-from .base import BaseLibraryRepository
-
-
-class JSONLibraryRepository(BaseLibraryRepository):
-    def __init__(self, file_path: str = "data.json") -> None:
-        self.file_path = file_path
-        self._lock = Lock()
-        self._data: Dict[str, Library] = {}
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "r") as f:
-                raw = json.load(f)
-            for lib_dict in raw:
-                lib = Library(**lib_dict)
-                self._data[str(lib.id)] = lib
-
-    def _persist(self) -> None:
-        tmp = f"{self.file_path}.tmp"
-        with open(tmp, "w") as f:
-            json.dump(
-                [lib.model_dump() for lib in self._data.values()],
-                f,
-                indent=2,
-                default=str,
-            )
-        os.replace(tmp, self.file_path)
-
-    def add(self, lib: Library) -> Library:
-        with self._lock:
-            self._data[str(lib.id)] = lib
-            self._persist()
-        return lib
-
-    def get(self, lib_id: str) -> Optional[Library]:
-        return self._data.get(lib_id)
-
-    def update(self, lib: Library) -> Library:
-        with self._lock:
-            self._data[str(lib.id)] = lib
-            self._persist()
-        return lib
-
-    def delete(self, lib_id: str) -> None:
-        with self._lock:
-            self._data.pop(lib_id, None)
-            self._persist()
-
-    def list_all(self) -> List[Library]:
-        return list(self._data.values()) 
\ No newline at end of file
+from . import codec
+from .file_repo import FileLibraryRepository
+
+
+class JSONLibraryRepository(FileLibraryRepository):
+    """
+    A JSON snapshot and a journal of one JSON record per line. Files in an
+    older format are read and rewritten in the current one.
+    """
+    backend = "json"
+
+    def __init__(self, file_path: str = "data.json", **options: Any) -> None:
+        super().__init__(file_path, **options)
+
+    def _dump_snapshot(self, seq: int, libraries: List[Library]) -> bytes:
+        return codec.encode_file(libraries, seq)
+
+    def _load_snapshot(self, data: bytes) -> Tuple[int, List[Library], bool]:
+        fmt, seq, libraries = codec.decode_file(data)
+        return seq, libraries, fmt == codec.FORMAT_VERSION
+
+    def _dump_record(self, record: Dict[str, Any]) -> bytes:
+        return codec.dumps(record) + b"\n"
+
+    def _load_records(self, data: bytes) -> Iterator[Tuple[Dict[str, Any], int]]:
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline < 0:  # anything after the last newline is torn
+                return
+            yield codec.loads(data[start:newline]), newline + 1
+            start = newline + 1
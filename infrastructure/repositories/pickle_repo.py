@@ -1,46 +1,38 @@
-import os
+import io
 import pickle
-from threading import Lock
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Tuple
 
 from domain.models import Library
-from .base import BaseLibraryRepository
-
-
-class PickleLibraryRepository(BaseLibraryRepository):
-    def __init__(self, file_path: str = "data.pkl") -> None:
-        self.file_path = file_path
-        self._lock = Lock()
-        self._data: Dict[str, Library] = {}
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "rb") as f:
-                self._data = pickle.load(f)
-
-    def _persist(self) -> None:
-        tmp = f"{self.file_path}.tmp"
-        with open(tmp, "wb") as f:
-            pickle.dump(self._data, f)
-        os.replace(tmp, self.file_path)
-
-    def add(self, lib: Library) -> Library:
-        with self._lock:
-            self._data[str(lib.id)] = lib
-            self._persist()
-        return lib
-
-    def get(self, lib_id: str) -> Optional[Library]:
-        return self._data.get(lib_id)
-
-    def update(self, lib: Library) -> Library:
-        with self._lock:
-            self._data[str(lib.id)] = lib
-            self._persist()
-        return lib
-
-    def delete(self, lib_id: str) -> None:
-        with self._lock:
-            self._data.pop(lib_id, None)
-            self._persist()
-
-    def list_all(self) -> List[Library]:
-        return list(self._data.values()) 
\ No newline at end of file
+from .file_repo import FileLibraryRepository
+
+
+class PickleLibraryRepository(FileLibraryRepository):
+    """
+    A pickled snapshot and a journal of pickled records. Snapshots written
+    before the journal (a bare dict of libraries) are read and rewritten.
+    """
+    backend = "pickle"
+
+    def __init__(self, file_path: str = "data.pkl", **options: Any) -> None:
+        super().__init__(file_path, **options)
+
+    def _dump_snapshot(self, seq: int, libraries: List[Library]) -> bytes:
+        return pickle.dumps({"seq": seq, "libraries": libraries})
+
+    def _load_snapshot(self, data: bytes) -> Tuple[int, List[Library], bool]:
+        raw = pickle.loads(data)
+        if isinstance(raw.get("libraries"), list):
+            return raw["seq"], raw["libraries"], True
+        return 0, list(raw.values()), False
+
+    def _dump_record(self, record: Dict[str, Any]) -> bytes:
+        return pickle.dumps(record)
+
+    def _load_records(self, data: bytes) -> Iterator[Tuple[Dict[str, Any], int]]:
+        f = io.BytesIO(data)
+        while f.tell() < len(data):
+            try:
+                record = pickle.load(f)
+            except Exception:  # torn by a crash mid-append
+                return
+            yield record, f.tell()
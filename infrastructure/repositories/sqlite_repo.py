@@ -1,59 +1,356 @@
-import json
 import sqlite3
+import time
 from threading import Lock
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
 
-from domain.models import Library
-from .base import BaseLibraryRepository
+from domain.models import Chunk, Document, Library
+from . import codec
+from .base import BaseLibraryRepository, PERSIST_BYTES, PERSIST_SECONDS
+from .group_commit import GroupCommitter, Ticket
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS libraries (
+        id TEXT PRIMARY KEY,
+        header TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS documents (
+        lib_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        PRIMARY KEY (lib_id, id)
+    );
+    CREATE TABLE IF NOT EXISTS chunks (
+        lib_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        doc_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        metadata TEXT NOT NULL,
+        embedding BLOB NOT NULL,
+        PRIMARY KEY (lib_id, id)
+    );
+    CREATE INDEX IF NOT EXISTS chunks_by_document ON chunks (lib_id, doc_id, position);
+"""
+
+# (sql, parameter rows): writes are built by the caller and executed by the committer
+_Statement = Tuple[str, List[Tuple[Any, ...]]]
+
+# positions are counted when the statement runs, after earlier queued writes
+_UPSERT_DOCUMENT = """
+    INSERT INTO documents (lib_id, id, position, title, metadata)
+    VALUES (?1, ?2, (SELECT COALESCE(MAX(position) + 1, 0) FROM documents WHERE lib_id = ?1), ?3, ?4)
+    ON CONFLICT (lib_id, id) DO UPDATE SET title = excluded.title, metadata = excluded.metadata
+"""
+_APPEND_CHUNK = """
+    INSERT INTO chunks (lib_id, id, doc_id, position, text, metadata, embedding)
+    VALUES (?1, ?2, ?3, (SELECT COALESCE(MAX(position) + 1, 0) FROM chunks
+                         WHERE lib_id = ?1 AND doc_id = ?3), ?4, ?5, ?6)
+"""
+
+# the chunks of one document
+_DOCUMENT_CHUNKS = """
+    SELECT doc_id, id, text, metadata, embedding FROM chunks
+    WHERE lib_id = ? AND doc_id = ? ORDER BY position
+"""
+
+# chunks in document order
+_CHUNKS = """
+    SELECT c.doc_id, c.id, c.text, c.metadata, c.embedding
+    FROM chunks c JOIN documents d ON d.lib_id = c.lib_id AND d.id = c.doc_id
+    WHERE c.lib_id = ?
+    ORDER BY d.position, c.position
+"""
 
 
 class SQLiteLibraryRepository(BaseLibraryRepository):
-    def __init__(self, db_path: str = "data.db") -> None:
+    """
+    A row per library header, document and chunk (embeddings as float32
+    blobs), so headers, document lists and chunk pages are read without
+    loading the rest of the library.
+
+    Writes are committed by a `GroupCommitter` (`durability` is its mode),
+    concurrent ones in one transaction. Reads wait for the writes queued
+    before them, so they never see a library older than a write made.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data.db",
+        durability: str = "group",
+        max_wait_seconds: float = 0.002,
+        max_batch_size: int = 256
+    ) -> None:
+        self._committer = GroupCommitter(
+            self._execute, durability, max_wait_seconds, max_batch_size, backend="sqlite"
+        )
         self.db_path = db_path
         self._lock = Lock()
+        self._queue_lock = Lock()
+        self._pending: Dict[str, Ticket] = {}  # the last queued write of each library
         self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._conn.execute("PRAGMA journal_mode=WAL;")
-        self._conn.execute("""
-            CREATE TABLE IF NOT EXISTS libraries (
-                id TEXT PRIMARY KEY,
-                data TEXT NOT NULL
-            )
-        """)
-        self._conn.commit()
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """
+        Creates the tables, moving in libraries stored as one JSON document
+        per row (the first layout). The old table is dropped in the same
+        transaction that copies its rows, so an interrupted run starts over.
+        """
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(libraries)")}
+        if "data" in columns:
+            self._conn.execute("ALTER TABLE libraries RENAME TO libraries_v1")
+        self._conn.executescript(_SCHEMA)
+        old = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'libraries_v1'"
+        ).fetchone()
+        if old is None:
+            return
+        with self._conn:
+            for (data,) in self._conn.execute("SELECT data FROM libraries_v1").fetchall():
+                for sql, rows in _library(codec.decode_library(codec.loads(data))):
+                    self._conn.executemany(sql, rows)
+            self._conn.execute("DROP TABLE libraries_v1")
 
-    def _serialize(self, lib: Library) -> str:
-        return json.dumps(lib.model_dump(), default=str)
+    def _execute(self, batch: List[List[_Statement]]) -> None:
+        """Commits the statements of a batch of writes in one transaction."""
+        start = time.perf_counter()
+        with self._lock, self._conn:
+            for statements in batch:
+                for sql, rows in statements:
+                    self._conn.executemany(sql, rows)
+        PERSIST_SECONDS.observe(time.perf_counter() - start, backend="sqlite")
+        PERSIST_BYTES.inc(sum(map(_size, batch)), backend="sqlite")
 
-    def _deserialize(self, txt: str) -> Library:
-        return Library(**json.loads(txt))
+    def _commit(self, lib_id: str, statements: List[_Statement]) -> None:
+        with self._queue_lock:
+            ticket = self._committer.submit(statements)
+            self._pending[lib_id] = ticket
+        self._committer.ack(ticket)
+
+    def _settled(self, lib_id: Optional[str] = None) -> Lock:
+        """
+        The connection lock, once the queued writes of `lib_id` (of every
+        library by default) are committed: writes are committed in order,
+        so it is enough to wait for its last one.
+        """
+        if lib_id is None:
+            self._committer.flush()
+            return self._lock
+        ticket = self._pending.get(lib_id)
+        if ticket is not None:
+            self._committer.settle(ticket)
+            with self._queue_lock:
+                if self._pending.get(lib_id) is ticket:
+                    del self._pending[lib_id]
+        return self._lock
+
+    def flush(self) -> None:
+        self._committer.flush()
+
+    def _header(self, lib_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT header FROM libraries WHERE id = ?", (lib_id,)
+        ).fetchone()
+        return codec.loads(row[0]) if row else None
+
+    def _documents(self, lib_id: str) -> List[Tuple[str, str, str]]:
+        return self._conn.execute(
+            "SELECT id, title, metadata FROM documents WHERE lib_id = ? ORDER BY position",
+            (lib_id,)
+        ).fetchall()
 
     def add(self, lib: Library) -> Library:
-        with self._lock:
-            self._conn.execute(
-                "INSERT OR REPLACE INTO libraries (id, data) VALUES (?, ?)",
-                (str(lib.id), self._serialize(lib))
-            )
-            self._conn.commit()
+        self._commit(str(lib.id), _library(lib))
         return lib
 
     def get(self, lib_id: str) -> Optional[Library]:
-        cur = self._conn.execute(
-            "SELECT data FROM libraries WHERE id = ?", (lib_id,)
-        )
-        row = cur.fetchone()
-        return self._deserialize(row[0]) if row else None
+        with self._settled(lib_id):
+            header = self._header(lib_id)
+            if header is None:
+                return None
+            documents = self._documents(lib_id)
+            rows = self._conn.execute(_CHUNKS, (lib_id,)).fetchall()
+        by_doc: Dict[str, List[Dict[str, Any]]] = {doc_id: [] for doc_id, _, _ in documents}
+        chunks = []
+        for doc_id, chunk_id, text, metadata, _ in rows:
+            chunk = {"id": chunk_id, "text": text, "metadata": codec.loads(metadata)}
+            by_doc[doc_id].append(chunk)
+            chunks.append(chunk)
+        record = {**header, "documents": [
+            {"id": doc_id, "title": title, "metadata": codec.loads(metadata),
+             "chunks": by_doc[doc_id]}
+            for doc_id, title, metadata in documents
+        ]}
+        return codec.assemble(record, chunks, [row[4] for row in rows])
+
+    def get_header(self, lib_id: str) -> Optional[Library]:
+        with self._settled(lib_id):
+            header = self._header(lib_id)
+        if header is None:
+            return None
+        return Library.lazy(header, lambda: self.get(lib_id))
+
+    def get_for_update(self, lib_id: str) -> Optional[Library]:
+        # callers hold the library's write lock, so the lazily loaded
+        # documents match the header
+        return self.get_header(lib_id)
+
+    def list_documents(self, lib_id: str) -> Optional[List[Document]]:
+        with self._settled(lib_id):
+            if self._header(lib_id) is None:
+                return None
+            documents = self._documents(lib_id)
+        return [
+            Document(UUID(doc_id), title, [], codec.loads(metadata))
+            for doc_id, title, metadata in documents
+        ]
+
+    def get_chunks(
+        self,
+        lib_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Optional[List[Chunk]]:
+        with self._settled(lib_id):
+            if self._header(lib_id) is None:
+                return None
+            rows = self._conn.execute(
+                _CHUNKS + " LIMIT ? OFFSET ?",
+                (lib_id, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return list(_chunks(rows))
+
+    def get_document_chunks(
+        self,
+        lib_id: str,
+        doc_id: UUID,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> Optional[List[Chunk]]:
+        with self._settled(lib_id):
+            if self._header(lib_id) is None:
+                return None
+            rows = self._conn.execute(
+                _DOCUMENT_CHUNKS + " LIMIT ? OFFSET ?",
+                (lib_id, str(doc_id), -1 if limit is None else limit, offset)
+            ).fetchall()
+        return list(_chunks(rows))
+
+    def get_document(self, lib_id: str, doc_id: UUID) -> Optional[Document]:
+        with self._settled(lib_id):
+            row = self._conn.execute(
+                "SELECT title, metadata FROM documents WHERE lib_id = ? AND id = ?",
+                (lib_id, str(doc_id))
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(_DOCUMENT_CHUNKS, (lib_id, str(doc_id))).fetchall()
+        return Document(doc_id, row[0], list(_chunks(rows)), codec.loads(row[1]))
+
+    def document_of(self, lib_id: str, chunk_id: UUID) -> Optional[UUID]:
+        with self._settled(lib_id):
+            row = self._conn.execute(
+                "SELECT doc_id FROM chunks WHERE lib_id = ? AND id = ?",
+                (lib_id, str(chunk_id))
+            ).fetchone()
+        return UUID(row[0]) if row else None
 
     def update(self, lib: Library) -> Library:
         self.add(lib)
         return lib
 
     def delete(self, lib_id: str) -> None:
-        with self._lock:
-            self._conn.execute(
-                "DELETE FROM libraries WHERE id = ?", (lib_id,)
-            )
-            self._conn.commit()
+        self._commit(lib_id, [
+            (f"DELETE FROM {table} WHERE {key} = ?", [(lib_id,)])
+            for table, key in (("libraries", "id"), ("documents", "lib_id"), ("chunks", "lib_id"))
+        ])
 
     def list_all(self) -> List[Library]:
-        cur = self._conn.execute("SELECT data FROM libraries")
-        return [self._deserialize(row[0]) for row in cur.fetchall()] 
\ No newline at end of file
+        with self._settled():
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM libraries")]
+        return [lib for lib in map(self.get, ids) if lib is not None]
+
+    # Fine-grained writes touch the header row and the rows they name only;
+    # new documents and chunks go after the last position in use.
+
+    def update_header(self, lib: Library) -> None:
+        self._commit(str(lib.id), [_header_row(lib)])
+
+    def upsert_document(self, lib: Library, document: Document) -> None:
+        lib_id = str(lib.id)
+        self._commit(lib_id, [_header_row(lib), (_UPSERT_DOCUMENT, [
+            (lib_id, str(document.id), document.title, codec.dumps(document.metadata).decode())
+        ])])
+
+    def add_chunks(self, lib: Library, chunks: Sequence[Tuple[UUID, Chunk]]) -> None:
+        lib_id = str(lib.id)
+        self._commit(lib_id, [_header_row(lib), (_APPEND_CHUNK, [
+            (lib_id, str(c.id), str(doc_id), c.text,
+             codec.dumps(c.metadata).decode(), codec.vector_bytes(c.embedding))
+            for doc_id, c in chunks
+        ])])
+
+    def update_chunk(self, lib: Library, chunk: Chunk) -> None:
+        self._commit(str(lib.id), [_header_row(lib), (
+            "UPDATE chunks SET text = ?, metadata = ?, embedding = ? "
+            "WHERE lib_id = ? AND id = ?",
+            [(chunk.text, codec.dumps(chunk.metadata).decode(),
+              codec.vector_bytes(chunk.embedding), str(lib.id), str(chunk.id))]
+        )])
+
+    def delete_chunks(self, lib: Library, chunk_ids: Sequence[UUID]) -> None:
+        self._commit(str(lib.id), [_header_row(lib), (
+            "DELETE FROM chunks WHERE lib_id = ? AND id = ?",
+            [(str(lib.id), str(cid)) for cid in chunk_ids]
+        )])
+
+
+def _header_row(lib: Library) -> _Statement:
+    return (
+        "INSERT OR REPLACE INTO libraries (id, header) VALUES (?, ?)",
+        [(str(lib.id), codec.dumps(codec.encode_header(lib)).decode())]
+    )
+
+
+def _library(lib: Library) -> List[_Statement]:
+    """Rewrites `lib` (only its header if it is lazy and unloaded)."""
+    if not lib.loaded:
+        return [_header_row(lib)]
+    lib_id = str(lib.id)
+    return [
+        _header_row(lib),
+        ("DELETE FROM documents WHERE lib_id = ?", [(lib_id,)]),
+        ("DELETE FROM chunks WHERE lib_id = ?", [(lib_id,)]),
+        ("INSERT INTO documents (lib_id, id, position, title, metadata) VALUES (?, ?, ?, ?, ?)", [
+            (lib_id, str(d.id), i, d.title, codec.dumps(d.metadata).decode())
+            for i, d in enumerate(lib.documents)
+        ]),
+        ("INSERT INTO chunks (lib_id, id, doc_id, position, text, metadata, embedding) "
+         "VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (lib_id, str(c.id), str(d.id), i, c.text,
+             codec.dumps(c.metadata).decode(), codec.vector_bytes(c.embedding))
+            for d in lib.documents for i, c in enumerate(d.chunks)
+        ]),
+    ]
+
+
+def _size(statements: List[_Statement]) -> int:
+    """Bytes of text and blob values written."""
+    return sum(
+        len(value) for _, rows in statements for row in rows for value in row
+        if isinstance(value, (str, bytes))
+    )
+
+
+def _chunks(rows: Iterable[Tuple[str, str, str, str, bytes]]) -> Iterable[Chunk]:
+    for _, chunk_id, text, metadata, embedding in rows:
+        yield Chunk.from_dict({
+            "id": chunk_id,
+            "text": text,
+            "embedding": codec.vector_from_bytes(embedding),
+            "metadata": codec.loads(metadata),
+        })
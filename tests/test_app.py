@@ -1,18 +1,36 @@
 import os
+import json
+import pickle
+import sqlite3
+import time
+import threading
+import asyncio
+import httpx
 import pytest
-from uuid import uuid4
+import uvicorn
+from typing import Any, Dict, List
+from uuid import UUID, uuid4
 from fastapi.testclient import TestClient
+from pydantic import BaseModel
 
-from app.main import app
-from domain.models import Library
+from app.main import app, index_builder, query_cache
+from app.batching import EmbeddingBatcher
+from app.indexing import IndexBuilder
+from app.services import LibraryService
+import domain.models as models
+from domain.models import Chunk, Document, Library, embedding_matrix
 from infrastructure.repositories import (
+    codec,
+    group_commit,
     JSONLibraryRepository,
     PickleLibraryRepository,
     SQLiteLibraryRepository,
     RepositoryFactory,
 )
-from infrastructure.leader_follower import LeaderFollowerRepository
-from client.sdk import VectorDBClient
+from infrastructure.repositories.base import PERSIST_BYTES
+from infrastructure.leader_follower import LeaderFollowerRepository, read_session
+import app.main as main_module
+from client.sdk import AsyncVectorDBClient, VectorDBClient
 
 client = TestClient(app)
 
@@ -36,6 +54,8 @@ def test_crud_and_search_algorithms(algo):
     get_resp = client.get(f"/libraries/{lib_id}")
     assert get_resp.status_code == 200
     assert get_resp.json()["id"] == lib_id
+    header = client.get(f"/libraries/{lib_id}", params={"documents": "false"}).json()
+    assert header["id"] == lib_id and "documents" not in header
 
     # Update
     upd = client.put(
@@ -141,7 +161,642 @@ def test_search_with_metadata_filter(tmp_path, monkeypatch):
     assert sr.json()["results"][0]["chunk"]["id"] == keep
 
 
+# Cursor Pagination Test
+def test_chunk_cursor_pagination_and_ndjson_stream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Pages", {})
+    docs = [str(uuid4()) for _ in range(3)]
+    for doc in docs:
+        local.post(f"/libraries/{lib_id}/documents",
+                   json={"id": doc, "title": "D", "metadata": {}})
+    local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+        {"doc_id": docs[i % 3], "text": f"{i % 3}-{i}", "embedding": [1.0], "metadata": {}}
+        for i in range(12)]})
+    expected = [c["text"] for c in local.get(
+        f"/libraries/{lib_id}/chunks", params={"limit": 100}).json()]
+    assert len(expected) == 12
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+        resp = local.get(f"/libraries/{lib_id}/chunks", params=params)
+        seen += [c["text"] for c in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == expected
+
+    # a cursor stays valid when documents before it are removed
+    resp = local.get(f"/libraries/{lib_id}/chunks", params={"limit": 6})
+    cursor = resp.headers["X-Next-Cursor"]
+    lib = main_module.get_repository().get(lib_id)
+    lib.documents.pop(0)
+    main_module.get_repository().update(lib)
+    rest = local.get(f"/libraries/{lib_id}/chunks", params={"cursor": cursor}).json()
+    assert [c["text"] for c in rest] == expected[6:]
+
+    stream = local.get(f"/libraries/{lib_id}/chunks", params={"format": "ndjson"})
+    assert stream.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in stream.text.splitlines()]
+    assert [c["text"] for c in lines] == expected[4:]
+
+    assert local.get(f"/libraries/{lib_id}/chunks",
+                     params={"cursor": "not-a-cursor"}).status_code == 400
+    assert local.get(f"/libraries/{uuid4()}/chunks").status_code == 404
+
+
+# Background Index Builder Test
+def test_index_build_status_and_swap(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Idx", {})
+    doc_id = uuid4()
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": str(doc_id), "title": "D", "metadata": {}})
+    for i in range(5):
+        local.post(f"/libraries/{lib_id}/chunks",
+                   json={"doc_id": str(doc_id), "text": str(i),
+                         "embedding": [float(i), 0.0], "metadata": {}})
+
+    # first search is answered by a direct scan and queues the build
+    sr = local.post(f"/libraries/{lib_id}/search",
+                    json={"embedding": [4.0, 0.0], "k": 1, "algorithm": "kd"})
+    assert sr.json()["results"][0]["chunk"]["text"] == "4"
+    assert index_builder.wait(timeout=10)
+
+    status = local.get(f"/libraries/{lib_id}/index").json()
+    assert status["version"] == 6
+    [kd] = status["indexes"]
+    assert kd["algorithm"] == "kd"
+    assert kd["state"] == "ready"
+    assert kd["version"] == 6
+    assert kd["size"] == 5
+    assert kd["build_seconds"] >= 0
+    assert kd["reason"] == "initial"
+
+    # writes are visible immediately, served from the patched old index
+    new = local.post(f"/libraries/{lib_id}/chunks",
+                     json={"doc_id": str(doc_id), "text": "new",
+                           "embedding": [10.0, 0.0], "metadata": {}}).json()
+    sr = local.post(f"/libraries/{lib_id}/search",
+                    json={"embedding": [10.0, 0.0], "k": 1, "algorithm": "kd"})
+    assert sr.json()["results"][0]["chunk"]["id"] == new["id"]
+    local.delete(f"/libraries/{lib_id}/chunks/{new['id']}")
+    sr = local.post(f"/libraries/{lib_id}/search",
+                    json={"embedding": [10.0, 0.0], "k": 1, "algorithm": "kd"})
+    assert sr.json()["results"][0]["chunk"]["text"] == "4"
+
+    assert index_builder.wait(timeout=10)
+    [kd] = local.get(f"/libraries/{lib_id}/index").json()["indexes"]
+    assert kd["state"] == "ready"
+    assert kd["version"] == 8
+    assert kd["size"] == 5
+
+    assert local.get(f"/libraries/{uuid4()}/index").status_code == 404
+
+
+def test_index_rebuilds_only_past_thresholds():
+    builder = IndexBuilder(debounce_seconds=0, max_tombstone_ratio=0.25, max_insert_ratio=0.5)
+    doc = Document(id=uuid4(), title="D", chunks=[
+        Chunk(id=uuid4(), text=str(i), embedding=[float(i), 0.0], metadata={})
+        for i in range(20)
+    ], metadata={})
+    lib = Library(id=uuid4(), name="L", documents=[doc], metadata={})
+    assert builder.snapshot(lib, "kd") is None
+    assert builder.wait(timeout=10)
+    [status] = builder.status(str(lib.id))
+    assert status["reason"] == "initial" and status["size"] == 20
+    built_at = status["built_at"]
+
+    def write(upserted=(), removed=()):
+        lib.version += 1
+        builder.apply(lib, upserted=upserted, removed=removed)
+        assert builder.wait(timeout=10)
+        return builder.status(str(lib.id))[0]
+
+    # small deltas are patched in place: no rebuild
+    for i in range(4):
+        chunk = Chunk(id=uuid4(), text="n", embedding=[100.0 + i, 0.0], metadata={})
+        doc.chunks.append(chunk)
+        status = write(upserted=[chunk])
+    assert status["built_at"] == built_at and status["version"] == lib.version
+    assert builder.snapshot(lib, "kd").index.nearest([103.0, 0.0], 1)
+
+    # dead rows past 25% of the snapshot queue a rebuild, which drops them
+    gone = [c.id for c in doc.chunks[:7]]
+    doc.chunks = doc.chunks[7:]
+    status = write(removed=gone)
+    assert status["reason"] == "tombstones" and status["built_at"] > built_at
+    snap = builder.snapshot(lib, "kd")
+    assert len(snap.rows) == len(snap.row_of) == 17
+
+    # inserts past half the built size rebuild the tree
+    built_at = status["built_at"]
+    fresh = [Chunk(id=uuid4(), text="m", embedding=[-1.0 - i, 0.0], metadata={}) for i in range(10)]
+    doc.chunks.extend(fresh)
+    status = write(upserted=fresh)
+    assert status["reason"] == "imbalance" and status["built_at"] > built_at
+    assert builder.snapshot(lib, "kd").index.imbalance == 0
+
+
+# Auto-tuned Algorithm Test
+def test_auto_algorithm_tunes_persists_and_retunes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main_module.index_tuner, "min_size", 40)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Auto", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+
+    def add(n, offset=0):
+        local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+            {"doc_id": doc_id, "text": str(i), "embedding": [float(i), float(i % 7)],
+             "metadata": {}} for i in range(offset, offset + n)]})
+
+    def search(i):
+        return local.post(f"/libraries/{lib_id}/search",
+                          json={"embedding": [float(i), float(i % 7)], "k": 1,
+                                "algorithm": "auto"}).json()["results"]
+
+    add(10)  # below min_size: exact scan, nothing tuned
+    assert search(3)[0]["chunk"]["text"] == "3"
+    assert main_module.index_tuner.wait(timeout=10)
+    assert local.get(f"/libraries/{lib_id}/index").json()["index_config"] is None
+
+    add(40, 10)
+    assert search(25)[0]["chunk"]["text"] == "25"
+    assert main_module.index_tuner.wait(timeout=30)
+    status = local.get(f"/libraries/{lib_id}/index").json()
+    config = status["index_config"]
+    assert config["algorithm"] in ("kd", "ball", "linear")
+    assert config["size"] == 50 and config["recall"] >= config["target_recall"]
+    assert status["tuning"]["state"] == "done"
+    # persisted on the library, and used from then on
+    assert main_module.get_repository().get(lib_id).index_config == config
+    assert search(42)[0]["chunk"]["text"] == "42"
+
+    add(10, 50)  # grew by less than the threshold
+    search(1)
+    assert main_module.index_tuner.wait(timeout=10)
+    assert local.get(f"/libraries/{lib_id}/index").json()["index_config"] == config
+
+    add(50, 60)
+    search(1)
+    assert main_module.index_tuner.wait(timeout=30)
+    assert local.get(f"/libraries/{lib_id}/index").json()["index_config"]["size"] == 110
+
+    bad = local.post(f"/libraries/{lib_id}/search",
+                     json={"embedding": [1.0, 1.0], "algorithm": "hnsw"})
+    assert bad.status_code == 422
+
+
+# Sharded Library Test
+def test_sharded_library_search_and_shard_local_writes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    resp = local.post("/libraries", json={"name": "Sharded", "metadata": {}, "shards": 4})
+    assert resp.json()["shards"] == 4
+    lib_id = resp.json()["id"]
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+        {"doc_id": doc_id, "text": str(i), "embedding": [float(i), 0.0], "metadata": {}}
+        for i in range(40)]})
+
+    query = {"embedding": [12.2, 0.0], "k": 3, "algorithm": "kd"}
+    local.post(f"/libraries/{lib_id}/search", json=query)
+    assert index_builder.wait(timeout=10)
+    sr = local.post(f"/libraries/{lib_id}/search", json=query).json()["results"]
+    assert [r["chunk"]["text"] for r in sr] == ["12", "13", "11"]
+
+    snap = index_builder._snapshots[(lib_id, "kd")]
+    assert len(snap.index.shards) == 4 and len(snap.index) == 40
+    roots = [shard.root for shard in snap.index.shards]
+    sizes = [len(shard) for shard in snap.index.shards]
+    new = local.post(f"/libraries/{lib_id}/chunks", json={
+        "doc_id": doc_id, "text": "new", "embedding": [12.2, 0.0], "metadata": {}}).json()
+    assert index_builder._snapshots[(lib_id, "kd")] is snap
+    owner = UUID(new["id"]).int % 4
+    assert len(snap.index.shards[owner]) == sizes[owner] + 1
+    assert all(shard.root is root for i, (shard, root)
+               in enumerate(zip(snap.index.shards, roots)) if i != owner)
+    sr = local.post(f"/libraries/{lib_id}/search", json=query).json()["results"]
+    assert sr[0]["chunk"]["id"] == new["id"]
+
+    assert local.post("/libraries", json={
+        "name": "Bad", "metadata": {}, "shards": 0}).status_code == 422
+
+
+# Query Cache Test
+def test_search_results_are_cached_until_mutation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Cache", {})
+    doc_id = uuid4()
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": str(doc_id), "title": "D", "metadata": {}})
+    local.post(f"/libraries/{lib_id}/chunks",
+               json={"doc_id": str(doc_id), "text": "a",
+                     "embedding": [1.0, 0.0], "metadata": {}})
+    body = {"embedding": [1.0, 0.0], "k": 1, "algorithm": "linear"}
+
+    before = query_cache.stats()
+    first = local.post(f"/libraries/{lib_id}/search", json=body).json()
+    second = local.post(f"/libraries/{lib_id}/search", json=body).json()
+    after = query_cache.stats()
+    assert first == second
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    # any mutation bumps the library version and drops its entries
+    local.put(f"/libraries/{lib_id}/chunks/{first['results'][0]['chunk']['id']}",
+              json={"text": "b"})
+    third = local.post(f"/libraries/{lib_id}/search", json=body).json()
+    assert third["results"][0]["chunk"]["text"] == "b"
+    assert query_cache.stats()["misses"] == after["misses"] + 1
+
+    stats = local.get("/cache/stats").json()
+    assert 0.0 <= stats["hit_rate"] <= 1.0
+
+
+# Server-side Embedding Tests
+def fake_embed_many(calls):
+    def embed_many(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 0.0] for t in texts]
+    return embed_many
+
+
+def test_embedding_batcher_coalesces_concurrent_texts():
+    calls = []
+    batcher = EmbeddingBatcher(fake_embed_many(calls), max_wait_seconds=0.01)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed("x" * i) for i in range(1, 6)))
+
+    vectors = asyncio.run(run())
+    assert vectors == [[float(i), 0.0] for i in range(1, 6)]
+    assert calls == [["x", "xx", "xxx", "xxxx", "xxxxx"]]
+
+
+def test_text_ingest_and_search(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    resp = local.post("/libraries", json={
+        "name": "Text", "metadata": {}, "embedder": "hashing"})
+    assert resp.status_code == 200
+    assert resp.json()["embedder"] == "hashing"
+    lib_id = resp.json()["id"]
+    doc_id = uuid4()
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": str(doc_id), "title": "D", "metadata": {}})
+    for text in ("error code E1234 in module", "sunny weather today", "pasta recipe"):
+        resp = local.post(f"/libraries/{lib_id}/chunks/text",
+                          json={"doc_id": str(doc_id), "text": text, "metadata": {}})
+        assert resp.status_code == 200
+        assert len(resp.json()["embedding"]) == 256
+
+    sr = local.post(f"/libraries/{lib_id}/search/text",
+                    json={"text": "what is error E1234", "k": 1, "algorithm": "linear"})
+    assert sr.status_code == 200
+    assert sr.json()["results"][0]["chunk"]["text"] == "error code E1234 in module"
+
+    missing = local.post(f"/libraries/{uuid4()}/search/text", json={"text": "x"})
+    assert missing.status_code == 404
+
+    bad = local.post("/libraries", json={"name": "X", "metadata": {}, "embedder": "nope"})
+    assert bad.status_code == 400
+
+
+# Hybrid Search Test
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_keyword_and_hybrid_search(tmp_path, monkeypatch, fusion):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Hybrid", {})
+    doc_id = uuid4()
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": str(doc_id), "title": "D", "metadata": {}})
+    ids = {}
+    for text, emb, tag in (("SKU-998 blue widget", [0.0, 5.0], "x"),
+                           ("red widget", [1.0, 0.0], "x"),
+                           ("green gadget", [1.1, 0.0], "y")):
+        ids[text] = local.post(f"/libraries/{lib_id}/chunks", json={
+            "doc_id": str(doc_id), "text": text,
+            "embedding": emb, "metadata": {"tag": tag}}).json()["id"]
+
+    kw = local.post(f"/libraries/{lib_id}/search",
+                    json={"text": "sku-998", "k": 2, "mode": "keyword"})
+    assert kw.status_code == 200
+    [hit] = kw.json()["results"]
+    assert hit["chunk"]["id"] == ids["SKU-998 blue widget"]
+    assert hit["score"] > 0
+
+    hy = local.post(f"/libraries/{lib_id}/search", json={
+        "embedding": [1.0, 0.0], "text": "widget", "k": 2,
+        "mode": "hybrid", "fusion": fusion, "algorithm": "linear"})
+    assert hy.status_code == 200
+    assert hy.json()["results"][0]["chunk"]["id"] == ids["red widget"]
+
+    filtered = local.post(f"/libraries/{lib_id}/search", json={
+        "text": "widget gadget", "k": 3, "mode": "keyword",
+        "metadata_filter": {"tag": "y"}})
+    assert [r["chunk"]["id"] for r in filtered.json()["results"]] == [ids["green gadget"]]
+
+    # BM25 follows writes
+    local.delete(f"/libraries/{lib_id}/chunks/{ids['SKU-998 blue widget']}")
+    kw = local.post(f"/libraries/{lib_id}/search",
+                    json={"text": "sku-998", "k": 2, "mode": "keyword"})
+    assert kw.json()["results"] == []
+
+    bad = local.post(f"/libraries/{lib_id}/search",
+                     json={"embedding": [1.0, 0.0], "mode": "hybrid"})
+    assert bad.status_code == 422
+
+
+# Diversity Re-ranking Test
+def test_mmr_and_per_document_cap(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Diverse", {})
+    doc_a, doc_b = uuid4(), uuid4()
+    for doc in (doc_a, doc_b):
+        local.post(f"/libraries/{lib_id}/documents",
+                   json={"id": str(doc), "title": "D", "metadata": {}})
+    # three near-duplicates in doc A, one distinct chunk in doc B
+    for i, (doc, emb) in enumerate([(doc_a, [1.0, 0.0]), (doc_a, [1.0, 0.01]),
+                                    (doc_a, [1.0, 0.02]), (doc_b, [0.7, 0.7])]):
+        local.post(f"/libraries/{lib_id}/chunks", json={
+            "doc_id": str(doc), "text": f"c{i}", "embedding": emb, "metadata": {}})
+
+    query = {"embedding": [1.0, 0.0], "k": 2, "algorithm": "linear"}
+    plain = local.post(f"/libraries/{lib_id}/search", json=query).json()["results"]
+    assert [r["chunk"]["text"] for r in plain] == ["c0", "c1"]
+
+    mmr = local.post(f"/libraries/{lib_id}/search",
+                     json={**query, "rerank": "mmr", "mmr_lambda": 0.3}).json()["results"]
+    assert [r["chunk"]["text"] for r in mmr] == ["c0", "c3"]
+
+    capped = local.post(f"/libraries/{lib_id}/search",
+                        json={**query, "k": 3, "max_per_document": 1}).json()["results"]
+    assert [r["chunk"]["text"] for r in capped] == ["c0", "c3"]
+
+
+# Range Search Test
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_radius_and_max_distance_search(tmp_path, monkeypatch, algo):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Range", {})
+    doc_id = uuid4()
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": str(doc_id), "title": "D", "metadata": {}})
+    for i, x in enumerate([0.0, 0.5, 1.0, 3.0, 10.0]):
+        local.post(f"/libraries/{lib_id}/chunks", json={
+            "doc_id": str(doc_id), "text": f"c{i}", "embedding": [x, 0.0], "metadata": {}})
+
+    query = {"embedding": [0.0, 0.0], "algorithm": algo}
+    within = local.post(f"/libraries/{lib_id}/search",
+                        json={**query, "radius": 1.0}).json()["results"]
+    assert [r["chunk"]["text"] for r in within] == ["c0", "c1", "c2"]
+
+    capped = local.post(f"/libraries/{lib_id}/search",
+                        json={**query, "k": 10, "max_distance": 3.0}).json()["results"]
+    assert [r["chunk"]["text"] for r in capped] == ["c0", "c1", "c2", "c3"]
+
+    bad = local.post(f"/libraries/{lib_id}/search",
+                     json={**query, "radius": -1.0})
+    assert bad.status_code == 422
+
+
+# Federated Search Test
+def test_federated_search_merges_libraries(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    libs = []
+    for name, tenant, xs in [("A", "t1", [0.0, 3.0]), ("B", "t1", [1.0, 2.0]), ("C", "t2", [0.5])]:
+        lib_id = create_library(local, name, {"tenant": tenant})
+        doc_id = str(uuid4())
+        local.post(f"/libraries/{lib_id}/documents",
+                   json={"id": doc_id, "title": "D", "metadata": {}})
+        for x in xs:
+            local.post(f"/libraries/{lib_id}/chunks", json={
+                "doc_id": doc_id, "text": f"{name}{x}", "embedding": [x, 0.0], "metadata": {}})
+        libs.append(lib_id)
+
+    by_ids = local.post("/search", json={
+        "embedding": [0.0, 0.0], "k": 3, "library_ids": libs}).json()["results"]
+    assert [r["chunk"]["text"] for r in by_ids] == ["A0.0", "C0.5", "B1.0"]
+    assert [r["library_id"] for r in by_ids] == [libs[0], libs[2], libs[1]]
+
+    by_filter = local.post("/search", json={
+        "embedding": [0.0, 0.0], "k": 3, "library_filter": {"tenant": "t1"}}).json()["results"]
+    assert [r["chunk"]["text"] for r in by_filter] == ["A0.0", "B1.0", "B2.0"]
+
+    assert local.post("/search", json={
+        "embedding": [0.0, 0.0], "library_ids": [str(uuid4())]}).status_code == 404
+    assert local.post("/search", json={"embedding": [0.0, 0.0]}).status_code == 422
+
+
+# Near-duplicate Tests
+@pytest.mark.parametrize("mode,status,added", [
+    ("skip", "skipped", 0), ("merge", "merged", 0), ("flag", "flagged", 1)])
+def test_dedupe_on_ingest(tmp_path, monkeypatch, mode, status, added):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Dedupe", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    first = local.post(f"/libraries/{lib_id}/chunks", json={
+        "doc_id": doc_id, "text": "Hello  World", "embedding": [1.0, 0.0],
+        "metadata": {"src": "a"}}).json()
+
+    resp = local.post(f"/libraries/{lib_id}/chunks/bulk", json={
+        "dedupe": mode, "dedupe_distance": 0.1,
+        "chunks": [
+            # same text, different embedding
+            {"doc_id": doc_id, "text": "hello world", "embedding": [5.0, 5.0],
+             "metadata": {"crawl": 2}},
+            # near-identical embedding, different text
+            {"doc_id": doc_id, "text": "other", "embedding": [1.0, 0.05],
+             "metadata": {}},
+            {"doc_id": doc_id, "text": "fresh", "embedding": [-3.0, 0.0],
+             "metadata": {}},
+            # duplicate of the previous item in the same batch
+            {"doc_id": doc_id, "text": "FRESH", "embedding": [9.0, 9.0],
+             "metadata": {}},
+        ]})
+    assert resp.status_code == 200
+    results = resp.json()
+    assert [r["status"] for r in results] == [status, status, "added", status]
+    if mode == "flag":
+        assert results[0]["chunk"]["metadata"]["duplicate_of"] == first["id"]
+    else:
+        assert results[0]["chunk"]["id"] == first["id"]
+    if mode == "merge":
+        assert results[0]["chunk"]["metadata"] == {"src": "a", "crawl": 2}
+
+    chunks = local.get(f"/libraries/{lib_id}/chunks").json()
+    assert len(chunks) == 2 + 3 * added
+
+
+def test_dedupe_job_clusters_and_removes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "DedupeJob", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    ids = [
+        local.post(f"/libraries/{lib_id}/chunks", json={
+            "doc_id": doc_id, "text": text, "embedding": emb, "metadata": {}}).json()["id"]
+        for text, emb in [("a", [0.0, 0.0]), ("b", [0.05, 0.0]), ("c", [0.1, 0.0]),
+                          ("d", [5.0, 5.0]), ("A", [9.0, 9.0])]
+    ]
+
+    report = local.post(f"/libraries/{lib_id}/dedupe", json={"max_distance": 0.06})
+    assert report.status_code == 200
+    body = report.json()
+    assert body["removed"] == 0
+    assert body["clusters"] == [{"kept": ids[0], "duplicates": [ids[1], ids[2], ids[4]]}]
+    assert len(local.get(f"/libraries/{lib_id}/chunks").json()) == 5
+
+    removed = local.post(f"/libraries/{lib_id}/dedupe",
+                         json={"max_distance": 0.06, "action": "remove"}).json()
+    assert removed["removed"] == 3
+    left = [c["id"] for c in local.get(f"/libraries/{lib_id}/chunks").json()]
+    assert left == [ids[0], ids[3]]
+    hits = local.post(f"/libraries/{lib_id}/search",
+                      json={"embedding": [0.1, 0.0], "k": 2}).json()["results"]
+    assert [h["chunk"]["id"] for h in hits] == [ids[0], ids[3]]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_dedupe_at_distance_zero_removes_only_identical(tmp_path, monkeypatch, indexed):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+
+    lib_id = create_library(local, "Exact", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    ids = [
+        c["chunk"]["id"] for c in local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+            {"doc_id": doc_id, "text": text, "embedding": emb, "metadata": {}}
+            for text, emb in [("a", [1000.0, 0.0]), ("b", [1000.0, 0.001]),
+                              ("c", [1000.0, 0.0]), ("d", [1000.0001, 0.0])]
+        ]}).json()
+    ]
+    if indexed:  # look duplicates up in the library's built index
+        local.post(f"/libraries/{lib_id}/search", json={"embedding": [0.0, 0.0], "algorithm": "kd"})
+        assert index_builder.wait(timeout=10)
+
+    removed = local.post(f"/libraries/{lib_id}/dedupe", json={"action": "remove"}).json()
+    assert removed["clusters"] == [{"kept": ids[0], "duplicates": [ids[2]]}]
+    left = [c["id"] for c in local.get(f"/libraries/{lib_id}/chunks").json()]
+    assert left == [ids[0], ids[1], ids[3]]
+
+
 # Health Check
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+    lib_id = create_library(local, "Metrics", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+        {"doc_id": doc_id, "text": str(i), "embedding": [float(i), 0.0],
+         "metadata": {"odd": i % 2}} for i in range(30)]})
+    local.post(f"/libraries/{lib_id}/search", json={
+        "embedding": [3.0, 0.0], "k": 2, "metadata_filter": {"odd": 1}})
+
+    resp = local.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain")
+    lines = resp.text.splitlines()
+
+    def value(sample):
+        [line] = [l for l in lines if l.startswith(sample + " ")]
+        return float(line.rsplit(" ", 1)[1])
+
+    route = 'method="POST",route="/libraries/{lib_id}/search",status="200"'
+    assert value(f"vectordb_request_seconds_count{{{route}}}") >= 1
+    assert value(f'vectordb_request_seconds_bucket{{{route},le="+Inf"}}') >= 1
+    for stage in ("filter", "index", "traversal", "assembly"):
+        assert value(f'vectordb_search_stage_seconds_count{{stage="{stage}"}}') >= 1
+    assert value("vectordb_search_distance_computations_sum") >= 15
+    assert value('vectordb_repository_persist_bytes_total{backend="json"}') > 0
+    assert value('vectordb_response_serialization_seconds_count'
+                 '{route="/libraries/{lib_id}/search",format="json"}') >= 1
+    assert any(l.startswith("vectordb_query_cache_lookups_total") for l in lines)
+
+
+def test_search_profile_reports_plan_index_and_traversal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    local = TestClient(app)
+    lib_id = create_library(local, "Profiled", {})
+    doc_id = str(uuid4())
+    local.post(f"/libraries/{lib_id}/documents",
+               json={"id": doc_id, "title": "D", "metadata": {}})
+    local.post(f"/libraries/{lib_id}/chunks/bulk", json={"chunks": [
+        {"doc_id": doc_id, "text": str(i), "embedding": [float(i), float(i % 5)],
+         "metadata": {"odd": i % 2}} for i in range(200)]})
+    url = f"/libraries/{lib_id}/search"
+    query = {"embedding": [3.0, 3.0], "k": 2, "algorithm": "kd"}
+    local.post(url, json=query)
+    assert index_builder.wait(timeout=10)
+
+    plain = local.post(url, json=query).json()
+    assert "profile" not in plain
+
+    body = local.post(url, json={**query, "profile": True}).json()
+    assert body["results"] == plain["results"]
+    profile = body["profile"]
+    assert set(profile["stages"]) >= {"index", "traversal", "assembly"}
+    assert profile["total_seconds"] >= sum(profile["stages"].values())
+    [plan] = profile["plans"]
+    assert plan["library_id"] == lib_id and plan["algorithm"] == "kd"
+    assert plan["filter"] == {"plan": "none"}
+    assert plan["index"]["source"] == "cached" and plan["index"]["rows"] == 200
+    assert plan["index"]["build_seconds"] > 0
+    traversal = plan["traversal"]
+    assert traversal["nodes_visited"] > 0 and traversal["leaves_scanned"] > 0
+    assert 0 < traversal["distance_evaluations"] < 200
+    assert 0 < traversal["pruning_efficiency"] < 1
+    assert plan["results"] == 2
+
+    body = local.post(url, json={**query, "metadata_filter": {"odd": 1},
+                                 "profile": True}).json()
+    [plan] = body["profile"]["plans"]
+    assert plan["filter"] == {"plan": "pre_filter_scan", "matched": 100,
+                              "total": 200, "selectivity": 0.5}
+    assert plan["index"]["source"] == "built"
+    assert plan["index"]["reason"] == "metadata_filter"
+    assert plan["traversal"]["distance_evaluations"] == 100
+    assert "filter" in body["profile"]["stages"]
+
+    body = local.post(url, json={**query, "mode": "hybrid", "text": "7",
+                                 "profile": True}).json()
+    assert {"traversal", "keyword"} <= set(body["profile"]["stages"])
+    assert "traversal" in body["profile"]["plans"][0]
+
+
 def test_health_check():
     resp = client.get("/health")
     assert resp.status_code == 200
@@ -168,6 +823,503 @@ def test_repo_crud(tmp_path, cls, path):
     assert repo.get(str(lib.id)) is None
 
 
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (PickleLibraryRepository, "data.pkl"),
+    (SQLiteLibraryRepository, "data.db"),
+])
+def test_embeddings_are_packed_columnar_and_round_trip(tmp_path, cls, path):
+    os.chdir(tmp_path)
+    chunks = [Chunk(id=uuid4(), text=str(i), embedding=[float(i), 0.5], metadata={})
+              for i in range(6)]
+    lib = Library(id=uuid4(), name="Packed", metadata={}, documents=[
+        Document(id=uuid4(), title="A", chunks=chunks[:4], metadata={}),
+        Document(id=uuid4(), title="B", chunks=chunks[4:], metadata={"k": 1}),
+    ])
+    matrix = embedding_matrix(chunks)
+    assert matrix.shape == (6, 2) and matrix.base is not None  # a view, not a copy
+    assert not matrix.flags.writeable
+
+    chunks[1].embedding = [9.0, 9.0]  # copy-on-write: the shared matrix is untouched
+    assert matrix[1].tolist() == [1.0, 0.5]
+    assert not lib.pack(force=False)  # one loose row of six: not worth repacking yet
+    assert embedding_matrix(chunks)[1].tolist() == [9.0, 9.0]
+
+    cls(path).add(lib)
+    loaded = cls(path).get(str(lib.id))
+    assert loaded == lib and loaded is not lib
+    assert loaded.documents[1].metadata == {"k": 1}
+    loaded_chunks = [c for d in loaded.documents for c in d.chunks]
+    assert embedding_matrix(loaded_chunks).base is not None
+    assert loaded.to_dict() == json.loads(json.dumps(lib.to_dict()))
+
+
+def test_json_file_is_compact_versioned_and_migrated(tmp_path, monkeypatch):
+    os.chdir(tmp_path)
+    lib = Library(id=uuid4(), name="Old", metadata={"m": 1}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[
+            Chunk(id=uuid4(), text=str(i), embedding=[i / 3, -1.5, 2.0], metadata={})
+            for i in range(3)])])
+    with open("data.json", "w") as f:  # the original layout
+        json.dump([lib.to_dict()], f, indent=2)
+
+    repo = JSONLibraryRepository("data.json")
+    assert repo.get(str(lib.id)) == lib
+    raw = open("data.json", "rb").read()
+    assert b"\n" not in raw and b", " not in raw
+    stored = json.loads(raw)
+    assert stored["format"] == codec.FORMAT_VERSION
+    chunk = stored["libraries"][0]["documents"][0]["chunks"][1]
+    assert isinstance(chunk["embedding"], str)  # base64 float32
+    assert codec.decode_library(stored["libraries"][0]) == lib
+
+    monkeypatch.setattr(codec, "orjson", None)  # stdlib fallback reads the same file
+    assert JSONLibraryRepository("data.json").get(str(lib.id)) == lib
+    with pytest.raises(ValueError):
+        codec.decode_file(b'{"format": 99, "libraries": []}')
+
+
+def test_pickle_written_by_pydantic_models_is_migrated(tmp_path, monkeypatch):
+    os.chdir(tmp_path)
+
+    # the models data.pkl files were first written with
+    class OldChunk(BaseModel):
+        id: UUID
+        text: str
+        embedding: List[float]
+        metadata: Dict[str, Any]
+
+    class OldDocument(BaseModel):
+        id: UUID
+        title: str
+        chunks: List[OldChunk]
+        metadata: Dict[str, Any]
+
+    class OldLibrary(BaseModel):
+        id: UUID
+        name: str
+        documents: List[OldDocument]
+        metadata: Dict[str, Any]
+
+    old = OldLibrary(id=uuid4(), name="Old", metadata={"m": 1}, documents=[
+        OldDocument(id=uuid4(), title="D", metadata={}, chunks=[
+            OldChunk(id=uuid4(), text=str(i), embedding=[i, 0.5], metadata={"i": i})
+            for i in range(3)])])
+    with monkeypatch.context() as m:  # pickled under the names the repo loads
+        for cls, name in ((OldChunk, "Chunk"), (OldDocument, "Document"), (OldLibrary, "Library")):
+            cls.__module__, cls.__qualname__ = "domain.models", name
+            m.setattr(models, name, cls)
+        with open("data.pkl", "wb") as f:
+            pickle.dump({str(old.id): old}, f)
+
+    lib = PickleLibraryRepository("data.pkl").get(str(old.id))
+    assert (lib.version, lib.embedder, lib.shards, lib.index_config) == (0, None, 1, None)
+    assert lib.to_dict() == {**json.loads(old.model_dump_json()), "version": 0,
+                             "embedder": None, "shards": 1, "index_config": None}
+    assert lib.documents[0].chunks[2].embedding.tolist() == [2.0, 0.5]
+    assert PickleLibraryRepository("data.pkl").get(str(old.id)) == lib  # rewritten
+
+
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (PickleLibraryRepository, "data.pkl"),
+    (SQLiteLibraryRepository, "data.db"),
+])
+def test_partial_reads(tmp_path, cls, path):
+    os.chdir(tmp_path)
+    docs = [Document(id=uuid4(), title=f"D{d}", metadata={"d": d}, chunks=[
+        Chunk(id=uuid4(), text=f"{d}.{i}", embedding=[d, i], metadata={"i": i})
+        for i in range(3)]) for d in range(3)]
+    lib = Library(id=uuid4(), name="Big", documents=docs, metadata={"m": 1})
+    repo = cls(path)
+    repo.add(lib)
+    lib_id = str(lib.id)
+
+    listed = repo.list_documents(lib_id)
+    assert [(d.id, d.title, d.metadata, d.chunks) for d in listed] == [
+        (d.id, d.title, d.metadata, []) for d in docs]
+    page = repo.get_chunks(lib_id, offset=2, limit=3)
+    assert [c.text for c in page] == ["0.2", "1.0", "1.1"]
+    assert page[1].embedding.tolist() == [1.0, 0.0] and page[1].metadata == {"i": 0}
+    assert repo.get_chunks(lib_id, offset=8) == [docs[2].chunks[2]]
+    assert repo.list_documents(str(uuid4())) is None
+    assert repo.get_chunks(str(uuid4())) is None
+    assert [c.text for c in repo.get_document_chunks(lib_id, docs[1].id, 1)] == ["1.1", "1.2"]
+    assert repo.get_document_chunks(lib_id, docs[1].id, 0, 1) == [docs[1].chunks[0]]
+    assert repo.get_document_chunks(lib_id, uuid4()) == []
+    assert repo.get_document_chunks(str(uuid4()), docs[0].id) is None
+
+    header = repo.get_header(lib_id)
+    assert header.name == "Big" and header.metadata == {"m": 1}
+    assert header.documents == docs  # loaded on access
+
+    # a header-only write leaves the stored documents alone
+    for_update = repo.get_for_update(lib_id)
+    for_update.name = "Renamed"
+    for_update.version += 1
+    repo.update(for_update)
+    stored = cls(path).get(lib_id)
+    assert (stored.name, stored.version, stored.documents) == ("Renamed", 1, docs)
+
+
+def test_sqlite_reads_only_what_is_asked_and_migrates(tmp_path):
+    os.chdir(tmp_path)
+    lib = Library(id=uuid4(), name="Old", metadata={}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[
+            Chunk(id=uuid4(), text=str(i), embedding=[i, 1.0], metadata={})
+            for i in range(50)])])
+    with sqlite3.connect("data.db") as conn:  # the original one-row-per-library layout
+        conn.execute("CREATE TABLE libraries (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        conn.execute("INSERT INTO libraries VALUES (?, ?)",
+                     (str(lib.id), json.dumps(lib.to_dict())))
+
+    repo = SQLiteLibraryRepository("data.db")
+    assert repo.get(str(lib.id)) == lib
+    statements = []
+    repo._conn.set_trace_callback(statements.append)
+    header = repo.get_header(str(lib.id))
+    repo.list_documents(str(lib.id))
+    assert header.name == "Old" and not header.loaded
+    assert statements and not any("chunks" in s for s in statements)
+    assert len(repo.get_chunks(str(lib.id), limit=5)) == 5
+
+
+def test_chunk_pages_and_stream_read_only_their_chunks(tmp_path, monkeypatch):
+    os.chdir(tmp_path)
+    docs = [Document(id=uuid4(), title="D", metadata={}, chunks=[
+        Chunk(id=uuid4(), text=f"{d}.{i}", embedding=[d, i], metadata={})
+        for i in range(20)]) for d in range(5)]
+    lib = Library(id=uuid4(), name="Deep", documents=docs, metadata={})
+    repo = SQLiteLibraryRepository("data.db")
+    repo.add(lib)
+    service = LibraryService(repo)
+    expected = [c.text for d in docs for c in d.chunks]
+
+    def whole_library(lib_id):
+        raise AssertionError("the whole library was loaded")
+    monkeypatch.setattr(repo, "get", whole_library)
+    statements = []
+    repo._conn.set_trace_callback(statements.append)
+
+    page, cursor = service.list_chunks_page(str(lib.id), 7)
+    page, cursor = service.list_chunks_page(str(lib.id), 7, cursor)
+    assert [c.text for c in page] == expected[7:14]
+    statements.clear()
+    page, cursor = service.list_chunks_page(str(lib.id), 7, cursor)
+    assert [c.text for c in page] == expected[14:21]
+    # the rest of document 0 and the first two chunks of document 1
+    reads = [s for s in statements if "FROM chunks" in s]
+    assert len(reads) == 2 and "LIMIT 8 OFFSET 14" in reads[0] and "LIMIT 2 OFFSET 0" in reads[1]
+
+    assert [c.text for c in service.iter_chunks(str(lib.id), cursor)] == expected[21:]
+
+
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (SQLiteLibraryRepository, "data.db"),
+])
+def test_chunk_writes_read_only_their_document(tmp_path, monkeypatch, cls, path):
+    os.chdir(tmp_path)
+    docs = [Document(id=uuid4(), title="D", metadata={}, chunks=[
+        Chunk(id=uuid4(), text=f"{d}.{i}", embedding=[d, i], metadata={})
+        for i in range(10)]) for d in range(5)]
+    lib = Library(id=uuid4(), name="Big", documents=docs, metadata={})
+    lib_id = str(lib.id)
+    doc_ids = [d.id for d in docs]
+    updated, deleted = docs[1].chunks[4].id, docs[2].chunks[0].id
+    repo = cls(path)
+    repo.add(lib)
+    service = LibraryService(repo)
+    if cls is SQLiteLibraryRepository:
+        def whole_library(lib_id):
+            raise AssertionError("the whole library was loaded")
+        monkeypatch.setattr(repo, "get", whole_library)
+        statements = []
+        repo._conn.set_trace_callback(statements.append)
+
+    new_doc = uuid4()
+    service.create_document(lib_id, new_doc, "New", {})
+    with pytest.raises(ValueError):
+        service.create_document(lib_id, new_doc, "New", {})
+    added = service.add_chunk(lib_id, doc_ids[3], "added", [9.0, 9.0], {})
+    service.update_chunk(lib_id, updated, "updated", None, {"u": 1})
+    service.delete_chunk(lib_id, deleted)
+    with pytest.raises(ValueError):
+        service.add_chunk(lib_id, uuid4(), "orphan", [0.0, 0.0], {})
+    with pytest.raises(ValueError):
+        service.delete_chunk(lib_id, uuid4())
+    if cls is SQLiteLibraryRepository:
+        reads = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM chunks" in s]
+        assert reads and all("doc_id = " in s or "AND id = " in s for s in reads)
+        monkeypatch.undo()
+
+    stored = cls(path).get(lib_id)
+    assert stored.version == 4
+    assert [d.id for d in stored.documents] == doc_ids + [new_doc]
+    assert stored.documents[3].chunks[-1].id == added.id
+    assert stored.documents[1].chunks[4].text == "updated"
+    assert stored.documents[1].chunks[4].metadata == {"u": 1}
+    assert [c.text for c in stored.documents[2].chunks] == [f"2.{i}" for i in range(1, 10)]
+
+
+@pytest.mark.parametrize("cls,path,backend", [
+    (JSONLibraryRepository, "data.json", "json"),
+    (PickleLibraryRepository, "data.pkl", "pickle"),
+    (SQLiteLibraryRepository, "data.db", "sqlite"),
+])
+def test_fine_grained_writes_persist_only_the_change(tmp_path, cls, path, backend):
+    os.chdir(tmp_path)
+    doc = Document(id=uuid4(), title="D", metadata={}, chunks=[
+        Chunk(id=uuid4(), text=str(i), embedding=[float(i)] * 64, metadata={})
+        for i in range(200)])
+    lib = Library(id=uuid4(), name="Delta", documents=[doc], metadata={})
+    repo = cls(path)
+    start = PERSIST_BYTES.value(backend=backend)
+    repo.add(lib)
+    lib_id = str(lib.id)
+    full = PERSIST_BYTES.value(backend=backend) - start
+
+    lib = repo.get_for_update(lib_id)
+    new_doc = Document(id=uuid4(), title="N", metadata={"n": 1}, chunks=[])
+    lib.documents.append(new_doc)
+    lib.version += 1
+    repo.upsert_document(lib, new_doc)
+    added = Chunk(id=uuid4(), text="new", embedding=[0.5] * 64, metadata={"a": 1})
+    new_doc.chunks.append(added)
+    repo.add_chunks(lib, [(new_doc.id, added)])
+    first = lib.documents[0].chunks[0]
+    first.text, first.embedding = "edited", [7.0] * 64
+    repo.update_chunk(lib, first)
+    gone = [c.id for c in lib.documents[0].chunks[1:3]]
+    lib.documents[0].chunks[1:3] = []
+    repo.delete_chunks(lib, gone)
+    lib.name = "Renamed"
+    repo.update_header(lib)
+    # five writes cost a fraction of one whole-library write
+    assert PERSIST_BYTES.value(backend=backend) - start - full < full / 5
+
+    stored = cls(path).get(lib_id)
+    assert stored.name == "Renamed" and stored.version == 1
+    assert [d.title for d in stored.documents] == ["D", "N"]
+    assert stored.documents[1].chunks == [added] and stored.documents[1].metadata == {"n": 1}
+    assert stored.documents[0].chunks[0].text == "edited"
+    assert stored.documents[0].chunks[0].embedding.tolist() == [7.0] * 64
+    assert len(stored.documents[0].chunks) == 198
+    assert stored == lib
+
+
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (PickleLibraryRepository, "data.pkl"),
+])
+def test_file_journal_compacts_and_survives_torn_appends(tmp_path, cls, path):
+    os.chdir(tmp_path)
+    lib = Library(id=uuid4(), name="J", metadata={}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[])])
+    repo = cls(path, compact_bytes=4096)
+    repo.add(lib)
+    doc_id = lib.documents[0].id
+    for i in range(40):
+        chunk = Chunk(id=uuid4(), text=str(i), embedding=[float(i)] * 8, metadata={})
+        lib.documents[0].chunks.append(chunk)
+        lib.version += 1
+        repo.add_chunks(lib, [(doc_id, chunk)])
+    assert os.path.getsize(path + ".log") <= 4096  # compacted into the snapshot
+    assert cls(path).get(str(lib.id)) == lib
+
+    with open(path + ".log", "ab") as f:
+        f.write(b"\x80\x04{torn")  # a crash mid-append loses only that write
+    reopened = cls(path)
+    assert reopened.get(str(lib.id)) == lib
+    lib.name = "After"
+    reopened.update_header(lib)
+    assert cls(path).get(str(lib.id)).name == "After"
+
+
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (PickleLibraryRepository, "data.pkl"),
+])
+def test_journal_replay_skips_changes_the_snapshot_holds(tmp_path, cls, path):
+    os.chdir(tmp_path)
+    lib = Library(id=uuid4(), name="J", metadata={}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[])])
+    repo = cls(path)
+    repo.add(lib)
+    doc = lib.documents[0]
+    chunk = Chunk(id=uuid4(), text="c", embedding=[1.0, 2.0], metadata={})
+    doc.chunks.append(chunk)  # changed in memory, as the service does before writing
+    lib.version += 1
+    repo.compact()  # e.g. after another library's append: the change is in the snapshot
+    repo.add_chunks(lib, [(doc.id, chunk)])  # journaled after the snapshot that holds it
+
+    reopened = cls(path).get(str(lib.id))
+    assert reopened == lib and len(reopened.documents[0].chunks) == 1
+
+
+def test_group_commit_batches_concurrent_writes_in_order():
+    attempts, committed, release = [], [], threading.Event()
+
+    def commit(items):
+        release.wait(5)  # hold the first commit so the others queue up
+        attempts.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad write")
+        committed.append(list(items))
+
+    committer = group_commit.GroupCommitter(commit, "group", max_wait_seconds=0)
+    errors = {}
+
+    def write(item):
+        try:
+            committer.wait(committer.submit(item))
+        except ValueError as e:
+            errors[item] = e
+        assert item == "bad" or any(item in batch for batch in committed)  # durable first
+
+    first = threading.Thread(target=write, args=(0,))
+    first.start()
+    time.sleep(0.02)
+    threads = [threading.Thread(target=write, args=(i,)) for i in (1, 2, "bad", 3)]
+    for t in threads:
+        t.start()
+        time.sleep(0.005)
+    release.set()
+    for t in [first, *threads]:
+        t.join(5)
+    assert [i for batch in committed for i in batch] == [0, 1, 2, 3]
+    assert attempts[1] == [1, 2, "bad", 3]  # queued behind the first commit: one batch
+    assert list(errors) == ["bad"]  # which failed, and was retried one write at a time
+
+    done = []
+    lazy = group_commit.GroupCommitter(lambda items: done.extend(items), "async")
+    lazy.ack(lazy.submit("x"))  # returns before the commit
+    lazy.flush()
+    assert done == ["x"]
+    with pytest.raises(ValueError):
+        group_commit.GroupCommitter(commit, "eventually")
+
+
+@pytest.mark.parametrize("backend", ["json", "pickle", "sqlite"])
+@pytest.mark.parametrize("durability", ["sync", "group", "async"])
+def test_durability_modes_persist_concurrent_writes(tmp_path, backend, durability):
+    os.chdir(tmp_path)
+    paths = dict(json_path="data.json", pickle_path="data.pkl", sqlite_path="data.db")
+    repo = RepositoryFactory.create(backend, durability=durability, **paths)
+    libs = [Library(id=uuid4(), name=f"L{i}", metadata={}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[])]) for i in range(8)]
+    for lib in libs:
+        repo.add(lib)
+
+    def ingest(lib):
+        doc = lib.documents[0]
+        for i in range(20):
+            chunk = Chunk(id=uuid4(), text=str(i), embedding=[float(i), 1.0], metadata={})
+            doc.chunks.append(chunk)
+            lib.version += 1
+            with group_commit.deferred():  # acknowledged on exit, as in the service
+                repo.add_chunks(lib, [(doc.id, chunk)])
+
+    threads = [threading.Thread(target=ingest, args=(lib,)) for lib in libs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    repo.flush()
+    committer = repo._committer
+    if durability != "sync":
+        assert committer.commits < committer.writes  # writes shared commits
+    reopened = RepositoryFactory.create(backend, **paths)
+    for lib in libs:
+        assert reopened.get(str(lib.id)) == lib
+
+
+@pytest.mark.parametrize("cls,path", [
+    (JSONLibraryRepository, "data.json"),
+    (PickleLibraryRepository, "data.pkl"),
+])
+def test_group_commits_compacting_under_concurrent_writers(tmp_path, cls, path):
+    os.chdir(tmp_path)
+    repo = cls(path, compact_bytes=1, durability="group")
+    restarts = []  # chunk ids a restart just before each compaction would load
+    compact = repo._compact
+
+    def checked_compact():
+        restarts.append([[c.id for c in lib.documents[0].chunks] for lib in cls(path).list_all()])
+        compact()
+
+    repo._compact = checked_compact
+    libs = [Library(id=uuid4(), name=f"L{i}", metadata={}, documents=[
+        Document(id=uuid4(), title="D", metadata={}, chunks=[])]) for i in range(2)]
+    for lib in libs:
+        repo.add(lib)
+
+    def ingest(lib, pause):
+        doc = lib.documents[0]
+        for i in range(100):
+            chunk = Chunk(id=uuid4(), text=str(i), embedding=[float(i), 1.0], metadata={})
+            doc.chunks.append(chunk)
+            lib.version += 1
+            time.sleep(pause)  # the other writer's commit compacts between the change and its record
+            with group_commit.deferred():
+                repo.add_chunks(lib, [(doc.id, chunk)])
+
+    threads = [threading.Thread(target=ingest, args=(lib, pause)) for lib, pause in zip(libs, (0, 0.002))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    repo.flush()
+    assert restarts  # the committer compacted while the other library was writing
+    for held in restarts:
+        assert all(len(ids) == len(set(ids)) for ids in held)
+    reopened = cls(path)
+    for lib in libs:
+        assert reopened.get(str(lib.id)) == lib
+        assert len(reopened.get(str(lib.id)).documents[0].chunks) == 100
+
+
+def test_concurrent_http_writes_share_group_commits(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("JSON_PATH", str(tmp_path / "data.json"))
+    server = uvicorn.Server(uvicorn.Config(app, port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    base = f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+    try:
+        with httpx.Client(base_url=base) as http:
+            targets = []
+            for i in range(16):
+                lib_id = create_library(http, f"G{i}")
+                doc_id = str(uuid4())
+                http.post(f"/libraries/{lib_id}/documents",
+                          json={"id": doc_id, "title": "D", "metadata": {}})
+                targets.append((lib_id, doc_id))
+        committer = main_module.get_repository()._committer
+        commits, writes = committer.commits, committer.writes
+
+        def ingest(lib_id, doc_id):
+            with httpx.Client(base_url=base) as http:
+                for i in range(10):
+                    resp = http.post(f"/libraries/{lib_id}/chunks", json={
+                        "doc_id": doc_id, "text": str(i), "embedding": [float(i)],
+                        "metadata": {}})
+                    assert resp.status_code == 200
+
+        threads = [threading.Thread(target=ingest, args=t) for t in targets]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert committer.writes - writes == 160
+        assert committer.commits - commits < 160  # requests overlapped and shared commits
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+
 # LibraryRepository Wrapper Test
 def test_library_repository(tmp_path):
     os.chdir(tmp_path)
@@ -190,23 +1342,245 @@ def test_leader_follower(tmp_path):
     os.chdir(tmp_path)
     leader = JSONLibraryRepository("leader.json")
     f1 = JSONLibraryRepository("f1.json")
-    f2 = JSONLibraryRepository("f2.json")
+    f2 = SQLiteLibraryRepository("f2.db")
     lf = LeaderFollowerRepository(leader, [f1, f2])
     lib = Library(id=uuid4(), name="LF", documents=[], metadata={})
     lf.add(lib)
+    assert lf.wait_for_replication(timeout=5)
     for r in (leader, f1, f2):
         assert r.get(str(lib.id)).id == lib.id
     lib.name = "LF2"
     lf.update(lib)
+    assert lf.wait_for_replication(timeout=5)
     for r in (leader, f1, f2):
         assert r.get(str(lib.id)).name == "LF2"
+
+    # fine-grained writes ship only the change
+    doc = Document(id=uuid4(), title="D", chunks=[], metadata={})
+    lib.documents.append(doc)
+    lib.version += 1
+    lf.upsert_document(lib, doc)
+    chunk = Chunk(id=uuid4(), text="c", embedding=[1.0, 2.0], metadata={})
+    doc.chunks.append(chunk)
+    lf.add_chunks(lib, [(doc.id, chunk)])
+    [entry] = lf.log.read(lf.log.last_seq - 1)
+    assert entry.op == "add_chunks" and "library" not in entry.payload
+    assert lf.wait_for_replication(timeout=5)
+    for r in (f1, f2):
+        assert r.get(str(lib.id)) == lib
     lf.delete(str(lib.id))
+    assert lf.wait_for_replication(timeout=5)
     for r in (leader, f1, f2):
         assert r.get(str(lib.id)) is None
+    assert [f["lag"] for f in lf.status()["followers"]] == [0, 0]
+    lf.close()
+
+
+def test_follower_catch_up_and_bounded_staleness_reads(tmp_path):
+    os.chdir(tmp_path)
+    leader = JSONLibraryRepository("leader.json")
+    follower = JSONLibraryRepository("f1.json")
+    stale = Library(id=uuid4(), name="Gone", documents=[], metadata={})
+    follower.add(stale)  # left over from an earlier run
+    lf = LeaderFollowerRepository(leader, [follower], read_policy="round_robin",
+                                  max_staleness_seconds=0.5, log_capacity=4)
+    assert lf.wait_for_replication(timeout=5)
+    assert follower.get(str(stale.id)) is None
+
+    [replica] = lf.followers
+    replica.stop()
+    libs = [Library(id=uuid4(), name=f"L{i}", documents=[], metadata={}) for i in range(10)]
+    for lib in libs:
+        lf.add(lib)
+    assert replica.lag == 10
+    # stopped follower is not eligible: reads fall back to the leader
+    assert lf.get(str(libs[-1].id)).name == "L9"
 
+    replica.start()  # entries it missed were truncated: reload from a snapshot
+    assert lf.wait_for_replication(timeout=5)
+    assert replica.snapshots_loaded == 2
+    assert sorted(lib.name for lib in follower.list_all()) == sorted(l.name for l in libs)
+    assert len(lf.list_all()) == 10
+    # caught-up follower serves reads
+    assert lf.get(str(libs[0].id)) is follower.get(str(libs[0].id))
+    lf.close()
+
+
+
+
+def test_follower_snapshot_taken_before_a_logged_change(tmp_path):
+    os.chdir(tmp_path)
+    leader = JSONLibraryRepository("leader.json")
+    f1, f2 = JSONLibraryRepository("f1.json"), SQLiteLibraryRepository("f2.db")
+    lf = LeaderFollowerRepository(leader, [f1, f2])
+    doc = Document(id=uuid4(), title="D", chunks=[], metadata={})
+    lib = Library(id=uuid4(), name="LF", documents=[doc], metadata={})
+    lf.add(lib)
+    assert lf.wait_for_replication(timeout=5)
+    for replica in lf.followers:
+        replica.stop()
+
+    chunk = Chunk(id=uuid4(), text="c", embedding=[1.0, 2.0], metadata={})
+    doc.chunks.append(chunk)  # changed in memory before the write is logged
+    lib.version += 1
+    for replica in lf.followers:
+        replica._load_snapshot()  # catches up to a seq before the add_chunks entry
+    lf.add_chunks(lib, [(doc.id, chunk)])
+    for replica in lf.followers:
+        replica.start()
+    assert lf.wait_for_replication(timeout=5)
+    for r in (f1, f2):
+        assert r.get(str(lib.id)) == lib
+    lf.close()
+
+
+class FlakyRepo(JSONLibraryRepository):
+    def __init__(self, path, delay=0.0):
+        super().__init__(path)
+        self.delay, self.fail, self.reads = delay, False, 0
+
+    def get(self, lib_id):
+        self.reads += 1
+        if self.fail:
+            raise IOError("replica down")
+        time.sleep(self.delay)
+        return super().get(lib_id)
+
+
+@pytest.mark.parametrize("policy", ["round_robin", "least_loaded", "latency"])
+def test_read_routing_policies(tmp_path, policy):
+    os.chdir(tmp_path)
+    leader = FlakyRepo("leader.json")
+    fast, slow = FlakyRepo("fast.json"), FlakyRepo("slow.json", delay=0.01)
+    lf = LeaderFollowerRepository(leader, [fast, slow], read_policy=policy)
+    lib = Library(id=uuid4(), name="R", documents=[], metadata={})
+    lf.add(lib)
+    assert lf.wait_for_replication(timeout=5)
+
+    for _ in range(10):
+        assert lf.get(str(lib.id)).name == "R"
+    assert leader.reads == 0
+    if policy == "latency":
+        assert fast.reads > slow.reads
+    else:
+        assert fast.reads == slow.reads == 5
+
+    # failed replica reads fall back to the leader and bench the replica
+    fast.fail = True
+    assert lf.get(str(lib.id)).name == "R"
+    assert lf.followers[0].failures == 1
+    reads = fast.reads
+    for _ in range(3):
+        lf.get(str(lib.id))
+    assert fast.reads == reads
+    assert lf.get_for_update(str(lib.id)) is leader.get(str(lib.id))
+    lf.close()
+
+
+def test_read_your_writes_token(tmp_path):
+    os.chdir(tmp_path)
+    gate = threading.Event()
+
+    class GatedRepo(JSONLibraryRepository):
+        def update(self, lib):
+            gate.wait(5)
+            return super().update(lib)
+
+    leader, replica = JSONLibraryRepository("leader.json"), GatedRepo("r.json")
+    lf = LeaderFollowerRepository(leader, [replica], read_policy="round_robin")
+    assert lf.wait_for_replication(timeout=5)
+
+    lib = Library(id=uuid4(), name="Mine", documents=[], metadata={})
+    with read_session() as session:
+        lf.add(lib)
+        assert session.min_seq == 1
+        assert lf.get(str(lib.id)).name == "Mine"  # replica is behind: leader answers
+    with read_session(0):
+        assert lf.get(str(lib.id)) is None  # no token: stale replica is acceptable
+    gate.set()
+    assert lf.wait_for_replication(timeout=5)
+    with read_session(1):
+        assert lf.get(str(lib.id)) is replica.get(str(lib.id))
+    lf.close()
+
+
+def test_replicated_repository_from_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("REPLICA_PATHS", "r1.json,r2.json")
+    monkeypatch.setenv("READ_POLICY", "least_loaded")
+    local = TestClient(app)
+    try:
+        resp = local.post("/libraries", json={"name": "Rep", "metadata": {}})
+        token = resp.headers["X-Version-Token"]
+        assert int(token) >= 1
+        lib_id = resp.json()["id"]
+        got = local.get(f"/libraries/{lib_id}", headers={"X-Version-Token": token})
+        assert got.json()["name"] == "Rep"
+
+        status = local.get("/replication/status").json()
+        assert status["read_policy"] == "least_loaded"
+        assert len(status["followers"]) == 2
+    finally:
+        for repo in main_module._repositories.values():
+            if isinstance(repo, LeaderFollowerRepository):
+                repo.close()
+        main_module._repositories.clear()
+    monkeypatch.delenv("REPLICA_PATHS")
+    assert local.get("/replication/status").status_code == 404
 
 
 # Python SDK Tests
+def test_async_sdk_bulk_and_batch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with AsyncVectorDBClient("http://test", transport=transport) as sdk:
+            lib_id = (await sdk.create_library("AsyncSDK", {}))["id"]
+            doc_id = uuid4()
+            await sdk.create_document(lib_id, doc_id, "D", {})
+            chunks = [{"doc_id": doc_id, "text": f"c{i}", "embedding": [float(i), 0.0],
+                       "metadata": {}} for i in range(25)]
+            added = await sdk.bulk_add_chunks(lib_id, chunks, batch_size=4, max_concurrency=3)
+            assert [r["chunk"]["text"] for r in added] == [c["text"] for c in chunks]
+
+            queries = [[float(i), 0.0] for i in (3, 17, 24)]
+            results = await sdk.batch_search(lib_id, queries, k=1, algorithm="linear",
+                                             batch_size=2)
+            assert [r[0]["chunk"]["text"] for r in results] == ["c3", "c17", "c24"]
+
+            streamed = [c["text"] async for c in sdk.iter_chunks(lib_id)]
+            assert sorted(streamed) == sorted(c["text"] for c in chunks)
+
+    asyncio.run(run())
+
+
+def test_sdk_pooled_session(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = uvicorn.Server(uvicorn.Config(app, port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        with VectorDBClient(f"http://127.0.0.1:{port}") as sdk:
+            lib_id = sdk.create_library("SDKLib", {"k": 1})["id"]
+            doc_id = uuid4()
+            sdk.create_document(lib_id, doc_id, "Doc for SDK", {})
+            chunks = [{"doc_id": doc_id, "text": f"s{i}", "embedding": [float(i)],
+                       "metadata": {}} for i in range(10)]
+            added = sdk.bulk_add_chunks(lib_id, chunks, batch_size=3)
+            assert [r["chunk"]["text"] for r in added] == [c["text"] for c in chunks]
+            results = sdk.batch_search(lib_id, [[2.0], [8.0]], k=1, algorithm="linear")
+            assert [r[0]["chunk"]["text"] for r in results] == ["s2", "s8"]
+            page, cursor = sdk.get_chunk_page(lib_id, limit=4)
+            assert len(page) == 4 and cursor
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+
 # def test_sdk_flow():
 #     sdk = VectorDBClient(base_url="http://localhost:8000")
 #     lib = sdk.create_library("SDKLib", {"k": 1})
@@ -0,0 +1,29 @@
+import json
+
+from benchmarks import bench_index, compare, synthetic
+from benchmarks.__main__ import main
+
+
+def test_exact_index_has_full_recall():
+    result = bench_index("linear", synthetic(300, 16, queries=10), k=5)
+    assert result["recall_at_5"] == 1.0
+    assert result["qps"] > 0 and result["p99_ms"] >= result["p50_ms"]
+    assert result["index_bytes"] > 0
+
+
+def test_cli_writes_results_and_flags_regressions(tmp_path):
+    out = tmp_path / "results.json"
+    args = ["--sizes", "200", "--dims", "8", "--repo-sizes", "50", "--queries", "5",
+            "--datasets", "clustered", "--out", str(out)]
+    assert main(args) == 0
+    results = json.loads(out.read_text())
+    assert {r["algorithm"] for r in results["indexes"]} == {"kd", "ball", "linear"}
+    assert {r["backend"] for r in results["repositories"]} == {"json", "pickle", "sqlite"}
+    assert all(r["storage_bytes"] > 0 for r in results["repositories"])
+
+    slower = json.loads(out.read_text())
+    for r in slower["indexes"]:
+        r["build_seconds"] *= 10
+    assert {r["metric"] for r in compare(results, slower)} == {"build_seconds"}
+    assert compare(results, results) == []
+
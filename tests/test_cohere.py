@@ -1,5 +1,8 @@
 import os
+import json
+import threading
 import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import List
 import pytest
 from unittest.mock import patch, MagicMock
@@ -55,7 +58,7 @@ def test_cohere_client(mock_response):
     assert client.model == "embed-english-v3.0"
 
 
-    with patch('requests.post', return_value=mock_response) as mock_post:
+    with patch('requests.Session.post', return_value=mock_response) as mock_post:
         client = CohereClient(api_key="test-key")
         embedding = client.get_embedding("Hello, world!")
         mock_post.assert_called_once()
@@ -68,6 +71,65 @@ def test_cohere_client(mock_response):
         assert all(isinstance(x, float) for x in embedding)
 
 
+@pytest.fixture
+def stub_server():
+    """Local stand-in for the embed endpoint; the first call answers 503."""
+    calls = []
+    failed = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            calls.append(body["texts"])
+            if not failed:
+                failed.append(True)
+                self.send_response(503)
+                self.end_headers()
+                return
+            payload = json.dumps({
+                "embeddings": [[float(len(t)), 1.0] for t in body["texts"]]
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1/embed", calls
+    server.shutdown()
+
+
+def test_cohere_client_batches_retries_and_caches(stub_server, tmp_path):
+    from utils.cohere_client import CohereClient
+    from utils.embedding_cache import EmbeddingCache
+
+    url, calls = stub_server
+    cache = EmbeddingCache(str(tmp_path / "emb.db"))
+    client = CohereClient(
+        api_key="test-key", embed_url=url, batch_size=10,
+        backoff_seconds=0.01, cache=cache
+    )
+    texts = [f"text {i}" for i in range(25)]
+
+    embeddings = client.get_embeddings(texts)
+    assert embeddings == [[float(len(t)), 1.0] for t in texts]
+    sent = calls[1:]  # drop the retried 503
+    assert sorted(len(batch) for batch in sent) == [5, 10, 10]
+    assert len(cache) == 25
+
+    # re-ingesting with one changed text only embeds that text
+    calls.clear()
+    texts[3] = "changed"
+    assert client.get_embeddings(texts)[3] == [7.0, 1.0]
+    assert calls == [["changed"]]
+
+
 if __name__ == "__main__":
     COHERE_API_KEY = os.getenv("COHERE_API_KEY")
     samples = ["Hello world", "How are you?"]
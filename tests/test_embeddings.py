@@ -5,6 +5,7 @@ import numpy as np
 
 from app.main import app
 from utils.cohere_client import CohereClient
+from infrastructure.embeddings import EmbedderFactory, HashingEmbedder, PooledEmbedder
 
 load_dotenv()
 client = TestClient(app)
@@ -165,5 +166,26 @@ def test_semantic_search_comparison():
     client.delete(f"/libraries/{lib_id}")
 
 
+def test_hashing_embedder_is_deterministic_and_normalised():
+    embedder = EmbedderFactory.create("hashing", dim=64)
+    a, b, c = embedder.embed(["Hello world", "hello, world!", "unrelated pasta"])
+    assert len(a) == embedder.dimension == 64
+    assert np.allclose(a, b)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert np.dot(a, c) < np.dot(a, b)
+    assert HashingEmbedder(dim=64).embed_one("") == [0.0] * 64
+
+
+def test_pooled_embedder_matches_direct_embedding():
+    texts = [f"chunk number {i}" for i in range(50)]
+    direct = HashingEmbedder(dim=32).embed(texts)
+    for kind in ("thread", "process"):
+        pooled = PooledEmbedder(HashingEmbedder(dim=32), kind=kind, workers=2, chunk_size=8)
+        try:
+            assert pooled.embed(texts) == direct
+        finally:
+            pooled.close()
+
+
 if __name__ == "__main__":
     test_semantic_search_comparison() 
\ No newline at end of file
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from infrastructure.index.bm25 import BM25Index
+from infrastructure.index.factory import IndexFactory
+from infrastructure.index.sharded import ShardedIndex
+from infrastructure.index.stats import collect
+from utils.fusion import reciprocal_rank_fusion
+
+
+def brute_force(data, ids, target, k):
+    dists = np.linalg.norm(np.asarray(data) - target, axis=1)
+    return [ids[i] for i in np.argsort(dists, kind="stable")[:k]]
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_nearest_matches_brute_force(algo):
+    rng = np.random.default_rng(0)
+    data = rng.normal(scale=5.0, size=(500, 8)).astype(np.float32)
+    index = IndexFactory.create(algo, data, leaf_size=10)
+    for target in rng.normal(scale=5.0, size=(20, 8)):
+        assert index.nearest(target, 5) == brute_force(data, list(range(500)), target, 5)
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_incremental_add_and_remove(algo):
+    rng = np.random.default_rng(1)
+    data = rng.normal(size=(200, 6)).astype(np.float32)
+    index = IndexFactory.create(
+        algo, data[:100], leaf_size=8, background_rebuild=False
+    )
+
+    index.add(list(range(100, 200)), data[100:])
+    index.remove(range(0, 50))
+    assert len(index) == 150
+
+    live_ids = list(range(50, 200))
+    for target in rng.normal(size=(20, 6)):
+        expected = brute_force(data[50:], live_ids, target, 4)
+        assert index.nearest(target, 4) == expected
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_add_replaces_existing_id(algo):
+    index = IndexFactory.create(algo, [[0.0, 0.0], [5.0, 5.0]])
+    index.add([0], [[9.0, 9.0]])
+    assert len(index) == 2
+    assert index.nearest([9.0, 9.0], 1) == [0]
+    assert index.nearest([0.0, 0.0], 2) == [1, 0]
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_empty_index_accepts_inserts(algo):
+    index = IndexFactory.create(algo, [])
+    assert index.nearest([1.0, 2.0], 3) == []
+    index.add([7, 8], [[1.0, 2.0], [3.0, 4.0]])
+    assert index.nearest([1.0, 2.0], 1) == [7]
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball"])
+def test_tombstones_trigger_background_rebuild(algo):
+    rng = np.random.default_rng(2)
+    data = rng.normal(size=(300, 4)).astype(np.float32)
+    index = IndexFactory.create(algo, data, leaf_size=8, max_tombstone_ratio=0.2)
+
+    index.remove(range(0, 100))
+    index.wait_for_rebuild(timeout=10)
+
+    assert index.store.tombstones == 0
+    assert index.store.size == 200
+    target = data[150]
+    assert index.nearest(target, 3) == brute_force(data[100:], list(range(100, 300)), target, 3)
+
+
+def test_bm25_ranks_exact_terms_and_updates_incrementally():
+    index = BM25Index.from_texts([
+        ("a", "error code E1234 raised by the parser"),
+        ("b", "the parser handles errors gracefully"),
+        ("c", "weather report for today"),
+    ])
+    assert [doc for doc, _ in index.search("E1234", k=3)] == ["a"]
+    assert index.search("parser", k=3, allowed={"b"})[0][0] == "b"
+
+    index.remove("a")
+    index.add("d", "E1234 E1234 again")
+    assert [doc for doc, _ in index.search("e1234", k=3)] == ["d"]
+    assert index.search("nothing matches", k=3) == []
+
+
+def test_reciprocal_rank_fusion_prefers_items_ranked_by_both():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+    assert fused[0][0] == "y"
+    assert {item for item, _ in fused} == {"w", "x", "y", "z"}
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_radius_search_and_max_distance_match_brute_force(algo):
+    rng = np.random.default_rng(3)
+    data = rng.normal(size=(400, 5)).astype(np.float32)
+    index = IndexFactory.create(algo, data, leaf_size=8, background_rebuild=False)
+    index.remove(range(0, 40))
+
+    for target in rng.normal(size=(10, 5)):
+        dists = np.linalg.norm(data - target, axis=1)
+        dists[:40] = np.inf
+        order = np.argsort(dists, kind="stable")
+        inside = [int(i) for i in order if dists[i] <= 1.5]
+        assert index.radius_search(target, 1.5) == inside
+        assert index.nearest(target, 10, max_distance=1.5) == inside[:10]
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball", "linear"])
+def test_sharded_index_scatter_gather(algo):
+    rng = np.random.default_rng(4)
+    data = rng.normal(size=(300, 6)).astype(np.float32)
+    index = ShardedIndex(data[:200], shards=4, algorithm=algo, leaf_size=8,
+                         background_rebuild=False)
+    assert sorted(len(s) for s in index.shards) == sorted(
+        np.bincount(np.arange(200) % 4).tolist())
+
+    before = [s.root for s in index.shards]
+    index.add([4, 8], data[200:202])  # both ids live in shard 0
+    assert [s.root is r for s, r in zip(index.shards, before)][1:] == [True] * 3
+
+    index.add(list(range(202, 300)), data[202:])
+    index.remove(range(0, 30))
+    vectors = np.concatenate([data[:200], data[202:]])
+    vectors[4], vectors[8] = data[200], data[201]
+    ids = list(range(200)) + list(range(202, 300))
+    live = [i for i, id_ in enumerate(ids) if id_ >= 30]
+    for target in rng.normal(size=(10, 6)):
+        assert index.nearest(target, 5) == brute_force(
+            vectors[live], [ids[i] for i in live], target, 5)
+        dists = np.linalg.norm(vectors[live] - target, axis=1)
+        assert len(index.radius_search(target, 2.0)) == int((dists <= 2.0).sum())
+
+
+@pytest.mark.parametrize("algo", ["kd", "ball"])
+def test_traversal_stats_count_pruned_work(algo):
+    rng = np.random.default_rng(5)
+    data = rng.normal(size=(2000, 3)).astype(np.float32)
+    index = IndexFactory.create(algo, data, leaf_size=16)
+    with collect() as work:
+        index.nearest(data[0], 3)
+    assert work.searches == 1
+    assert 0 < work.leaves_scanned < work.nodes_visited
+    assert 0 < work.distance_evaluations < len(data)
+    assert work.subtrees_pruned > 0
+
+    sharded = ShardedIndex(data, shards=4, algorithm=algo, leaf_size=16)
+    with collect() as work:
+        sharded.nearest(data[0], 3)
+    assert work.searches == 4
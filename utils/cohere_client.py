@@ -1,16 +1,41 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 import requests
 import numpy as np
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from utils.embedding_cache import EmbeddingCache, content_key
+
 
 load_dotenv()
 
-class CohereClient:    
+class CohereClient:
+    """
+    Cohere embed client. Requests go through one pooled `requests.Session`,
+    inputs are split into provider-sized batches dispatched concurrently,
+    transient failures (connection errors, 429, 5xx) are retried with
+    exponential backoff, and vectors can be cached on disk by content hash
+    so re-ingesting a corpus only embeds the texts that changed.
+    """
     EMBED_URL = "https://api.cohere.ai/v1/embed"
+    MAX_BATCH_SIZE = 96  # texts per embed call accepted by the API
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        embed_url: Optional[str] = None,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        timeout: float = 10.0,
+        cache: Optional[EmbeddingCache] = None,
+        input_type: str = "search_document"
+    ) -> None:
         self.api_key = api_key or os.getenv("COHERE_API_KEY")
         if not self.api_key:
             raise ValueError("Cohere API key must be provided or set in COHERE_API_KEY env var")
@@ -19,50 +44,112 @@ class CohereClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-    
+        self.embed_url = embed_url or self.EMBED_URL
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.input_type = input_type
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH")
+        self.cache = cache if cache is not None else (
+            EmbeddingCache(cache_path) if cache_path else None
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
     def get_embedding(self, text: str) -> List[float]:
         try:
-            payload = {
-                "model": self.model,
-                "texts": [text],
-                "input_type": "search_document"
-            }
-            
-            response = requests.post(
-                self.EMBED_URL,
-                headers=self.headers,
-                json=payload,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            
-            embeddings = response.json()["embeddings"]
-            return np.array(embeddings[0], dtype=np.float32).tolist()
+            return self._embed([text])[0]
         except Exception as e:
             raise ValueError(f"Failed to generate embedding: {str(e)}")
-    
+
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         try:
-            payload = {
-                "model": self.model,
-                "texts": texts,
-                "input_type": "search_document"
-            }
-            
-            response = requests.post(
-                self.EMBED_URL,
-                headers=self.headers,
-                json=payload,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            
-            embeddings = response.json()["embeddings"]
-            return [np.array(emb, dtype=np.float32).tolist() 
-                   for emb in embeddings]
+            return self._embed(texts)
         except Exception as e:
             raise ValueError(f"Failed to generate embeddings: {str(e)}")
 
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [content_key(self.model, self.input_type, t) for t in texts]
+        vectors: Dict[str, List[float]] = (
+            self.cache.get_many(keys) if self.cache is not None else {}
+        )
+
+        missing = list(dict.fromkeys(
+            (k, t) for k, t in zip(keys, texts) if k not in vectors
+        ))
+        if missing:
+            batches = [
+                missing[i:i + self.batch_size]
+                for i in range(0, len(missing), self.batch_size)
+            ]
+            if len(batches) == 1:
+                embedded = [self._post_batch([t for _, t in batches[0]])]
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    embedded = list(pool.map(
+                        lambda batch: self._post_batch([t for _, t in batch]),
+                        batches
+                    ))
+            fresh = [
+                (key, vec)
+                for batch, vecs in zip(batches, embedded)
+                for (key, _), vec in zip(batch, vecs)
+            ]
+            vectors.update(fresh)
+            if self.cache is not None:
+                self.cache.put_many(fresh)
+
+        return [vectors[k] for k in keys]
+
+    def _post_batch(self, texts: List[str]) -> List[List[float]]:
+        payload = {
+            "model": self.model,
+            "texts": texts,
+            "input_type": self.input_type
+        }
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.embed_url,
+                    headers=self.headers,
+                    json=payload,
+                    timeout=self.timeout
+                )
+                if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                    self._sleep(attempt, response.headers.get("Retry-After"))
+                    attempt += 1
+                    continue
+                response.raise_for_status()
+                break
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(attempt, None)
+                attempt += 1
+
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} embeddings, got {len(embeddings)}"
+            )
+        return [np.array(emb, dtype=np.float32).tolist() for emb in embeddings]
+
+    def _sleep(self, attempt: int, retry_after: Optional[str]) -> None:
+        try:
+            delay = float(retry_after) if retry_after else None
+        except ValueError:
+            delay = None
+        time.sleep(delay if delay is not None else self.backoff_seconds * (2 ** attempt))
+
+    def close(self) -> None:
+        self.session.close()
+
     @property
     def embedding_size(self) -> int:
-        return 1024  # embed-english-v3.0 
\ No newline at end of file
+        return 1024  # embed-english-v3.0
@@ -0,0 +1,73 @@
+import hashlib
+from typing import Any, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+# radius used to look up exact duplicates (max_distance == 0) in an index
+EXACT_SLACK = 1e-6
+
+
+def text_hash(text: str) -> str:
+    """Content hash of `text`, insensitive to case and whitespace runs."""
+    normalized = " ".join(text.split()).casefold()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def duplicate_clusters(
+    vectors: np.ndarray,
+    max_distance: float,
+    index: Any,
+    keys: Optional[Sequence[Hashable]] = None,
+    ids: Optional[Sequence[int]] = None,
+    batch_size: int = 256
+) -> List[List[int]]:
+    """
+    Single-linkage clusters of rows lying within `max_distance` of each
+    other (or sharing a key). `index` holds the rows of `vectors` under
+    `ids` (default: their positions) and answers a batch of rows at a time
+    with its `radius_search`; each candidate pair is then confirmed with
+    its exact distance. Only clusters with more than one member are
+    returned, each sorted so the earliest row comes first.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    if keys is not None:
+        first: dict = {}
+        for i, key in enumerate(keys):
+            union(first.setdefault(key, i), i)
+
+    position = {int(id_): i for i, id_ in enumerate(ids if ids is not None else range(n))}
+    # identical rows are exactly 0 apart; the slack only keeps the index
+    # traversal from missing them
+    radius = max_distance if max_distance > 0 else EXACT_SLACK
+    for start in range(0, n, batch_size):
+        pairs = [
+            (i, j)
+            for i in range(start, min(start + batch_size, n))
+            for j in (position.get(int(id_)) for id_ in index.radius_search(vectors[i], radius))
+            if j is not None and j > i
+        ]
+        if not pairs:
+            continue
+        left, right = np.array(pairs).T
+        close = np.linalg.norm(vectors[left] - vectors[right], axis=1) <= max_distance
+        for i, j in zip(left[close].tolist(), right[close].tolist()):
+            union(i, j)
+
+    clusters: dict = {}
+    for i in range(n):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
@@ -0,0 +1,79 @@
+import hashlib
+import sqlite3
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from utils import metrics
+
+LOOKUPS = metrics.counter(
+    "vectordb_embedding_cache_lookups_total",
+    "Embedding cache lookups by result (hit or miss).",
+    ["result"],
+)
+
+
+def content_key(model: str, input_type: str, text: str) -> str:
+    """Cache key for one text: embeddings differ per model and input type."""
+    h = hashlib.sha256()
+    for part in (model, input_type, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent content-hash -> float32 vector cache backed by SQLite."""
+
+    def __init__(self, db_path: str = "embeddings.db") -> None:
+        self.db_path = db_path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                cur = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, blob in cur.fetchall():
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        LOOKUPS.inc(len(found), result="hit")
+        LOOKUPS.inc(len(keys) - len(found), result="miss")
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]) -> None:
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,40 @@
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]],
+    k: int = 60
+) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank); best first."""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _min_max(scores: Dict[Hashable, float]) -> Dict[Hashable, float]:
+    if not scores:
+        return {}
+    lo, hi = min(scores.values()), max(scores.values())
+    span = hi - lo
+    return {key: (v - lo) / span if span else 1.0 for key, v in scores.items()}
+
+
+def weighted_fusion(
+    vector_distances: Dict[Hashable, float],
+    keyword_scores: Dict[Hashable, float],
+    alpha: float = 0.5
+) -> List[Tuple[Hashable, float]]:
+    """
+    alpha * vector similarity + (1 - alpha) * keyword score, each min-max
+    normalised over its candidates (distances are flipped so closer is
+    better). Missing from one list counts as 0 there.
+    """
+    vec = _min_max({key: -d for key, d in vector_distances.items()})
+    kw = _min_max(keyword_scores)
+    fused = {
+        key: alpha * vec.get(key, 0.0) + (1 - alpha) * kw.get(key, 0.0)
+        for key in set(vec) | set(kw)
+    }
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
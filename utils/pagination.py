@@ -1,7 +1,93 @@
-from typing import List, TypeVar
+import base64
+import json
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from domain.models import Chunk, Document
 
 T = TypeVar('T')
 
 
 def paginate(items: List[T], offset: int = 0, limit: int = 100) -> List[T]:
     return items[offset: offset + limit]
+
+
+def encode_cursor(doc_index: int, chunk_index: int, doc_id: str) -> str:
+    """Opaque token for the position (doc_index, chunk_index) of document `doc_id`."""
+    raw = json.dumps([doc_index, chunk_index, doc_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        doc_index, chunk_index, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        if doc_index < 0 or chunk_index < 0:
+            raise ValueError
+        return int(doc_index), int(chunk_index), str(doc_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _resume_at(documents: Sequence[Document], cursor: Optional[str]) -> Tuple[int, int]:
+    """
+    Position a cursor points at. If documents were added or removed before
+    it, the document is found again by id; if it is gone, the scan resumes
+    at the same document index.
+    """
+    if not cursor:
+        return 0, 0
+    doc_index, chunk_index, doc_id = decode_cursor(cursor)
+    if doc_index < len(documents) and str(documents[doc_index].id) == doc_id:
+        return doc_index, chunk_index
+    moved = next((i for i, d in enumerate(documents) if str(d.id) == doc_id), None)
+    return (moved, chunk_index) if moved is not None else (doc_index, 0)
+
+
+# reads (document, offset, limit) chunks of a document; limit None reads the rest
+ChunkReader = Callable[[Document, int, Optional[int]], List[Chunk]]
+
+
+def _held_chunks(document: Document, offset: int, limit: Optional[int]) -> List[Chunk]:
+    return document.chunks[offset:None if limit is None else offset + limit]
+
+
+def iter_chunks(
+    documents: Sequence[Document],
+    cursor: Optional[str] = None,
+    read: ChunkReader = _held_chunks
+) -> Iterator[Tuple[int, int, Chunk]]:
+    """
+    (doc_index, chunk_index, chunk) from `cursor` onwards, reading the
+    chunks of one document at a time with `read` (default: the chunks the
+    documents hold).
+    """
+    doc_index, chunk_index = _resume_at(documents, cursor)
+    for d in range(doc_index, len(documents)):
+        start = chunk_index if d == doc_index else 0
+        for c, chunk in enumerate(read(documents[d], start, None), start):
+            yield d, c, chunk
+
+
+def cursor_page(
+    documents: Sequence[Document],
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    read: ChunkReader = _held_chunks
+) -> Tuple[List[Chunk], Optional[str]]:
+    """
+    Up to `limit` chunks from `cursor`, and the cursor of the next page
+    (None at the end). Only the chunks on the page (and one more) are read.
+    """
+    rows: List[Tuple[int, int, Chunk]] = []
+    doc_index, chunk_index = _resume_at(documents, cursor)
+    for d in range(doc_index, len(documents)):
+        start = chunk_index if d == doc_index else 0
+        chunks = read(documents[d], start, limit + 1 - len(rows))
+        rows.extend((d, c, chunk) for c, chunk in enumerate(chunks, start))
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        d, c, _ = rows.pop()
+        next_cursor = encode_cursor(d, c, str(documents[d].id))
+    return [chunk for _, _, chunk in rows], next_cursor
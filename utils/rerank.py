@@ -0,0 +1,70 @@
+from typing import Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(
+    candidates: np.ndarray,
+    k: int,
+    query: Optional[np.ndarray] = None,
+    lambda_: float = 0.5,
+    groups: Optional[Sequence[Hashable]] = None,
+    max_per_group: Optional[int] = None
+) -> List[int]:
+    """
+    Maximal marginal relevance over a candidate matrix (rows in rank order).
+    Picks `k` positions greedily by
+        lambda * sim(query, c) - (1 - lambda) * max sim(c, picked)
+    using cosine similarity; without a query, relevance decays with the
+    incoming rank. At most `max_per_group` picks share a group.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    vectors = _normalize(np.asarray(candidates, dtype=np.float32))
+    if query is not None:
+        relevance = vectors @ _normalize(np.asarray(query, dtype=np.float32))
+    else:
+        relevance = 1.0 - np.arange(n, dtype=np.float32) / n
+    similarity = vectors @ vectors.T
+
+    available = np.ones(n, dtype=bool)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    counts: dict = {}
+    picked: List[int] = []
+    while len(picked) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = lambda_ * relevance - (1 - lambda_) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+        if groups is not None and max_per_group is not None:
+            group = groups[best]
+            if counts.get(group, 0) >= max_per_group:
+                continue
+            counts[group] = counts.get(group, 0) + 1
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[:, best])
+    return picked
+
+
+def cap_per_group(
+    groups: Sequence[Hashable],
+    k: int,
+    max_per_group: int
+) -> List[int]:
+    """First `k` positions, in order, keeping at most `max_per_group` per group."""
+    counts: dict = {}
+    picked: List[int] = []
+    for i, group in enumerate(groups):
+        if counts.get(group, 0) < max_per_group:
+            counts[group] = counts.get(group, 0) + 1
+            picked.append(i)
+            if len(picked) == k:
+                break
+    return picked